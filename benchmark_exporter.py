@@ -0,0 +1,424 @@
+"""
+Benchmark for Universal Data Exporter
+数据导出器基准测试 - 用合成数据源测量采集写入和 /metrics 拉取路径的性能
+
+测量项:
+- 采集写入: _update_metrics() 每秒处理的行数、publish() 延迟
+- 单序列写入: MetricsManager.set_value() 每秒次数
+- 拉取: /metrics 渲染耗时，以及采集持续进行时并发拉取的延迟分位数
+- 过期清理: cleanup_expired() 清理全部序列时的停顿时间
+- 内存: 每个时间序列的 RSS 增量
+
+合成数据源通过 CollectorFactory.register() 注册:
+- synthetic_memory: 数据预先生成在内存中，只测量映射和发布
+- synthetic_file:   数据预先写入 NDJSON 文件，每周期重新读取和解析
+
+使用方式:
+    python benchmark_exporter.py --rows 100000 --sources 4 --metrics 3 --cardinality 1000
+    python benchmark_exporter.py --output result.json
+    python benchmark_exporter.py --baseline result.json --tolerance 0.2
+
+结果以 JSON 输出；指定 --baseline 时与基线对比，任一指标退化超过容忍度则以非 0 退出码结束
+"""
+
+import os
+import sys
+import json
+import time
+import yaml
+import logging
+import argparse
+import tempfile
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Iterator
+
+from data_exporter import (
+    BaseCollector, CollectorFactory, UniversalExporter, ExporterHTTPServer, serve_exposition, chunked,
+)
+
+
+# ============================================================================
+# 合成数据源
+# ============================================================================
+def synthetic_rows(config: dict) -> Iterator[Dict[str, Any]]:
+    """
+    按数据源配置生成合成数据
+    第 i 个标签取 (n // cardinality^i) % cardinality，每个指标的序列数为 min(rows, cardinality^labels)
+
+    Args:
+        config: 数据源配置，读取 rows、labels、cardinality、metrics
+    """
+    labels = config['labels']
+    cardinality = config['cardinality']
+    value_fields = [m['source_field'] for m in config['metrics']]
+
+    for n in range(config['rows']):
+        row = {}
+        divisor = 1
+        for i in range(labels):
+            row[f'label_{i}'] = f'value_{(n // divisor) % cardinality}'
+            divisor *= cardinality
+        for j, field in enumerate(value_fields):
+            row[field] = float(n + j)
+        yield row
+
+
+class SyntheticMemoryCollector(BaseCollector):
+    """
+    内存合成数据源
+    数据在创建时生成一次，iter_batches() 只做切分，测量结果不包含数据生成开销
+    """
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.rows = list(synthetic_rows(config))
+
+    def iter_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        yield from chunked(self.rows, self.batch_size)
+
+
+class SyntheticFileCollector(BaseCollector):
+    """
+    文件合成数据源
+    数据在创建时写入 NDJSON 文件，每周期逐行读取并解析，测量结果包含文件读取和 JSON 解析开销
+    """
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        fd, self.path = tempfile.mkstemp(prefix=f'bench_{self.name}_', suffix='.ndjson')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for row in synthetic_rows(config):
+                f.write(json.dumps(row))
+                f.write('\n')
+
+    def iter_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            yield from chunked((json.loads(line) for line in f), self.batch_size)
+
+    def close(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+CollectorFactory.register('synthetic_memory', SyntheticMemoryCollector)
+CollectorFactory.register('synthetic_file', SyntheticFileCollector)
+
+
+# ============================================================================
+# 测量工具
+# ============================================================================
+def current_rss() -> int:
+    """当前进程的 RSS（字节），/proc 不可用时退化为峰值 RSS"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以字节为单位，Linux 以 KB 为单位
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """
+    计算延迟分位数（毫秒）
+
+    Args:
+        samples: 延迟样本（秒）
+    """
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'p50_ms': pct(0.50),
+        'p90_ms': pct(0.90),
+        'p99_ms': pct(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def build_config(args, state_dir: str) -> dict:
+    """根据命令行参数生成 Exporter 配置"""
+    collector_type = f'synthetic_{args.collector}'
+    return {
+        'exporter': {
+            'port': 0,
+            'metrics_ttl_seconds': 3600,
+            'metrics_backend': args.backend,
+            'state_dir': state_dir,
+        },
+        'data_sources': [
+            {
+                'name': f'bench_{s}',
+                'type': collector_type,
+                'interval': '60s',
+                'batch_size': args.batch_size,
+                'rows': args.rows,
+                'labels': args.labels,
+                'cardinality': args.cardinality,
+                'metrics': [
+                    {
+                        'prometheus_name': f'bench_s{s}_m{m}',
+                        'source_field': f'field_{m}',
+                        'labels': [f'label_{i}' for i in range(args.labels)],
+                    }
+                    for m in range(args.metrics)
+                ],
+            }
+            for s in range(args.sources)
+        ],
+    }
+
+
+# ============================================================================
+# 基准测试
+# ============================================================================
+def run_benchmark(args) -> Dict[str, Any]:
+    """
+    执行全部测量项
+
+    Returns:
+        dict: 测量结果
+    """
+    # 配置文件和状态目录放在同一个临时目录中，结束（包括异常退出）后删除
+    with tempfile.TemporaryDirectory(prefix='bench_state_') as state_dir:
+        return _run_benchmark(args, state_dir)
+
+
+def _run_benchmark(args, state_dir: str) -> Dict[str, Any]:
+    """在临时状态目录中执行全部测量项"""
+    config_path = os.path.join(state_dir, 'config.yaml')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(build_config(args, state_dir), f)
+
+    exporter = UniversalExporter(config_path)
+    manager = exporter.metrics_manager
+    sources = list(exporter.sources.values())
+
+    # 记录每次 publish() 的耗时
+    publish_samples = []
+    publish = manager.publish
+
+    def timed_publish(*a, **kw):
+        start = time.perf_counter()
+        try:
+            return publish(*a, **kw)
+        finally:
+            publish_samples.append(time.perf_counter() - start)
+
+    manager.publish = timed_publish
+
+    # 创建采集器（生成合成数据），不计入采集耗时
+    for source in sources:
+        exporter._get_collector(source)
+    rss_before = current_rss()
+
+    # 1. 采集写入
+    ingest_seconds = 0.0
+    for _ in range(args.iterations):
+        for source in sources:
+            start = time.perf_counter()
+            exporter._update_metrics(source)
+            ingest_seconds += time.perf_counter() - start
+    total_rows = args.rows * len(sources) * args.iterations
+    series = manager.series_count(list(exporter.metric_specs))
+    rss_after = current_rss()
+
+    # 2. 单序列写入
+    metric_name = next(iter(exporter.metric_specs))
+    labelnames = exporter.metric_specs[metric_name]['labels']
+    start = time.perf_counter()
+    for n in range(args.set_value_ops):
+        manager.set_value(metric_name, {label: f'set_{n % args.cardinality}' for label in labelnames}, float(n))
+    set_value_seconds = time.perf_counter() - start
+
+    # 3. /metrics 渲染（不使用缓存）
+    render_samples = []
+    for _ in range(args.renders):
+        start = time.perf_counter()
+        body = exporter.exposition.render()[0]
+        render_samples.append(time.perf_counter() - start)
+
+    # 4. 采集持续进行时的并发拉取
+    server = ExporterHTTPServer(0, '127.0.0.1')
+    server.add_route('/metrics', serve_exposition(exporter.exposition))
+    server.start()
+    threading.Thread(target=exporter.exposition.run, daemon=True, name="exposition").start()
+    url = f'http://127.0.0.1:{server.server_port}/metrics'
+
+    stop = threading.Event()
+
+    def keep_ingesting():
+        while not stop.is_set():
+            for source in sources:
+                exporter._update_metrics(source)
+
+    ingest_thread = threading.Thread(target=keep_ingesting, daemon=True, name="bench-ingest")
+    ingest_thread.start()
+
+    def scrape(_):
+        samples = []
+        for _ in range(args.scrapes):
+            start = time.perf_counter()
+            request = urllib.request.Request(url, headers={'Accept-Encoding': 'gzip'})
+            with urllib.request.urlopen(request) as response:
+                response.read()
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    with ThreadPoolExecutor(max_workers=args.scrapers) as pool:
+        scrape_samples = [s for samples in pool.map(scrape, range(args.scrapers)) for s in samples]
+    stop.set()
+    ingest_thread.join()
+    server.shutdown()
+    server.server_close()
+
+    # 5. 过期清理: 把 TTL 调为 0 后重新采集一次，所有序列立即到期
+    for name in exporter.metric_specs:
+        manager.ttls[name] = 0.0
+    for source in sources:
+        exporter._update_metrics(source)
+    time.sleep(0.01)
+    start = time.perf_counter()
+    cleaned = manager.cleanup_expired()
+    cleanup_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    manager.cleanup_expired()
+    idle_cleanup_seconds = time.perf_counter() - start
+
+    exporter.close()
+
+    return {
+        'params': {
+            'rows': args.rows,
+            'sources': args.sources,
+            'metrics_per_source': args.metrics,
+            'labels': args.labels,
+            'cardinality': args.cardinality,
+            'collector': args.collector,
+            'backend': args.backend,
+            'iterations': args.iterations,
+            'scrapers': args.scrapers,
+        },
+        'series': series,
+        'ingest': {
+            'rows': total_rows,
+            'seconds': round(ingest_seconds, 4),
+            'rows_per_sec': round(total_rows / ingest_seconds, 1) if ingest_seconds else None,
+        },
+        'publish': summarize(publish_samples),
+        'set_value': {
+            'ops': args.set_value_ops,
+            'ops_per_sec': round(args.set_value_ops / set_value_seconds, 1) if set_value_seconds else None,
+        },
+        'render': dict(summarize(render_samples), bytes=len(body)),
+        'scrape': summarize(scrape_samples),
+        'cleanup': {
+            'expired': cleaned,
+            'pause_ms': round(cleanup_seconds * 1000, 3),
+            'idle_pause_ms': round(idle_cleanup_seconds * 1000, 3),
+        },
+        'memory': {
+            'rss_bytes': rss_after - rss_before,
+            'rss_bytes_per_series': round((rss_after - rss_before) / series, 1) if series else None,
+        },
+    }
+
+
+# 用于回归检查的指标: (路径, 越大越好)
+REGRESSION_KEYS = [
+    (('ingest', 'rows_per_sec'), True),
+    (('set_value', 'ops_per_sec'), True),
+    (('publish', 'p99_ms'), False),
+    (('render', 'p50_ms'), False),
+    (('scrape', 'p99_ms'), False),
+    (('cleanup', 'pause_ms'), False),
+    (('memory', 'rss_bytes_per_series'), False),
+]
+
+
+def compare_baseline(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    与基线结果对比
+
+    Args:
+        result: 本次结果
+        baseline: 基线结果
+        tolerance: 允许的相对退化比例
+
+    Returns:
+        List[str]: 超出容忍度的退化项描述
+    """
+    regressions = []
+    for path, higher_is_better in REGRESSION_KEYS:
+        current, previous = result, baseline
+        for key in path:
+            current = (current or {}).get(key)
+            previous = (previous or {}).get(key)
+        if not current or not previous:
+            continue
+
+        change = (previous - current) / previous if higher_is_better else (current - previous) / previous
+        if change > tolerance:
+            regressions.append(f"{'.'.join(path)}: {previous} -> {current} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    """
+    命令行入口函数
+    """
+    parser = argparse.ArgumentParser(description='Benchmark for Universal Data Exporter')
+    parser.add_argument('--rows', type=int, default=10000, help='Rows per source per cycle (default: 10000)')
+    parser.add_argument('--sources', type=int, default=2, help='Number of sources (default: 2)')
+    parser.add_argument('--metrics', type=int, default=2, help='Metrics per source (default: 2)')
+    parser.add_argument('--labels', type=int, default=2, help='Labels per metric (default: 2)')
+    parser.add_argument('--cardinality', type=int, default=100, help='Distinct values per label (default: 100)')
+    parser.add_argument('--collector', choices=['memory', 'file'], default='memory',
+                        help='Synthetic collector type (default: memory)')
+    parser.add_argument('--backend', choices=['gauge', 'columnar'], default='gauge',
+                        help='Metrics backend (default: gauge)')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Collector batch size (default: 10000)')
+    parser.add_argument('--iterations', type=int, default=3, help='Ingest cycles per source (default: 3)')
+    parser.add_argument('--set-value-ops', type=int, default=10000, help='set_value() calls (default: 10000)')
+    parser.add_argument('--renders', type=int, default=5, help='Uncached /metrics renders (default: 5)')
+    parser.add_argument('--scrapers', type=int, default=4, help='Concurrent scrapers (default: 4)')
+    parser.add_argument('--scrapes', type=int, default=50, help='Scrapes per scraper (default: 50)')
+    parser.add_argument('--output', '-o', default=None, help='Write JSON result to file instead of stdout')
+    parser.add_argument('--baseline', default=None, help='Baseline JSON result to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative regression against baseline (default: 0.2)')
+
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    result = run_benchmark(args)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            result['regressions'] = compare_baseline(result, json.load(f), args.tolerance)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if result.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
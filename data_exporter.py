@@ -21,18 +21,35 @@ Date: 2025-11-26
 import os
 import sys
 import time
+import zlib
 import json
+import gzip
+import hashlib
+import importlib
+import math
 import yaml
 import logging
 import argparse
+import signal
+import heapq
+import asyncio
+import itertools
+import random
 import threading
-from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+from abc import ABC
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Any, Optional, Callable, Iterable, Iterator, Set
+from datetime import datetime, date
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # Prometheus 客户端库
-from prometheus_client import start_http_server, Gauge, Counter, REGISTRY
-from prometheus_client.core import GaugeMetricFamily
+from prometheus_client import Gauge, Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
 
 # ============================================================================
 # 日志配置
@@ -45,15 +62,144 @@ logging.basicConfig(
 logger = logging.getLogger('data_exporter')
 
 
+# 默认每批处理的行数
+DEFAULT_BATCH_SIZE = 10000
+
+# GCS 单次请求的默认超时（秒），设置了 deadline 时取两者中较小者
+GCS_TIMEOUT = 60
+
+# 自身监控直方图的桶（秒）: 采集阶段从毫秒级到数分钟，调度延迟从毫秒级到一个采集周期
+PHASE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+
+# 驱动模块首次导入的耗时: {module: seconds}（启动耗时报告使用）
+DRIVER_IMPORT_SECONDS: Dict[str, float] = {}
+
+
+def import_driver(module_name: str):
+    """
+    导入驱动模块（google.cloud.bigquery、pymysql 等），记录首次导入耗时
+    驱动只在用到对应类型的数据源时导入，启动时由并行初始化提前完成
+
+    Args:
+        module_name: 模块名
+
+    Returns:
+        module: 导入的模块
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    # 多个线程同时导入时，其他线程等待模块锁后返回，保留实际导入的线程记录的耗时
+    DRIVER_IMPORT_SECONDS.setdefault(module_name, time.perf_counter() - start)
+    return module
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    将可迭代对象按固定大小分批
+
+    Args:
+        iterable: 任意可迭代对象
+        size: 每批大小
+
+    Yields:
+        list: 不超过 size 个元素的批次
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class ColumnBatch:
+    """
+    列式数据批次
+    列式数据源（如 Arrow）直接以 {字段: 列} 的形式交给映射计划，不构建逐行字典
+    """
+
+    __slots__ = ('columns', 'num_rows')
+
+    def __init__(self, columns: Dict[str, Any], num_rows: int):
+        """
+        Args:
+            columns: {field: 列数据（list 或 NumPy 数组）}
+            num_rows: 行数
+        """
+        self.columns = columns
+        self.num_rows = num_rows
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """逐行返回 {字段: 值}，供需要行字典的调用方（如 BaseCollector.collect()）使用"""
+        names = list(self.columns)
+        columns = [column.tolist() if hasattr(column, 'tolist') else column for column in self.columns.values()]
+        for values in zip(*columns):
+            yield dict(zip(names, values))
+
+
+def arrow_to_columns(record_batch) -> ColumnBatch:
+    """
+    将 Arrow RecordBatch 转换为 ColumnBatch
+    无空值的数值列转为 NumPy 数组（整列转换），其余列转为 Python 列表（空值为 None）
+
+    Args:
+        record_batch: pyarrow.RecordBatch
+
+    Returns:
+        ColumnBatch: 列式批次
+    """
+    import pyarrow.types as pa_types
+
+    columns = {}
+    for name, column in zip(record_batch.schema.names, record_batch.columns):
+        numeric = pa_types.is_integer(column.type) or pa_types.is_floating(column.type)
+        if numeric and column.null_count == 0:
+            columns[name] = column.to_numpy(zero_copy_only=False)
+        else:
+            columns[name] = column.to_pylist()
+    return ColumnBatch(columns, record_batch.num_rows)
+
+
+class QueryBudgetExceeded(Exception):
+    """查询预估扫描量超过 max_bytes_billed"""
+    pass
+
+
+class SourceUnchanged(Exception):
+    """数据源内容自上次成功发布后没有变化，本周期跳过解析和映射"""
+    pass
+
+
+class DeadlineExceeded(Exception):
+    """本周期超过数据源的 deadline，进行中的查询/请求已被取消，部分结果丢弃"""
+    pass
+
+
 # ============================================================================
 # Collector 基类
 # ============================================================================
 class BaseCollector(ABC):
     """
     数据采集器基类
-    所有具体的采集器都需要继承此类并实现 collect() 方法
+    子类实现 collect()（一次性返回全部数据）或 iter_batches()（分批流式返回）其中之一，
+    大结果集的采集器应实现 iter_batches()，内存峰值由批大小而不是结果集大小决定
+
+    原生异步采集器可改为实现 `async def aiter_batches(self)`（异步生成器），
+    由调度器在事件循环上执行 IO
+
+    DRIVER_MODULES 列出采集器依赖的驱动模块，启动时并行预先导入
     """
 
+    DRIVER_MODULES: tuple = ()
+
     def __init__(self, config: dict):
         """
         初始化采集器
@@ -63,12 +209,54 @@ class BaseCollector(ABC):
         """
         self.config = config
         self.name = config['name']
+        self.batch_size = config.get('batch_size', DEFAULT_BATCH_SIZE)
         self.logger = logging.getLogger(f'collector.{self.name}')
 
-    @abstractmethod
+        # 变更检测: 数据版本（GCS generation、ETag、内容哈希等）未变化时跳过本周期
+        self.change_detection = config.get('change_detection', True)
+        self.committed_version = None  # 上次成功发布的数据版本
+        self.pending_version = None    # 本周期读取到的数据版本
+
+        # 增量模式: 只读取 watermark 列大于等于上次水位的行（数据库 / BigQuery）
+        # 查询条件必须用 >= 而不是 >: 与上次水位相同时间戳的行可能在上次查询之后才写入，
+        # 用 > 会永久遗漏这些行；边界上重复读取的行合并后结果不变
+        self.incremental = config.get('incremental')
+        self.watermark = self.incremental.get('initial', '1970-01-01 00:00:00') if self.incremental else None
+        self.pending_watermark = None
+
+        # 本周期的自身监控数据: 各阶段耗时 {phase: seconds} 和读取的字节数
+        # 分页采集可能在多个线程中记录，用锁保护
+        self.phase_seconds: Dict[str, float] = {}
+        self.bytes_read = 0
+        self._instrument_lock = threading.Lock()
+
+        # 截止时间: 本周期的绝对截止时间（time.monotonic()），到期后由 DeadlineWatchdog 调用 cancel()
+        # 阻塞调用期间通过 cancellable() 注册取消回调（取消 BigQuery 作业、KILL 查询、关闭响应等）
+        self.deadline_at: Optional[float] = None
+        self.cancelled = False
+        self._cancel_callbacks: Dict[int, Callable[[], Any]] = {}
+        self._cancel_ids = itertools.count()
+        self._cancel_lock = threading.Lock()
+
+    @classmethod
+    def driver_modules(cls, config: dict) -> tuple:
+        """数据源配置需要的驱动模块（启动时预先导入）"""
+        return cls.DRIVER_MODULES
+
+    def iter_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        分批采集数据，默认将 collect() 的结果按 batch_size 切分
+
+        Yields:
+            List[Dict]: 一批数据，格式同 collect()
+        """
+        if type(self).collect is BaseCollector.collect:
+            raise NotImplementedError(f"{type(self).__name__} must implement collect() or iter_batches()")
+        yield from chunked(self.collect(), self.batch_size)
+
     def collect(self) -> List[Dict[str, Any]]:
         """
-        采集数据的抽象方法，子类必须实现
+        采集全部数据，默认汇总 iter_batches() 的结果
 
         Returns:
             List[Dict]: 采集到的数据列表，每个元素是一个包含指标值和标签的字典
@@ -77,9 +265,356 @@ class BaseCollector(ABC):
                 {'account_id': 'acc_456', 'block_rate': 0.32, 'region': 'US'},
             ]
         """
+        if type(self).iter_batches is BaseCollector.iter_batches:
+            raise NotImplementedError(f"{type(self).__name__} must implement collect() or iter_batches()")
+        return [row for batch in self.iter_batches() for row in batch]
+
+    def check_version(self, version: Any):
+        """
+        记录本周期的数据版本，与上次成功发布的版本相同时抛出 SourceUnchanged
+
+        Args:
+            version: 任意可比较的版本标识，None 表示无法判断
+        """
+        if not self.change_detection or version is None:
+            return
+        if version == self.committed_version:
+            raise SourceUnchanged(f"{self.name} unchanged since last publish")
+        self.pending_version = version
+
+    def track_watermark(self, batch):
+        """记录本批数据（行列表或 ColumnBatch）中 watermark 列的最大值"""
+        column = self.incremental['column']
+        if isinstance(batch, ColumnBatch):
+            values = [v for v in batch.columns.get(column, []) if v is not None]
+        else:
+            values = [row[column] for row in batch if row.get(column) is not None]
+        if values:
+            batch_max = max(values)
+            if self.pending_watermark is None or batch_max > self.pending_watermark:
+                self.pending_watermark = batch_max
+
+    def arm_deadline(self, seconds: Optional[float]):
+        """
+        周期开始时调用: 设置本周期的截止时间，并丢弃上一周期未提交的版本和水位
+
+        Args:
+            seconds: 距截止的秒数，None 表示不限制
+        """
+        with self._cancel_lock:
+            self.deadline_at = time.monotonic() + seconds if seconds is not None else None
+            self.cancelled = False
+            self._cancel_callbacks.clear()
+        self.pending_version = None
+        self.pending_watermark = None
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的秒数，未设置截止时间时返回 None"""
+        if self.deadline_at is None:
+            return None
+        return max(self.deadline_at - time.monotonic(), 0.0)
+
+    def timeout_for(self, default: float) -> float:
+        """单次阻塞调用的超时: 取配置的超时和剩余时间中较小者"""
+        remaining = self.remaining()
+        return default if remaining is None else min(default, remaining)
+
+    def deadline_reached(self) -> bool:
+        """本周期已被取消或已超过截止时间"""
+        return self.cancelled or (self.deadline_at is not None and time.monotonic() >= self.deadline_at)
+
+    def check_deadline(self):
+        """已取消或已超过截止时间时抛出 DeadlineExceeded"""
+        if self.deadline_reached():
+            raise DeadlineExceeded(f"{self.name} exceeded its deadline")
+
+    @contextmanager
+    def cancellable(self, callback: Callable[[], Any]):
+        """
+        在代码块执行期间注册取消回调，截止时间到达时由监视线程调用
+        被取消的调用抛出的驱动异常统一转换为 DeadlineExceeded
+
+        Args:
+            callback: 中断进行中的阻塞调用的函数（需可在其他线程调用）
+        """
+        self.check_deadline()
+        callback_id = next(self._cancel_ids)
+        with self._cancel_lock:
+            self._cancel_callbacks[callback_id] = callback
+        try:
+            yield
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if self.cancelled:
+                raise DeadlineExceeded(f"{self.name} exceeded its deadline and was cancelled") from e
+            raise
+        finally:
+            with self._cancel_lock:
+                self._cancel_callbacks.pop(callback_id, None)
+
+    def cancel(self, deadline_at: Optional[float] = None) -> bool:
+        """
+        取消本周期进行中的工作（由 DeadlineWatchdog 在截止时间到达时调用）
+
+        Args:
+            deadline_at: 要取消的周期的截止时间，与当前周期不一致时（该周期已结束、下一周期已开始）忽略；
+                         None 表示无条件取消
+
+        Returns:
+            bool: 是否执行了取消
+        """
+        with self._cancel_lock:
+            if deadline_at is not None and deadline_at != self.deadline_at:
+                return False
+            self.cancelled = True
+            callbacks = list(self._cancel_callbacks.values())
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                self.logger.warning(f"Failed to cancel in-flight work: {e}")
+        return True
+
+    def record_phase(self, phase: str, seconds: float):
+        """累加本周期某个阶段（connect / decode / map 等）的耗时"""
+        with self._instrument_lock:
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, phase: str):
+        """记录代码块的耗时到指定阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(phase, time.perf_counter() - start)
+
+    def record_bytes(self, count: int):
+        """累加本周期从数据源读取的字节数"""
+        with self._instrument_lock:
+            self.bytes_read += count
+
+    def pop_instrumentation(self) -> tuple:
+        """
+        取出并重置本周期的自身监控数据
+
+        Returns:
+            tuple: ({phase: seconds}, bytes_read)
+        """
+        with self._instrument_lock:
+            phases, self.phase_seconds = self.phase_seconds, {}
+            count, self.bytes_read = self.bytes_read, 0
+        return phases, count
+
+    def commit(self):
+        """
+        本周期数据成功发布后调用
+        之后相同版本的数据会被跳过，增量查询从新的水位继续
+        """
+        if self.pending_version is not None:
+            self.committed_version = self.pending_version
+            self.pending_version = None
+        if self.pending_watermark is not None:
+            self.watermark = self.pending_watermark
+            self.pending_watermark = None
+
+    def fetch_payload(self) -> tuple:
+        """
+        获取未解析的原始数据，用于在子进程中解析（parse_in_process）
+        支持该模式的采集器需要覆盖此方法
+
+        Returns:
+            tuple: (payload 字节串, 格式 json / ndjson / csv)
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support parse_in_process")
+
+    def close(self):
+        """
+        释放采集器持有的资源（客户端、连接等）
+        采集器在进程生命周期内复用，仅在退出或数据源下线时调用
+        """
         pass
 
 
+# ============================================================================
+# 数据库连接池
+# ============================================================================
+class ConnectionPool:
+    """
+    数据库连接池
+    按 DSN 共享，同一数据库的多个数据源复用同一个池，避免每次采集都重新建连
+    """
+
+    # 全局连接池注册表: {dsn_key: ConnectionPool}
+    _pools: Dict[tuple, 'ConnectionPool'] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, name: str, connect: Callable[[], Any], health_check: Callable[[Any], None],
+                 max_size: int = 5, max_idle_seconds: float = 300, acquire_timeout: float = 30):
+        """
+        初始化连接池
+
+        Args:
+            name: 连接池名称（不含密码的 DSN，用于日志）
+            connect: 创建新连接的函数
+            health_check: 健康检查函数，连接不可用时抛出异常
+            max_size: 最大连接数
+            max_idle_seconds: 空闲连接最长保留时间（秒），超过后关闭
+            acquire_timeout: 获取连接的最长等待时间（秒）
+        """
+        self.name = name
+        self._connect = connect
+        self._health_check = health_check
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self.acquire_timeout = acquire_timeout
+        self._idle = deque()  # [(conn, last_used)]
+        self._size = 0        # 已创建（空闲 + 借出）的连接数
+        self._cond = threading.Condition()
+        self.logger = logging.getLogger(f'pool.{name}')
+
+    @classmethod
+    def get_or_create(cls, key: tuple, name: str, connect: Callable[[], Any],
+                      health_check: Callable[[Any], None], **kwargs) -> 'ConnectionPool':
+        """
+        按 DSN 获取共享连接池，不存在时创建
+
+        Args:
+            key: DSN 键（包含认证信息，仅用于区分连接池）
+            name: 连接池名称
+            connect: 创建新连接的函数
+            health_check: 健康检查函数
+            **kwargs: 连接池参数（max_size 等），仅在首次创建时生效
+
+        Returns:
+            ConnectionPool: 共享的连接池
+        """
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls(name, connect, health_check, **kwargs)
+                cls._pools[key] = pool
+                pool.logger.info(f"Created connection pool (max_size: {pool.max_size})")
+            return pool
+
+    @classmethod
+    def close_all_pools(cls):
+        """关闭所有共享连接池"""
+        with cls._pools_lock:
+            pools = list(cls._pools.values())
+            cls._pools.clear()
+        for pool in pools:
+            pool.close()
+
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        从池中借出一个可用连接
+        空闲连接会先做健康检查，超过最大连接数时等待归还
+
+        Args:
+            timeout: 最长等待时间（秒），不超过 acquire_timeout
+
+        Returns:
+            数据库连接
+        """
+        # 与采集器的截止时间使用同一时钟，超时时间由剩余时间决定时，超时即意味着截止时间已到
+        deadline = time.monotonic() + (
+            self.acquire_timeout if timeout is None else min(timeout, self.acquire_timeout)
+        )
+
+        while True:
+            conn = None
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(
+                            f"Timed out waiting for a connection from pool {self.name}"
+                        )
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                else:
+                    # 占位，在锁外建连
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._discard_slot()
+                    raise
+
+            # 空闲过久或健康检查失败的连接直接丢弃
+            if time.time() - last_used > self.max_idle_seconds:
+                self._close_quietly(conn)
+                self._discard_slot()
+                continue
+
+            try:
+                self._health_check(conn)
+                return conn
+            except Exception as e:
+                self.logger.warning(f"Discarding unhealthy connection: {e}")
+                self._close_quietly(conn)
+                self._discard_slot()
+
+    def release(self, conn, discard: bool = False):
+        """
+        归还连接
+
+        Args:
+            conn: 借出的连接
+            discard: 是否直接关闭（连接出错时使用）
+        """
+        if discard:
+            self._close_quietly(conn)
+            self._discard_slot()
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.time()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        借出连接的上下文管理器，出错时丢弃连接而不是放回池中
+        流式读取被中途放弃（GeneratorExit）时连接上还有未读结果，同样丢弃
+        """
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def _discard_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception as e:
+            self.logger.debug(f"Error closing connection: {e}")
+
+
 # ============================================================================
 # REST API Collector
 # ============================================================================
@@ -89,48 +624,307 @@ class RestApiCollector(BaseCollector):
     通过 HTTP 请求从 API 端点获取指标数据
     """
 
+    DRIVER_MODULES = ('requests',)
+
+    # 按 endpoint host 共享的 HTTP Session: {scheme://host: Session}
+    _sessions: Dict[str, Any] = {}
+    _sessions_lock = threading.Lock()
+
     def __init__(self, config: dict):
         super().__init__(config)
         # 延迟导入，避免不需要时报错
-        import requests
-        self.requests = requests
+        self.requests = import_driver('requests')
+        pagination = config.get('pagination') or {}
+        pool_size = max(config.get('pool_size', 10), pagination.get('parallelism', 1))
+        self.session = self._get_session(config['endpoint'], pool_size)
+        self.page_executor: Optional[ThreadPoolExecutor] = None
 
-    def collect(self) -> List[Dict[str, Any]]:
+    @classmethod
+    def _get_session(cls, endpoint: str, pool_size: int):
+        """
+        获取 endpoint 所在 host 的共享 Session，复用 keep-alive 连接和 TLS 会话
+
+        Args:
+            endpoint: API 地址
+            pool_size: 每个 host 的最大连接数
+
+        Returns:
+            requests.Session: 共享的 Session
+        """
+        # 与 __init__ 一样经 import_driver 导入，启动预热和导入耗时统计覆盖 REST 数据源
+        requests = import_driver('requests')
+
+        parts = urlsplit(endpoint)
+        host_key = f'{parts.scheme}://{parts.netloc}'
+
+        with cls._sessions_lock:
+            session = cls._sessions.get(host_key)
+            if session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount(host_key, adapter)
+                cls._sessions[host_key] = session
+            return session
+
+    @classmethod
+    def close_all_sessions(cls):
+        """关闭所有共享 Session"""
+        with cls._sessions_lock:
+            sessions = list(cls._sessions.values())
+            cls._sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def iter_batches(self) -> Iterator[List[Dict[str, Any]]]:
         """
-        从 REST API 采集数据
+        从 REST API 采集数据，配置了 pagination 时逐页返回
 
         配置示例:
             endpoint: https://metric-platform.awx.im/api/v1/metrics
             auth:
                 type: bearer_token
                 token_env: METRIC_PLATFORM_TOKEN
+            pagination:
+                type: cursor            # cursor / page / offset / link
+                page_size: 500
+                page_size_param: limit  # 每页大小的请求参数名
+                cursor_param: cursor    # cursor: 请求参数名
+                cursor_field: next_cursor  # cursor: 响应中下一页游标的字段（支持 a.b 路径）
+                page_param: page        # page: 页码参数名
+                start_page: 1           # page: 起始页码
+                offset_param: offset    # offset: 偏移量参数名
+                parallelism: 4          # offset: 并发请求的页数
+                max_pages: 1000         # 最多请求的页数
         """
-        headers = self._build_headers()
-
         try:
-            response = self.requests.get(
-                self.config['endpoint'],
-                headers=headers,
-                timeout=self.config.get('timeout', 30)
-            )
-            response.raise_for_status()
+            pagination = self.config.get('pagination')
+            if not pagination:
+                response = self._fetch_if_changed()
+                yield from chunked(self._extract_rows(self._decode(response)), self.batch_size)
+                return
 
-            # 支持不同的响应格式
-            data = response.json()
+            strategies = {
+                'cursor': self._iter_cursor_pages,
+                'page': self._iter_numbered_pages,
+                'offset': self._iter_offset_pages,
+                'link': self._iter_link_pages,
+            }
+            strategy = strategies.get(pagination.get('type'))
+            if strategy is None:
+                raise ValueError(
+                    f"Unknown pagination type: {pagination.get('type')}. "
+                    f"Supported types: {list(strategies.keys())}"
+                )
+
+            pages = 0
+            for rows in strategy(pagination):
+                pages += 1
+                if rows:
+                    yield rows
+            self.logger.info(f"Fetched {pages} page(s) from API")
 
-            # 如果响应有 data 字段，取 data；否则直接使用响应
-            if isinstance(data, dict) and 'data' in data:
-                return data['data']
-            elif isinstance(data, list):
-                return data
-            else:
-                self.logger.warning(f"Unexpected response format: {type(data)}")
-                return []
+        except self.requests.RequestException as e:
+            self.logger.error(f"Failed to fetch from API: {e}")
+            raise
+
+    def _iter_cursor_pages(self, pagination: dict) -> Iterator[List[Dict[str, Any]]]:
+        """游标分页: 从响应中读取下一页游标，直到游标为空"""
+        cursor = None
+        for _ in range(pagination.get('max_pages', 1000)):
+            params = self._page_size_params(pagination)
+            if cursor is not None:
+                params[pagination.get('cursor_param', 'cursor')] = cursor
+
+            data = self._decode(self._fetch(params=params))
+            yield self._extract_rows(data)
+
+            cursor = self._lookup(data, pagination.get('cursor_field', 'next_cursor'))
+            if not cursor:
+                return
+        self._warn_truncated(pagination)
+
+    def _iter_numbered_pages(self, pagination: dict) -> Iterator[List[Dict[str, Any]]]:
+        """
+        页码分页: 页码递增，直到返回空页
+        服务端可能限制每页行数（小于 page_size），不足一页不代表已经是最后一页
+        """
+        start_page = pagination.get('start_page', 1)
+        for page in range(start_page, start_page + pagination.get('max_pages', 1000)):
+            params = self._page_size_params(pagination)
+            params[pagination.get('page_param', 'page')] = page
+
+            rows = self._extract_rows(self._decode(self._fetch(params=params)))
+            if not rows:
+                return
+            yield rows
+        self._warn_truncated(pagination)
+
+    def _iter_link_pages(self, pagination: dict) -> Iterator[List[Dict[str, Any]]]:
+        """Link 头分页（RFC 5988）: 跟随 rel="next"，直到没有下一页"""
+        url = self.config['endpoint']
+        params = self._page_size_params(pagination)
+        for _ in range(pagination.get('max_pages', 1000)):
+            response = self._fetch(url=url, params=params)
+            yield self._extract_rows(self._decode(response))
+
+            url = response.links.get('next', {}).get('url')
+            if not url:
+                return
+            # next 链接已包含全部查询参数
+            params = None
+        self._warn_truncated(pagination)
+
+    def _iter_offset_pages(self, pagination: dict) -> Iterator[List[Dict[str, Any]]]:
+        """
+        偏移量分页: 最多 parallelism 个页面同时请求，按完成顺序返回
+        第一页单独请求，偏移量按第一页实际返回的行数推进（服务端可能限制每页行数，小于 page_size），
+        任意一页为空时停止提交新的请求
+        """
+        parallelism = pagination.get('parallelism', 4)
+        max_pages = pagination.get('max_pages', 1000)
+        offset_param = pagination.get('offset_param', 'offset')
+        step = pagination.get('page_size', 100)
+
+        def fetch_page(page: int) -> List[Dict[str, Any]]:
+            params = self._page_size_params(pagination)
+            params[offset_param] = page * step
+            return self._extract_rows(self._decode(self._fetch(params=params)))
+
+        rows = fetch_page(0)
+        if not rows:
+            return
+        yield rows
+        step = len(rows)
+
+        executor = self._get_page_executor(parallelism)
+        in_flight = set()
+        next_page = 1
+        exhausted = False
+        try:
+            while in_flight or (not exhausted and next_page < max_pages):
+                while not exhausted and next_page < max_pages and len(in_flight) < parallelism:
+                    in_flight.add(executor.submit(fetch_page, next_page))
+                    next_page += 1
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rows = future.result()
+                    if not rows:
+                        exhausted = True
+                    yield rows
+        finally:
+            for future in in_flight:
+                future.cancel()
+        if not exhausted:
+            self._warn_truncated(pagination)
+
+    def _warn_truncated(self, pagination: dict):
+        """请求页数达到 max_pages 时结果可能不完整"""
+        self.logger.warning(
+            f"Stopped after max_pages={pagination.get('max_pages', 1000)}, results may be truncated"
+        )
 
+    def _get_page_executor(self, parallelism: int) -> ThreadPoolExecutor:
+        """偏移量分页使用的线程池，与采集器同生命周期"""
+        if self.page_executor is None:
+            self.page_executor = ThreadPoolExecutor(
+                max_workers=parallelism, thread_name_prefix=f'pages-{self.name}'
+            )
+        return self.page_executor
+
+    def _page_size_params(self, pagination: dict) -> dict:
+        """每页大小参数"""
+        return {pagination.get('page_size_param', 'limit'): pagination.get('page_size', 100)}
+
+    @staticmethod
+    def _lookup(data: Any, path: str) -> Any:
+        """按 a.b.c 路径读取响应字段"""
+        for key in path.split('.'):
+            if not isinstance(data, dict):
+                return None
+            data = data.get(key)
+        return data
+
+    def _extract_rows(self, data: Any) -> List[Dict[str, Any]]:
+        """从响应中取出数据行"""
+        # 如果响应有 data 字段，取 data；否则直接使用响应
+        if isinstance(data, dict) and 'data' in data:
+            return data['data']
+        elif isinstance(data, list):
+            return data
+        else:
+            self.logger.warning(f"Unexpected response format: {type(data)}")
+            return []
+
+    def fetch_payload(self) -> tuple:
+        """获取未解析的响应体（不支持分页）"""
+        if self.config.get('pagination'):
+            raise ValueError("parse_in_process is not supported with pagination")
+        try:
+            return self._fetch_if_changed().content, 'json'
         except self.requests.RequestException as e:
             self.logger.error(f"Failed to fetch from API: {e}")
             raise
 
+    def _fetch(self, url: Optional[str] = None, params: Optional[dict] = None,
+               headers: Optional[dict] = None):
+        """
+        发送请求并检查状态码
+        超时不超过本周期的剩余时间；响应体流式读取，截止时间到达时关闭响应中断读取
+        """
+        self.check_deadline()
+        response = self.session.get(
+            url or self.config['endpoint'],
+            params=params,
+            headers={**self._build_headers(), **(headers or {})},
+            timeout=self.timeout_for(self.config.get('timeout', 30)),
+            stream=True
+        )
+        with self.cancellable(response.close):
+            try:
+                response.raise_for_status()
+                self.record_bytes(len(response.content))
+            finally:
+                # 读取完成后归还连接；中途出错时断开连接
+                response.close()
+        return response
+
+    def _decode(self, response) -> Any:
+        """解析响应 JSON"""
+        with self.phase('decode'):
+            return response.json()
+
+    def _fetch_if_changed(self):
+        """
+        条件请求: 带上次成功发布时的 ETag / Last-Modified，
+        服务端返回 304 或响应内容哈希不变时抛出 SourceUnchanged
+        """
+        headers = {}
+        if self.change_detection and self.committed_version:
+            etag, last_modified, _ = self.committed_version
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        response = self._fetch(headers=headers)
+        if response.status_code == 304:
+            raise SourceUnchanged(f"{self.name} returned 304 Not Modified")
+
+        # 服务端不支持条件请求时，以内容哈希作为兜底
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        if self.committed_version and self.committed_version[2] == content_hash:
+            raise SourceUnchanged(f"{self.name} payload unchanged")
+        self.check_version((etag, last_modified, content_hash))
+        return response
+
+    def close(self):
+        """关闭分页线程池（Session 按 host 共享，由 close_all_sessions() 关闭）"""
+        if self.page_executor is not None:
+            self.page_executor.shutdown(wait=False, cancel_futures=True)
+
     def _build_headers(self) -> dict:
         """构建 HTTP 请求头，处理认证信息"""
         headers = {
@@ -178,39 +972,141 @@ class BigQueryCollector(BaseCollector):
     执行 SQL 查询从 BigQuery 获取指标数据
     """
 
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, client=None, job_config_factory: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            config: 数据源配置
+            client: BigQuery 客户端，默认按 project 创建（测试时可传入本地假客户端）
+            job_config_factory: 创建查询配置的函数，默认 bigquery.QueryJobConfig
+                                （测试时可传入返回普通对象的函数，dry run 和计费上限不需要安装 BigQuery 库）
+        """
         super().__init__(config)
-        # 延迟导入 BigQuery 客户端
-        from google.cloud import bigquery
-        self.client = bigquery.Client(project=config.get('project'))
+        if client is None:
+            # 延迟导入 BigQuery 客户端（传入客户端时不导入，查询配置用到时再导入）
+            client = import_driver('google.cloud.bigquery').Client(project=config.get('project'))
+        self.client = client
+        self.job_config_factory = job_config_factory
+        self.read_format = config.get('read_format', 'rows')
+        self.max_bytes_billed = config.get('max_bytes_billed')
+        self.estimated_bytes: Optional[int] = None  # 最近一次 dry run 的预估扫描量
 
-    def collect(self) -> List[Dict[str, Any]]:
+    @classmethod
+    def driver_modules(cls, config: dict) -> tuple:
+        if config.get('read_format') == 'arrow':
+            return ('google.cloud.bigquery', 'pyarrow')
+        return ('google.cloud.bigquery',)
+
+    def iter_batches(self) -> Iterator[Any]:
         """
-        从 BigQuery 执行查询并返回结果
+        从 BigQuery 执行查询并按页返回结果
 
         配置示例:
             project: risk-prod-xxx
+            batch_size: 10000   # 每页行数
+            read_format: arrow  # rows（逐行字典）或 arrow（Arrow RecordBatch -> ColumnBatch）
+            max_bytes_billed: 10737418240  # 执行前 dry run 预估扫描量，超过时跳过本次查询
             query: |
                 SELECT account_id, block_rate, failed_auth_rate
                 FROM `risk-prod.ads_pafraud.daily_merchant_stats`
                 WHERE date = CURRENT_DATE()
+
+        增量模式（查询中用 @watermark 引用上次水位）:
+            incremental:
+                column: updated_at
+                type: TIMESTAMP     # watermark 参数类型
+                initial: '1970-01-01 00:00:00'
+            query: SELECT ... WHERE updated_at >= @watermark   # 用 >=，与上次水位重叠，同一时间戳的行不会遗漏
         """
         query = self.config['query']
 
         try:
-            # 执行查询
-            query_job = self.client.query(query)
-            results = query_job.result()
-
-            # 转换为字典列表
-            data = [dict(row) for row in results]
-            self.logger.info(f"Fetched {len(data)} rows from BigQuery")
-            return data
-
+            if self.max_bytes_billed:
+                self._check_budget(query)
+
+            # 执行查询，按页读取结果；截止时间到达时取消作业，释放 slot
+            self.check_deadline()
+            query_job = self.client.query(query, job_config=self._job_config())
+            with self.cancellable(query_job.cancel):
+                results = query_job.result(page_size=self.batch_size, timeout=self.remaining())
+
+                if self.read_format == 'arrow':
+                    batches = self._decode_arrow(self._iter_arrow(results))
+                else:
+                    batches = self._decode_pages(results.pages)
+
+                total = 0
+                for batch in batches:
+                    total += len(batch)
+                    if self.incremental:
+                        self.track_watermark(batch)
+                    yield batch
+
+            self.logger.info(f"Fetched {total} rows from BigQuery")
+
+        except (QueryBudgetExceeded, DeadlineExceeded):
+            raise
         except Exception as e:
             self.logger.error(f"BigQuery query failed: {e}")
             raise
 
+    def _decode_arrow(self, record_batches) -> Iterator[ColumnBatch]:
+        """Arrow RecordBatch 转为 ColumnBatch"""
+        for record_batch in record_batches:
+            self.record_bytes(record_batch.nbytes)
+            with self.phase('decode'):
+                batch = arrow_to_columns(record_batch)
+            yield batch
+
+    def _decode_pages(self, pages) -> Iterator[List[Dict[str, Any]]]:
+        """结果页转为字典列表"""
+        for page in pages:
+            with self.phase('decode'):
+                batch = [dict(row) for row in page]
+            yield batch
+
+    def _iter_arrow(self, results):
+        """按 Arrow RecordBatch 读取结果（假客户端可只实现 to_arrow() 返回 Arrow Table）"""
+        if hasattr(results, 'to_arrow_iterable'):
+            return results.to_arrow_iterable()
+        return results.to_arrow().to_batches(max_chunksize=self.batch_size)
+
+    def _check_budget(self, query: str):
+        """dry run 预估扫描量，超过 max_bytes_billed 时抛出 QueryBudgetExceeded"""
+        job_config = self._job_config()
+        job_config.dry_run = True
+        job_config.use_query_cache = False
+
+        dry_run_job = self.client.query(query, job_config=job_config)
+        self.estimated_bytes = dry_run_job.total_bytes_processed or 0
+        if self.estimated_bytes > self.max_bytes_billed:
+            raise QueryBudgetExceeded(
+                f"Query would process {self.estimated_bytes} bytes, "
+                f"exceeding max_bytes_billed {self.max_bytes_billed}"
+            )
+        self.logger.info(f"Dry run estimate: {self.estimated_bytes} bytes")
+
+    @property
+    def bigquery(self):
+        """google.cloud.bigquery 模块"""
+        return import_driver('google.cloud.bigquery')
+
+    def _job_config(self):
+        """查询配置，增量模式下绑定 @watermark 参数，同时设置计费上限；两者都未配置时返回 None"""
+        if not self.max_bytes_billed and not self.incremental:
+            return None
+        job_config = (self.job_config_factory or self.bigquery.QueryJobConfig)()
+        if self.max_bytes_billed:
+            job_config.maximum_bytes_billed = self.max_bytes_billed
+        if self.incremental:
+            job_config.query_parameters = [self.bigquery.ScalarQueryParameter(
+                'watermark', self.incremental.get('type', 'TIMESTAMP'), self.watermark
+            )]
+        return job_config
+
+    def close(self):
+        """关闭 BigQuery 客户端"""
+        self.client.close()
+
 
 # ============================================================================
 # Database Collector (MySQL/PostgreSQL)
@@ -221,14 +1117,19 @@ class DatabaseCollector(BaseCollector):
     支持 MySQL 和 PostgreSQL
     """
 
+    # 驱动类型对应的驱动模块
+    DRIVERS = {'mysql': ('pymysql',), 'postgresql': ('psycopg2',)}
+
     def __init__(self, config: dict):
         super().__init__(config)
         self.conn_config = config['connection']
         self.driver = self.conn_config.get('driver', 'mysql')
+        self.pool = self._get_pool()
 
-    def collect(self) -> List[Dict[str, Any]]:
+    def iter_batches(self) -> Iterator[List[Dict[str, Any]]]:
         """
-        从数据库执行查询并返回结果
+        从数据库执行查询并分批返回结果
+        使用服务端游标（MySQL SSCursor / PostgreSQL 命名游标）+ fetchmany，结果不会一次性加载到内存
 
         配置示例:
             connection:
@@ -238,54 +1139,158 @@ class DatabaseCollector(BaseCollector):
                 database: risk_db
                 username_env: MYSQL_USER
                 password_env: MYSQL_PASSWORD
+                pool_size: 5             # 连接池最大连接数（同一 DSN 的数据源共享）
+                pool_idle_seconds: 300   # 空闲连接最长保留时间
+                pool_timeout: 30         # 获取连接的最长等待时间
+            batch_size: 10000            # 每次 fetchmany 的行数
             query: SELECT account_id, alert_threshold FROM merchant_config
+
+        增量模式（查询中用 %(watermark)s 引用上次水位，字面量 % 需写成 %%）:
+            incremental:
+                column: updated_at
+                initial: '1970-01-01 00:00:00'
+            query: SELECT ... WHERE updated_at >= %(watermark)s   # 用 >=，与上次水位重叠，同一时间戳的行不会遗漏
         """
-        conn = self._get_connection()
+        total = 0
+        params = {'watermark': self.watermark} if self.incremental else None
+        connect_start = time.perf_counter()
+        with self.pool.connection(timeout=self.remaining()) as conn:
+            self.record_phase('connect', time.perf_counter() - connect_start)
+            cursor = self._open_cursor(conn)
+            try:
+                # 截止时间到达时在服务端取消查询（执行中或流式读取中）
+                with self.cancellable(self._query_canceller(conn)):
+                    cursor.execute(self.config['query'], params)
+
+                    # 列名在第一次 fetch 之后读取: PostgreSQL 命名游标的 description 在 execute() 后仍为 None
+                    columns = None
+                    while True:
+                        rows = cursor.fetchmany(self.batch_size)
+                        if not rows:
+                            break
+                        if columns is None:
+                            columns = [desc[0] for desc in cursor.description]
+                        total += len(rows)
+                        # 转换为字典列表
+                        with self.phase('decode'):
+                            batch = [dict(zip(columns, row)) for row in rows]
+                        if self.incremental:
+                            self.track_watermark(batch)
+                        yield batch
+            finally:
+                cursor.close()
+
+            if self.driver == 'postgresql':
+                # 命名游标需要事务，读取结束后恢复 autocommit（出错时连接会被连接池丢弃）
+                conn.rollback()
+                conn.autocommit = True
+
+        self.logger.info(f"Fetched {total} rows from database")
 
-        try:
-            cursor = conn.cursor()
-            cursor.execute(self.config['query'])
+    @classmethod
+    def driver_modules(cls, config: dict) -> tuple:
+        return cls.DRIVERS.get(config.get('connection', {}).get('driver', 'mysql'), ())
 
-            # 获取列名
-            columns = [desc[0] for desc in cursor.description]
-            rows = cursor.fetchall()
+    def _open_cursor(self, conn):
+        """打开服务端（流式）游标"""
+        if self.driver == 'mysql':
+            import pymysql.cursors
+            return conn.cursor(pymysql.cursors.SSCursor)
 
-            # 转换为字典列表
-            data = [dict(zip(columns, row)) for row in rows]
-            self.logger.info(f"Fetched {len(data)} rows from database")
-            return data
+        # PostgreSQL 命名游标只能在事务内使用
+        conn.autocommit = False
+        cursor = conn.cursor(name=f'exporter_{self.name}_{threading.get_ident()}')
+        cursor.itersize = self.batch_size
+        return cursor
 
-        finally:
-            conn.close()
+    def _query_canceller(self, conn) -> Callable[[], None]:
+        """
+        返回取消 conn 上进行中查询的函数（在监视线程中调用）
+        - PostgreSQL: conn.cancel() 发送协议级取消请求
+        - MySQL: 另开一个连接执行 KILL QUERY <thread_id>
+        被取消的连接随后由连接池丢弃
+        """
+        if self.driver == 'postgresql':
+            return conn.cancel
+
+        thread_id = conn.thread_id()
+
+        def kill_query():
+            killer = self._connect(*self.connect_args)
+            try:
+                cursor = killer.cursor()
+                try:
+                    cursor.execute(f'KILL QUERY {int(thread_id)}')
+                finally:
+                    cursor.close()
+            finally:
+                killer.close()
+
+        return kill_query
+
+    def _get_pool(self) -> ConnectionPool:
+        """获取当前 DSN 对应的共享连接池"""
+        if self.driver not in self.DRIVERS:
+            raise ValueError(f"Unsupported database driver: {self.driver}")
 
-    def _get_connection(self):
-        """获取数据库连接"""
         host = os.environ.get(self.conn_config.get('host_env', 'DB_HOST'), 'localhost')
         port = self.conn_config.get('port', 3306)
         database = self.conn_config.get('database', '')
         username = os.environ.get(self.conn_config.get('username_env', 'DB_USER'), '')
         password = os.environ.get(self.conn_config.get('password_env', 'DB_PASSWORD'), '')
 
+        key = (self.driver, host, port, database, username, password)
+        name = f'{self.driver}://{username}@{host}:{port}/{database}'
+        self.connect_args = (host, port, database, username, password)
+
+        return ConnectionPool.get_or_create(
+            key, name,
+            connect=lambda: self._connect(host, port, database, username, password),
+            health_check=self._health_check,
+            max_size=self.conn_config.get('pool_size', 5),
+            max_idle_seconds=self.conn_config.get('pool_idle_seconds', 300),
+            acquire_timeout=self.conn_config.get('pool_timeout', 30),
+        )
+
+    def _connect(self, host: str, port: int, database: str, username: str, password: str):
+        """
+        创建数据库连接
+        连接开启 autocommit，复用时每次查询都能读到最新快照
+        """
         if self.driver == 'mysql':
-            import pymysql
+            pymysql = import_driver('pymysql')
             return pymysql.connect(
                 host=host,
                 port=port,
                 user=username,
                 password=password,
-                database=database
+                database=database,
+                autocommit=True
             )
-        elif self.driver == 'postgresql':
-            import psycopg2
-            return psycopg2.connect(
+        else:
+            psycopg2 = import_driver('psycopg2')
+            conn = psycopg2.connect(
                 host=host,
                 port=port,
                 user=username,
                 password=password,
                 dbname=database
             )
+            conn.autocommit = True
+            return conn
+
+    def _health_check(self, conn):
+        """检查池中空闲连接是否可用，不可用时抛出异常"""
+        if self.driver == 'mysql':
+            conn.ping(reconnect=False)
         else:
-            raise ValueError(f"Unsupported database driver: {self.driver}")
+            if conn.closed:
+                raise ConnectionError("Connection already closed")
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
 
 
 # ============================================================================
@@ -297,57 +1302,173 @@ class GcsCollector(BaseCollector):
     从 GCS 读取 JSON/CSV 文件获取指标数据
     """
 
+    DRIVER_MODULES = ('google.cloud.storage',)
+
     def __init__(self, config: dict):
         super().__init__(config)
-        from google.cloud import storage
+        storage = import_driver('google.cloud.storage')
         self.client = storage.Client()
         self.bucket = self.client.bucket(config['bucket'])
 
-    def collect(self) -> List[Dict[str, Any]]:
+    def iter_batches(self) -> Iterator[List[Dict[str, Any]]]:
         """
-        从 GCS 读取文件并解析
+        从 GCS 读取文件并分批解析
+        CSV 和 NDJSON 按块流式读取，JSON 需要完整下载后解析
 
         配置示例:
             bucket: awx-ml-platform-prod
             path_pattern: "metrics/hourly/{date}/report.json"
-            format: json
+            format: json   # json / ndjson / csv
         """
-        # 替换路径模板变量
-        path = self.config['path_pattern'].format(
-            date=datetime.now().strftime('%Y-%m-%d'),
-            hour=datetime.now().strftime('%H')
-        )
-
         try:
-            blob = self.bucket.blob(path)
-            content = blob.download_as_text()
-
+            blob = self._get_blob_if_changed()
             file_format = self.config.get('format', 'json')
+            # 流式读取时以元数据中的文件大小计（未开启变更检测时没有元数据）
+            self.record_bytes(blob.size or 0)
 
             if file_format == 'json':
-                data = json.loads(content)
+                content = blob.download_as_text(timeout=self.timeout_for(GCS_TIMEOUT))
+                if blob.size is None:
+                    self.record_bytes(len(content))
+                with self.phase('decode'):
+                    data = json.loads(content)
                 if isinstance(data, dict) and 'data' in data:
-                    return data['data']
-                return data if isinstance(data, list) else [data]
+                    data = data['data']
+                yield from chunked(data if isinstance(data, list) else [data], self.batch_size)
+
+            elif file_format == 'ndjson':
+                # 截止时间到达时关闭下载流，中断阻塞中的读取
+                with blob.open('r', encoding='utf-8') as f, self.cancellable(f.close):
+                    rows = (json.loads(line) for line in f if line.strip())
+                    yield from chunked(rows, self.batch_size)
 
             elif file_format == 'csv':
                 import csv
-                import io
-                reader = csv.DictReader(io.StringIO(content))
-                return list(reader)
+                with blob.open('r', encoding='utf-8', newline='') as f, self.cancellable(f.close):
+                    yield from chunked(csv.DictReader(f), self.batch_size)
 
             else:
                 raise ValueError(f"Unsupported file format: {file_format}")
 
+        except (SourceUnchanged, DeadlineExceeded):
+            raise
         except Exception as e:
             self.logger.error(f"Failed to read from GCS: {e}")
             raise
 
+    def fetch_payload(self) -> tuple:
+        """下载未解析的文件内容"""
+        try:
+            blob = self._get_blob_if_changed()
+            payload = blob.download_as_bytes(timeout=self.timeout_for(GCS_TIMEOUT))
+            self.record_bytes(len(payload))
+            return payload, self.config.get('format', 'json')
+        except (SourceUnchanged, DeadlineExceeded):
+            raise
+        except Exception as e:
+            self.logger.error(f"Failed to read from GCS: {e}")
+            raise
 
-# ============================================================================
-# Collector Factory
-# ============================================================================
-class CollectorFactory:
+    def _get_blob_if_changed(self):
+        """
+        获取 blob，开启变更检测时先读取元数据比较 generation / md5，未变化时抛出 SourceUnchanged
+        reload() 后 blob 固定在该 generation，下载的内容与比较的版本一致
+        """
+        path = self._resolve_path()
+        blob = self.bucket.blob(path)
+        if self.change_detection:
+            blob.reload(timeout=self.timeout_for(GCS_TIMEOUT))
+            self.check_version((path, blob.generation, blob.md5_hash))
+        return blob
+
+    def _resolve_path(self) -> str:
+        """替换路径模板变量"""
+        now = datetime.now()
+        return self.config['path_pattern'].format(
+            date=now.strftime('%Y-%m-%d'),
+            hour=now.strftime('%H')
+        )
+
+    def close(self):
+        """关闭 GCS 客户端"""
+        self.client.close()
+
+
+# ============================================================================
+# 增量采集水位持久化
+# ============================================================================
+class WatermarkStore:
+    """
+    增量采集水位存储
+    以 JSON 文件保存 {source_name: watermark}，重启后从上次水位继续
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 状态文件路径
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger('watermarks')
+        self.watermarks: Dict[str, Any] = {}
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.watermarks = json.load(f)
+            self.logger.info(f"Loaded {len(self.watermarks)} watermark(s) from {path}")
+
+    def get(self, source_name: str) -> Any:
+        """获取数据源的水位，没有记录时返回 None"""
+        with self.lock:
+            return self.watermarks.get(source_name)
+
+    def save(self, source_name: str, watermark: Any):
+        """
+        更新水位并写入文件（先写临时文件再原子替换）
+
+        Args:
+            source_name: 数据源名称
+            watermark: 新水位，datetime 等类型以 ISO 字符串保存
+        """
+        if isinstance(watermark, (datetime, date)):
+            watermark = watermark.isoformat(sep=' ') if isinstance(watermark, datetime) else watermark.isoformat()
+
+        with self.lock:
+            if self.watermarks.get(source_name) == watermark:
+                return
+            self.watermarks[source_name] = watermark
+            self._write()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前所有水位的副本（写入序列快照时使用）"""
+        with self.lock:
+            return dict(self.watermarks)
+
+    def replace(self, watermarks: Dict[str, Any]):
+        """
+        整体替换水位并写入文件
+        从序列快照恢复时使用: 水位必须与恢复的序列一致，比快照更新的水位会跳过快照之后变化的行
+        """
+        with self.lock:
+            self.watermarks = dict(watermarks)
+            self._write()
+
+    def _write(self):
+        """写入文件（先写临时文件再原子替换，调用方需持有 self.lock）"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.watermarks, f, indent=2, default=str)
+        os.replace(tmp_path, self.path)
+
+
+# ============================================================================
+# Collector Factory
+# ============================================================================
+class CollectorFactory:
     """
     采集器工厂类
     根据配置中的 type 字段创建对应的采集器实例
@@ -394,113 +1515,2779 @@ class CollectorFactory:
         cls.COLLECTORS[type_name] = collector_class
 
 
+# ============================================================================
+# 共享获取（多个数据源复用同一次查询/请求）
+# ============================================================================
+class SharedFetchCoordinator:
+    """
+    共享获取协调器
+    获取配置相同（类型 + 查询/端点 + 认证等，即除映射相关字段外的全部配置）的数据源共用一个 fetch key:
+    - single-flight: 同一 fetch key 同时只执行一次获取，其他数据源等待并复用结果
+    - 新鲜度窗口: 结果在数据源的 window 内被直接复用，不重新查询
+    结果需要完整保留在内存中以分发给多个映射计划，适合中小结果集
+    """
+
+    # 只影响映射和发布、不影响获取结果的配置字段
+    PER_SOURCE_FIELDS = {
+        'name', 'enabled', 'interval', 'metrics', 'ttl', 'max_series', 'overflow',
+        'metrics_backend', 'parse_in_process', 'shared_fetch', 'change_detection', 'batch_size',
+        'retry', 'adaptive_interval', 'deadline', 'aggregations', 'publish_raw',
+    }
+
+    def __init__(self, iterate: Callable[[BaseCollector], Iterable]):
+        """
+        Args:
+            iterate: 读取采集器批次的函数（支持原生异步采集器）
+        """
+        self.iterate = iterate
+        self.lock = threading.Lock()
+        # {fetch_key: {'collector', 'lock', 'batches', 'fetched_at'}}
+        self.entries: Dict[str, dict] = {}
+        self.logger = logging.getLogger('shared_fetch')
+
+    @classmethod
+    def fetch_key(cls, source: dict) -> str:
+        """根据获取相关的配置计算 fetch key"""
+        fetch_config = {k: v for k, v in source.items() if k not in cls.PER_SOURCE_FIELDS}
+        return hashlib.sha256(json.dumps(fetch_config, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    def fetch(self, source: dict, window: float, owner: Optional[BaseCollector] = None) -> tuple:
+        """
+        获取数据源的共享结果
+
+        Args:
+            source: 数据源配置
+            window: 新鲜度窗口（秒），缓存结果未超过该时长时直接复用
+            owner: 发起获取的采集器，其截止时间同时约束等待和实际获取，到期时取消共享采集器的获取
+
+        Returns:
+            tuple: (batches, fetched_at, phase_seconds, bytes_read)
+                   phase_seconds 和 bytes_read 只在本次调用实际执行了获取时非空
+        """
+        key = self.fetch_key(source)
+        entry = self._entry(key)
+
+        remaining = owner.remaining() if owner is not None else None
+        if not entry['lock'].acquire(timeout=-1 if remaining is None else remaining):
+            raise DeadlineExceeded(f"{source['name']} timed out waiting for shared fetch {key}")
+        try:
+            if entry['batches'] is not None and time.time() - entry['fetched_at'] <= window:
+                return entry['batches'], entry['fetched_at'], {}, 0
+
+            collector = self._collector(entry, key, source)
+            # 先释放旧结果，避免新旧两份同时驻留内存
+            entry['batches'] = None
+            collector.arm_deadline(owner.remaining() if owner is not None else None)
+            batches = []
+            with owner.cancellable(collector.cancel) if owner is not None else nullcontext():
+                for batch in self.iterate(collector):
+                    collector.check_deadline()
+                    batches.append(batch)
+            entry['batches'], entry['fetched_at'] = batches, time.time()
+            phases, bytes_read = collector.pop_instrumentation()
+            self.logger.info(f"[{source['name']}] Fetched shared result {key} ({sum(map(len, batches))} rows)")
+            return batches, entry['fetched_at'], phases, bytes_read
+        finally:
+            entry['lock'].release()
+
+    def prepare(self, source: dict):
+        """预先创建数据源对应的共享采集器（启动时并行初始化调用），首次获取不再承担建客户端的耗时"""
+        key = self.fetch_key(source)
+        entry = self._entry(key)
+        with entry['lock']:
+            self._collector(entry, key, source)
+
+    def _entry(self, key: str) -> dict:
+        """获取（创建）fetch key 对应的条目"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {
+                    'collector': None, 'lock': threading.Lock(), 'batches': None, 'fetched_at': None,
+                }
+            return entry
+
+    def _collector(self, entry: dict, key: str, source: dict) -> BaseCollector:
+        """获取（创建）条目的共享采集器（调用方需持有 entry['lock']）"""
+        if entry['collector'] is None:
+            config = {k: v for k, v in source.items() if k not in self.PER_SOURCE_FIELDS}
+            # 共享采集器由多个数据源使用，变更检测在各数据源的 SharedFetchCollector 中进行
+            config.update(name=f'shared_{key}', change_detection=False,
+                          batch_size=source.get('batch_size', DEFAULT_BATCH_SIZE))
+            entry['collector'] = CollectorFactory.create(config)
+        return entry['collector']
+
+    def prune(self, keys: set):
+        """关闭不再被任何数据源使用的共享采集器（配置热加载后调用）"""
+        with self.lock:
+            stale = [self.entries.pop(key) for key in list(self.entries) if key not in keys]
+        for entry in stale:
+            if entry['collector'] is not None:
+                entry['collector'].close()
+
+    def close(self):
+        """关闭所有共享采集器"""
+        self.prune(set())
+
+
+class SharedFetchCollector(BaseCollector):
+    """
+    声明了 shared_fetch 的数据源使用的采集器
+    实际获取由 SharedFetchCoordinator 合并执行，本采集器只取回共享结果；
+    同一份结果已经由本数据源发布过时抛出 SourceUnchanged，跳过映射和发布
+
+    配置示例:
+        shared_fetch:
+          window: 5m   # 结果在 5 分钟内被其他数据源复用（默认等于本数据源的 interval）
+    """
+
+    def __init__(self, config: dict, coordinator: SharedFetchCoordinator, window: float):
+        """
+        Args:
+            config: 数据源配置
+            coordinator: 共享获取协调器
+            window: 新鲜度窗口（秒）
+        """
+        super().__init__(config)
+        if self.incremental:
+            raise ValueError("shared_fetch cannot be combined with incremental")
+        if config.get('parse_in_process'):
+            raise ValueError("shared_fetch cannot be combined with parse_in_process")
+        self.coordinator = coordinator
+        self.window = window
+
+    def iter_batches(self) -> Iterator[Any]:
+        batches, fetched_at, phases, bytes_read = self.coordinator.fetch(self.config, self.window, owner=self)
+        # 本次调用执行了获取时，把获取的各阶段耗时计入本数据源
+        for phase, seconds in phases.items():
+            self.record_phase(phase, seconds)
+        self.record_bytes(bytes_read)
+        self.check_version(fetched_at)
+        yield from batches
+
+
+# ============================================================================
+# 时间序列存储后端
+# ============================================================================
+def _estimate_size(obj: Any, seen: set, depth: int = 4) -> int:
+    """
+    递归估算对象占用的内存（字节），跟随容器元素、__dict__ 和 __slots__
+    seen 中的对象不重复计算，用于排除多个序列共享的对象
+    """
+    if depth < 0 or id(obj) in seen or isinstance(obj, type) or callable(obj):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        children = itertools.chain(obj.keys(), obj.values())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = obj
+    else:
+        children = []
+        attributes = getattr(obj, '__dict__', None)
+        if attributes is not None:
+            size += sys.getsizeof(attributes)
+            children = list(attributes.values())
+        for slot in getattr(type(obj), '__slots__', ()):
+            children.append(getattr(obj, slot, None))
+
+    return size + sum(_estimate_size(child, seen, depth - 1) for child in children)
+
+
+class GaugeSeriesStore:
+    """
+    基于 prometheus_client Gauge 的时间序列存储（默认后端）
+    每个标签组合对应一个 Gauge 子对象，时间戳单独记录在字典中
+    """
+
+    def __init__(self, name: str, description: str, labelnames: List[str], registry=REGISTRY):
+        """
+        Args:
+            name: 指标名称
+            description: 指标描述
+            labelnames: 标签列表
+            registry: 注册到的 Prometheus Registry
+        """
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        if self.labelnames:
+            self.gauge = Gauge(name, description, labelnames, registry=registry)
+        else:
+            # 无标签的 Gauge 总会输出一个样本: 由存储自身注册，没有序列（未发布、已过期或已清空）时不输出
+            self.gauge = Gauge(name, description, registry=None)
+            if registry is not None:
+                registry.register(self)
+        # {label_values: timestamp}，label_values 按标签定义顺序排列
+        self.timestamps: Dict[tuple, float] = {}
+        # 当前的子序列字典和时间戳字典已被 freeze() 导出，原地修改前需要先复制
+        self._shared = False
+
+    def describe(self):
+        """无标签指标注册到 Registry 时提供指标名做冲突检测"""
+        return self.gauge.describe()
+
+    def collect(self):
+        """无标签指标拉取时调用，序列已删除时只输出指标元信息，与列式存储一致"""
+        if self.timestamps:
+            yield from self.gauge.collect()
+        else:
+            yield GaugeMetricFamily(self.name, self.description)
+
+    def _unshare(self):
+        """写时复制: 原地修改前复制已导出的字典，导出方看到的内容保持不变"""
+        if self._shared:
+            if self.labelnames:
+                with self.gauge._lock:
+                    self.gauge._metrics = dict(self.gauge._metrics)
+            self.timestamps = dict(self.timestamps)
+            self._shared = False
+
+    def set(self, key: tuple, value: float, ts: float):
+        """设置单个序列的值和时间戳"""
+        self._unshare()
+        self._child(self.gauge, key).set(value)
+        self.timestamps[key] = ts
+
+    def _child(self, gauge: Gauge, key: tuple) -> Gauge:
+        """获取标签组合对应的子序列，无标签指标直接使用 Gauge 本身"""
+        return gauge.labels(*key) if self.labelnames else gauge
+
+    def stage(self, series: Dict[tuple, float], ts: float):
+        """
+        在锁外构建新快照
+        使用未注册到 REGISTRY 的临时 Gauge 构建子序列
+
+        Args:
+            series: {label_values: value}
+            ts: 快照时间戳
+
+        Returns:
+            可传给 swap() / merge() 的快照
+        """
+        if not self.labelnames:
+            return series, dict.fromkeys(series, ts)
+
+        staging = Gauge(self.name, self.description, self.labelnames, registry=None)
+        for key, value in series.items():
+            staging.labels(*key).set(value)
+        return staging._metrics, dict.fromkeys(staging._metrics, ts)
+
+    def swap(self, staged):
+        """用新快照整体替换（指针替换，拉取线程要么看到旧快照，要么看到新快照）"""
+        if not self.labelnames:
+            self.merge(staged)
+            return
+        self.gauge._metrics, self.timestamps = staged
+        self._shared = False
+
+    def merge(self, staged):
+        """将新快照合并到已有数据中"""
+        self._unshare()
+        children, timestamps = staged
+        if not self.labelnames:
+            for value in children.values():
+                self.gauge.set(value)
+        else:
+            with self.gauge._lock:
+                self.gauge._metrics.update(children)
+        self.timestamps.update(timestamps)
+
+    def timestamp(self, key: tuple) -> Optional[float]:
+        """获取序列的最后更新时间，不存在时返回 None"""
+        return self.timestamps.get(key)
+
+    def value(self, key: tuple) -> Optional[float]:
+        """获取序列的当前值，不存在时返回 None"""
+        if key not in self.timestamps:
+            return None
+        child = self.gauge._metrics.get(key) if self.labelnames else self.gauge
+        return None if child is None else child._value.get()
+
+    def touch(self, ts: float, keys: Optional[Iterable[tuple]] = None) -> tuple:
+        """
+        刷新序列的时间戳（数值不变）
+
+        Args:
+            ts: 新的时间戳
+            keys: 只刷新这些序列（不存在的忽略），默认刷新所有序列
+
+        Returns:
+            tuple: 被刷新的 label_values
+        """
+        if keys is None:
+            self.timestamps = dict.fromkeys(self.timestamps, ts)
+            return tuple(self.timestamps)
+        self._unshare()
+        touched = tuple(key for key in keys if key in self.timestamps)
+        self.timestamps.update(dict.fromkeys(touched, ts))
+        return touched
+
+    def remove(self, key: tuple):
+        """删除单个序列"""
+        self._unshare()
+        if self.labelnames:
+            self.gauge.remove(*key)
+        del self.timestamps[key]
+
+    def clear(self):
+        """清空所有序列"""
+        if self.labelnames:
+            self.gauge._metrics = {}
+        self.timestamps = {}
+        self._shared = False
+
+    def unregister(self):
+        """从 Registry 中移除该指标"""
+        if self.registry is not None:
+            self.registry.unregister(self.gauge if self.labelnames else self)
+
+    def last_update(self) -> Optional[float]:
+        """所有序列中最近的更新时间，没有序列时返回 None"""
+        return max(self.timestamps.values(), default=None)
+
+    def freeze(self) -> tuple:
+        """
+        取得当前序列的只读引用（O(1)，调用方需持有 MetricsManager.lock）
+        之后的原地修改先复制字典，返回的引用可以在锁外传给 export()
+        """
+        self._shared = True
+        return self.gauge._metrics if self.labelnames else None, self.timestamps
+
+    def export(self, frozen: tuple) -> '_ColumnarSnapshot':
+        """将 freeze() 的结果转换为列式快照（在锁外执行），用于写入磁盘快照"""
+        children, timestamps = frozen
+        snapshot = _ColumnarSnapshot(len(self.labelnames))
+        for key, ts in timestamps.items():
+            child = children.get(key) if children is not None else self.gauge
+            if child is not None:
+                snapshot.upsert(key, child._value.get(), ts)
+        return snapshot
+
+    def estimated_bytes(self, sample_size: int = 100) -> int:
+        """
+        估算序列占用的内存（字节）
+        抽样 sample_size 个序列（标签元组 + Gauge 子对象）计算平均大小，再按序列数外推
+        """
+        if not self.labelnames:
+            return _estimate_size(self.gauge, set())
+
+        # 只在取样时持有 Gauge 的锁（与 merge / labels() 互斥），大小计算在锁外进行
+        with self.gauge._lock:
+            metrics = self.gauge._metrics
+            sample = list(itertools.islice(metrics.items(), sample_size))
+        # Gauge 本身的属性（名称、标签名等）由所有子对象共享，不计入单个序列
+        seen = {id(value) for value in vars(self.gauge).values()}
+        size = sys.getsizeof(metrics) + sys.getsizeof(self.timestamps)
+        if sample:
+            sampled = sum(_estimate_size(key, seen) + _estimate_size(child, seen) for key, child in sample)
+            # 每个序列另有一个 float 时间戳
+            size += int(len(metrics) * (sampled / len(sample) + sys.getsizeof(0.0)))
+        return size
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+class _ColumnarSnapshot:
+    """
+    列式快照
+    标签值按列驻留为整数 ID（每列一张字符串表），数值和时间戳存放在 array('d') 中
+    """
+
+    __slots__ = ('label_tables', 'label_ids', 'label_columns', 'values', 'timestamps', 'index')
+
+    def __init__(self, label_count: int):
+        self.label_tables: List[List[str]] = [[] for _ in range(label_count)]  # 列内 ID -> 字符串
+        self.label_ids: List[Dict[str, int]] = [{} for _ in range(label_count)]  # 列内字符串 -> ID
+        self.label_columns = [array('I') for _ in range(label_count)]  # 行 -> 列内 ID
+        self.values = array('d')
+        self.timestamps = array('d')
+        self.index: Dict[tuple, int] = {}  # {label_values: 行号}
+
+    def upsert(self, key: tuple, value: float, ts: float):
+        """插入或更新一行"""
+        row = self.index.get(key)
+        if row is not None:
+            self.values[row] = value
+            self.timestamps[row] = ts
+            return
+
+        interned = []
+        for table, ids, column, label_value in zip(
+                self.label_tables, self.label_ids, self.label_columns, key):
+            label_id = ids.get(label_value)
+            if label_id is None:
+                label_id = len(table)
+                table.append(label_value)
+                ids[label_value] = label_id
+            column.append(label_id)
+            interned.append(table[label_id])
+
+        self.index[tuple(interned)] = len(self.values)
+        self.values.append(value)
+        self.timestamps.append(ts)
+
+    def remove(self, key: tuple) -> bool:
+        """删除一行（用最后一行填补空位，O(1)）"""
+        row = self.index.pop(key, None)
+        if row is None:
+            return False
+
+        last = len(self.values) - 1
+        if row != last:
+            for column in self.label_columns:
+                column[row] = column[last]
+            self.values[row] = self.values[last]
+            self.timestamps[row] = self.timestamps[last]
+            self.index[self.row_key(row)] = row
+
+        for column in self.label_columns:
+            column.pop()
+        self.values.pop()
+        self.timestamps.pop()
+        return True
+
+    def row_key(self, row: int) -> tuple:
+        """还原指定行的标签值"""
+        return tuple(table[column[row]] for table, column in zip(self.label_tables, self.label_columns))
+
+    def copy(self) -> '_ColumnarSnapshot':
+        """复制快照（字符串共享，数组和索引复制）"""
+        snapshot = _ColumnarSnapshot(len(self.label_tables))
+        snapshot.label_tables = [list(table) for table in self.label_tables]
+        snapshot.label_ids = [dict(ids) for ids in self.label_ids]
+        snapshot.label_columns = [array('I', column) for column in self.label_columns]
+        snapshot.values = array('d', self.values)
+        snapshot.timestamps = array('d', self.timestamps)
+        snapshot.index = dict(self.index)
+        return snapshot
+
+
+class ColumnarSeriesStore:
+    """
+    列式时间序列存储后端
+    不为每个标签组合创建 Gauge 子对象，而是通过自定义 Collector 在拉取时生成 GaugeMetricFamily，
+    适合数十万级别的高基数指标
+    """
+
+    def __init__(self, name: str, description: str, labelnames: List[str], registry=REGISTRY):
+        """
+        Args:
+            name: 指标名称
+            description: 指标描述
+            labelnames: 标签列表
+            registry: 注册到的 Prometheus Registry
+        """
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        self._snapshot = _ColumnarSnapshot(len(self.labelnames))
+        # 拉取与原地修改（set/merge/remove）互斥；整体替换只是指针赋值
+        self._lock = threading.Lock()
+        # 当前快照已被 freeze() 导出，原地修改前需要先复制
+        self._shared = False
+        if registry is not None:
+            registry.register(self)
+
+    def describe(self):
+        """提供指标名给 Registry 做冲突检测，避免注册时触发 collect()"""
+        return [GaugeMetricFamily(self.name, self.description, labels=self.labelnames)]
+
+    def collect(self):
+        """Prometheus 拉取时调用，从列式数据生成 GaugeMetricFamily"""
+        family = GaugeMetricFamily(self.name, self.description, labels=self.labelnames)
+        with self._lock:
+            snapshot = self._snapshot
+            columns = [
+                [table[label_id] for label_id in column]
+                for table, column in zip(snapshot.label_tables, snapshot.label_columns)
+            ]
+            values = snapshot.values.tolist()
+
+        for label_values, value in zip(zip(*columns) if columns else [()] * len(values), values):
+            family.add_metric(label_values, value)
+        yield family
+
+    def _unshare(self):
+        """写时复制: 原地修改前复制已导出的快照（调用方需持有 self._lock）"""
+        if self._shared:
+            self._snapshot = self._snapshot.copy()
+            self._shared = False
+
+    def set(self, key: tuple, value: float, ts: float):
+        """设置单个序列的值和时间戳"""
+        with self._lock:
+            self._unshare()
+            self._snapshot.upsert(key, value, ts)
+
+    def stage(self, series: Dict[tuple, float], ts: float):
+        """在锁外构建新的列式快照"""
+        snapshot = _ColumnarSnapshot(len(self.labelnames))
+        for key, value in series.items():
+            snapshot.upsert(key, value, ts)
+        return snapshot
+
+    def swap(self, staged: _ColumnarSnapshot):
+        """用新快照整体替换"""
+        self._snapshot = staged
+        self._shared = False
+
+    def merge(self, staged: _ColumnarSnapshot):
+        """将新快照合并到已有数据中"""
+        with self._lock:
+            self._unshare()
+            snapshot = self._snapshot
+            for row, (value, ts) in enumerate(zip(staged.values, staged.timestamps)):
+                snapshot.upsert(staged.row_key(row), value, ts)
+
+    def timestamp(self, key: tuple) -> Optional[float]:
+        """获取序列的最后更新时间，不存在时返回 None"""
+        with self._lock:
+            snapshot = self._snapshot
+            row = snapshot.index.get(key)
+            return None if row is None else snapshot.timestamps[row]
+
+    def value(self, key: tuple) -> Optional[float]:
+        """获取序列的当前值，不存在时返回 None"""
+        with self._lock:
+            snapshot = self._snapshot
+            row = snapshot.index.get(key)
+            return None if row is None else snapshot.values[row]
+
+    def touch(self, ts: float, keys: Optional[Iterable[tuple]] = None) -> tuple:
+        """
+        刷新序列的时间戳（数值不变）
+
+        Args:
+            ts: 新的时间戳
+            keys: 只刷新这些序列（不存在的忽略），默认刷新所有序列
+
+        Returns:
+            tuple: 被刷新的 label_values
+        """
+        with self._lock:
+            self._unshare()
+            snapshot = self._snapshot
+            if keys is None:
+                snapshot.timestamps = array('d', [ts]) * len(snapshot.timestamps)
+                return tuple(snapshot.index)
+            touched = []
+            for key in keys:
+                row = snapshot.index.get(key)
+                if row is not None:
+                    snapshot.timestamps[row] = ts
+                    touched.append(key)
+            return tuple(touched)
+
+    def remove(self, key: tuple):
+        """删除单个序列"""
+        with self._lock:
+            self._unshare()
+            if not self._snapshot.remove(key):
+                raise KeyError(key)
+
+    def clear(self):
+        """清空所有序列"""
+        self._snapshot = _ColumnarSnapshot(len(self.labelnames))
+        self._shared = False
+
+    def unregister(self):
+        """从 Registry 中移除该指标"""
+        if self.registry is not None:
+            self.registry.unregister(self)
+
+    def last_update(self) -> Optional[float]:
+        """所有序列中最近的更新时间，没有序列时返回 None"""
+        return max(self._snapshot.timestamps, default=None)
+
+    def freeze(self) -> _ColumnarSnapshot:
+        """
+        取得当前快照的只读引用（O(1)），之后的原地修改先复制快照（写时复制）
+        """
+        with self._lock:
+            self._shared = True
+            return self._snapshot
+
+    def export(self, frozen: _ColumnarSnapshot) -> _ColumnarSnapshot:
+        """freeze() 的结果已经是列式快照，不再修改，可以直接写入磁盘"""
+        return frozen
+
+    def estimated_bytes(self) -> int:
+        """估算序列占用的内存（字节）: 列数组 + 标签表 + 行索引"""
+        # 锁内只读取索引（与原地修改互斥），标签表只追加不删除，逐个字符串的计算在锁外进行
+        with self._lock:
+            snapshot = self._snapshot
+            index_size = sys.getsizeof(snapshot.index)
+            rows = len(snapshot.index)
+            key = next(iter(snapshot.index), ())
+        size = sys.getsizeof(snapshot.values) + sys.getsizeof(snapshot.timestamps)
+        size += sum(sys.getsizeof(column) for column in snapshot.label_columns)
+        for table, ids in zip(snapshot.label_tables, snapshot.label_ids):
+            size += sys.getsizeof(table) + sys.getsizeof(ids) + sum(sys.getsizeof(v) for v in table)
+        # 索引键元组长度相同、大小一致，其中的字符串与标签表共享
+        size += index_size + rows * sys.getsizeof(key)
+        return size
+
+    def __len__(self) -> int:
+        return len(self._snapshot.values)
+
+
+# 可选的存储后端
+SERIES_STORES = {
+    'gauge': GaugeSeriesStore,
+    'columnar': ColumnarSeriesStore,
+}
+
+
+def compare_series_memory(series_count: int = 100000, label_count: int = 3) -> Dict[str, Any]:
+    """
+    对比各存储后端每个时间序列的内存占用（基于 tracemalloc）
+
+    Args:
+        series_count: 时间序列数量
+        label_count: 每个序列的标签数
+
+    Returns:
+        dict: {backend: {'total_bytes': ..., 'bytes_per_series': ...}}
+    """
+    import tracemalloc
+    from prometheus_client import CollectorRegistry
+
+    labelnames = [f'label_{i}' for i in range(label_count)]
+    # 标签值取自有限集合，模拟 account_id x merchant_name x region 的组合
+    series = {
+        tuple([f'acc_{n}'] + [f'value_{n % (10 ** (i + 1))}' for i in range(1, label_count)]): float(n)
+        for n in range(series_count)
+    }
+
+    result = {}
+    for backend, store_class in SERIES_STORES.items():
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        store = store_class('memory_compare', 'memory comparison', labelnames,
+                            registry=CollectorRegistry())
+        store.swap(store.stage(series, time.time()))
+        total = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        result[backend] = {
+            'series': len(store),
+            'total_bytes': total,
+            'bytes_per_series': round(total / max(series_count, 1), 1),
+        }
+        del store
+
+    return result
+
+
 # ============================================================================
 # 带 TTL 的指标管理器
 # ============================================================================
+class TimedLock:
+    """
+    记录等待时间的互斥锁
+    无竞争时只做一次非阻塞 acquire；发生竞争时累计等待次数和等待时长
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait_seconds = 0.0  # 累计等待时长
+        self.contended = 0       # 需要等待的次数
+
+    def acquire(self) -> bool:
+        if self._lock.acquire(blocking=False):
+            return True
+        start = time.perf_counter()
+        self._lock.acquire()
+        # 已持有锁，统计值的更新不需要额外同步
+        self.wait_seconds += time.perf_counter() - start
+        self.contended += 1
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
 class MetricsManager:
     """
     指标管理器
     负责管理 Prometheus 指标，支持数据过期清理
     """
 
-    def __init__(self, ttl_seconds: int = 300):
+    def __init__(self, ttl_seconds: int = 300, backend: str = 'gauge'):
         """
         初始化指标管理器
 
         Args:
             ttl_seconds: 指标数据过期时间（秒），默认 5 分钟
+            backend: 默认存储后端，gauge（prometheus_client Gauge）或 columnar（列式存储）
         """
-        self.gauges: Dict[str, Gauge] = {}
-        self.timestamps: Dict[str, Dict[tuple, float]] = {}  # {metric_name: {label_key: timestamp}}
+        if backend not in SERIES_STORES:
+            raise ValueError(
+                f"Unknown metrics backend: {backend}. "
+                f"Supported backends: {list(SERIES_STORES.keys())}"
+            )
+
+        self.stores: Dict[str, Any] = {}  # {metric_name: GaugeSeriesStore | ColumnarSeriesStore}
         self.ttl = ttl_seconds
-        self.lock = threading.Lock()
+        self.ttls: Dict[str, float] = {}  # 指标级 TTL 覆盖: {metric_name: seconds}
+        self.limiters: Dict[str, CardinalityLimiter] = {}  # 指标级序列数上限
+        self.backend = backend
+        self.lock = TimedLock()
+
+        # 过期索引: 按截止时间排序的最小堆 [(deadline, seq, metric_name, generation, written_at, keys)]
+        # 条目只在写入时追加，清理时惰性校验: 序列已刷新或快照已被整体替换的条目直接跳过
+        self._expiry_heap: List[tuple] = []
+        self._expiry_seq = itertools.count()
+        # 每次整体替换/清空时递增，旧快照的过期条目可 O(1) 丢弃: {metric_name: generation}
+        self.generations: Dict[str, int] = {}
+        # 由多个数据源共同发布的指标按数据源记录序列归属: {metric_name: {source_name: {label_values}}}
+        # touch() 只刷新调用方数据源发布过的序列；只由一个数据源发布的指标不记录，整体刷新
+        self.owned_keys: Dict[str, Dict[str, set]] = {}
+        # overflow: other 时各指标被折叠序列的最新值: {metric_name: {label_values: value}}
+        self.folded: Dict[str, Dict[tuple, float]] = {}
         self.logger = logging.getLogger('metrics_manager')
 
-    def register_gauge(self, name: str, description: str, labels: List[str]) -> Gauge:
+    def register_gauge(self, name: str, description: str, labels: List[str],
+                       backend: Optional[str] = None, ttl_seconds: Optional[float] = None,
+                       max_series: Optional[int] = None, overflow: str = 'drop'):
+        """
+        注册一个新的 Gauge 指标
+
+        Args:
+            name: 指标名称
+            description: 指标描述
+            labels: 标签列表
+            backend: 存储后端，默认使用管理器的后端
+            ttl_seconds: 该指标的过期时间（秒），默认使用管理器的 TTL
+            max_series: 该指标的最大序列数，默认不限制
+            overflow: 超出上限时的处理方式 drop / other / topk
+
+        Returns:
+            该指标的时间序列存储
+        """
+        if name not in self.stores:
+            backend = backend or self.backend
+            if backend not in SERIES_STORES:
+                raise ValueError(f"Unknown metrics backend: {backend}")
+            self.stores[name] = SERIES_STORES[backend](name, description, labels)
+            # 同名指标重新注册时递增，使旧指标遗留的过期条目失效
+            self.generations[name] = self.generations.get(name, 0) + 1
+            if ttl_seconds is not None:
+                self.ttls[name] = ttl_seconds
+            if max_series is not None:
+                self.limiters[name] = CardinalityLimiter(max_series, overflow)
+            self.logger.info(f"Registered gauge: {name} with labels {labels} (backend: {backend})")
+        return self.stores[name]
+
+    def unregister_gauge(self, name: str):
+        """
+        注销指标并删除其所有序列（数据源下线或指标定义变化时使用）
+
+        Args:
+            name: 指标名称
+        """
+        with self.lock:
+            store = self.stores.pop(name, None)
+            self.ttls.pop(name, None)
+            self.limiters.pop(name, None)
+            self.folded.pop(name, None)
+            if name in self.owned_keys:
+                self.owned_keys[name] = {}
+        if store is not None:
+            store.unregister()
+            self.logger.info(f"Unregistered gauge: {name}")
+
+    def set_value(self, metric_name: str, labels: Dict[str, str], value: float):
+        """
+        设置指标值并更新时间戳
+
+        Args:
+            metric_name: 指标名称
+            labels: 标签字典
+            value: 指标值
+        """
+        if metric_name not in self.stores:
+            self.logger.warning(f"Gauge '{metric_name}' not registered")
+            return
+
+        store = self.stores[metric_name]
+        label_key = tuple(str(labels[l]) for l in store.labelnames)
+
+        now = time.time()
+        with self.lock:
+            # 更新值和时间戳
+            store.set(label_key, value, now)
+            self._schedule_expiry(metric_name, now, (label_key,))
+
+    def share(self, metric_names: Iterable[str]):
+        """
+        设置由多个数据源共同发布的指标（配置加载和热加载后调用），这些指标按数据源记录序列归属
+
+        Args:
+            metric_names: 指标名称
+        """
+        with self.lock:
+            self.owned_keys = {name: self.owned_keys.get(name, {}) for name in metric_names}
+
+    def publish(self, series_by_metric: Dict[str, Dict[tuple, float]], replace: bool = True,
+                owner: Optional[str] = None) -> int:
+        """
+        批量发布一个采集周期的结果
+        新数据先在锁外构建成快照，再在一次加锁内整体替换，
+        Prometheus 拉取时不会看到清空后尚未填满的中间状态
+
+        Args:
+            series_by_metric: {metric_name: {label_values: value}}，label_values 按标签定义顺序排列
+            replace: True 时用新快照替换旧数据（共享指标只替换 owner 的序列）；False 时合并到已有数据中
+            owner: 发布的数据源名称，用于记录共享指标的序列归属
+
+        Returns:
+            int: 发布的时间序列数量
+        """
+        now = time.time()
+        staged = {}
+        published = 0
+        for metric_name, series in series_by_metric.items():
+            store = self.stores.get(metric_name)
+            if store is None:
+                self.logger.warning(f"Gauge '{metric_name}' not registered")
+                continue
+            staged[metric_name] = store.stage(series, now)
+            published += len(series)
+
+        with self.lock:
+            for metric_name, snapshot in staged.items():
+                store = self.stores[metric_name]
+                owned = self.owned_keys.get(metric_name)
+                if replace and owned is not None and owner is not None:
+                    # 多个数据源共同发布的指标只替换 owner 自己的序列，其他数据源的序列保留
+                    store.merge(snapshot)
+                    self._remove_owned(metric_name, owner, series_by_metric[metric_name])
+                elif replace:
+                    store.swap(snapshot)
+                    self.generations[metric_name] += 1
+                else:
+                    store.merge(snapshot)
+                self._schedule_expiry(metric_name, now, tuple(series_by_metric[metric_name]))
+                if owned is not None and owner is not None:
+                    if replace or owner not in owned:
+                        owned[owner] = set(series_by_metric[metric_name])
+                    else:
+                        owned[owner].update(series_by_metric[metric_name])
+
+        return published
+
+    def _remove_owned(self, metric_name: str, owner: str, keep: Dict[tuple, float]):
+        """
+        删除 owner 上次发布、本次不再发布的序列（调用方需持有 self.lock）
+        其他数据源同样发布过的序列保留
+        """
+        owned = self.owned_keys[metric_name]
+        store = self.stores[metric_name]
+        for key in owned.get(owner, ()):
+            if key in keep or store.timestamp(key) is None:
+                continue
+            if any(key in keys for source, keys in owned.items() if source != owner):
+                continue
+            store.remove(key)
+
+    def touch(self, metric_names: List[str], owner: Optional[str] = None) -> int:
+        """
+        刷新指定指标序列的时间戳，数值保持不变（数据源内容未变化时使用）
+        多个数据源共同发布的指标只刷新 owner 发布过的序列，其他数据源的序列按各自的 TTL 过期；
+        owner 尚未发布过（如重启后从快照恢复）时整体刷新
+
+        Args:
+            metric_names: 指标名称列表
+            owner: 调用方数据源名称
+
+        Returns:
+            int: 刷新的时间序列数量
+        """
+        now = time.time()
+        touched = 0
+        with self.lock:
+            for metric_name in metric_names:
+                store = self.stores.get(metric_name)
+                if store is None:
+                    continue
+                owned = self.owned_keys.get(metric_name)
+                if owned is not None and owner in owned:
+                    keys = store.touch(now, owned[owner])
+                    # 顺便清理已过期或已被替换的序列
+                    owned[owner] = set(keys)
+                else:
+                    keys = store.touch(now)
+                self._schedule_expiry(metric_name, now, keys)
+                touched += len(keys)
+        return touched
+
+    def matches(self, series_by_metric: Dict[str, Dict[tuple, float]]) -> bool:
+        """
+        所有序列都已按相同的值发布，合并后不会改变任何数值
+
+        Args:
+            series_by_metric: {metric_name: {label_values: value}}
+        """
+        with self.lock:
+            for metric_name, series in series_by_metric.items():
+                store = self.stores.get(metric_name)
+                if store is None:
+                    return False
+                if any(store.value(key) != value for key, value in series.items()):
+                    return False
+        return True
+
+    def series_count(self, metric_names: List[str]) -> int:
+        """统计指定指标当前的时间序列总数"""
+        return sum(len(self.stores[name]) for name in metric_names if name in self.stores)
+
+    def memory_usage(self) -> Dict[str, Dict[str, int]]:
+        """
+        每个指标的序列数和估算内存
+
+        Returns:
+            dict: {metric_name: {'backend': ..., 'series': n, 'estimated_bytes': bytes}}
+        """
+        # 锁内只取存储的引用，估算在锁外进行（各存储内部自行加锁），不阻塞发布和拉取
+        with self.lock:
+            stores = list(self.stores.items())
+        return {
+            name: {
+                'backend': 'columnar' if isinstance(store, ColumnarSeriesStore) else 'gauge',
+                'series': len(store),
+                'estimated_bytes': store.estimated_bytes(),
+            }
+            for name, store in stores
+        }
+
+    def last_update(self, metric_names: List[str]) -> Optional[float]:
+        """指定指标所有序列中最近的更新时间，没有序列时返回 None"""
+        with self.lock:
+            times = [self.stores[name].last_update() for name in metric_names if name in self.stores]
+        return max((t for t in times if t is not None), default=None)
+
+    def export_series(self) -> Dict[str, tuple]:
+        """
+        导出所有指标的序列，用于写入磁盘快照
+
+        Returns:
+            dict: {metric_name: (labelnames, _ColumnarSnapshot)}
+        """
+        # 锁内只取各存储的只读引用（写时复制），逐序列的转换在锁外进行，不阻塞发布和拉取
+        with self.lock:
+            frozen = [(name, store, store.freeze()) for name, store in self.stores.items()]
+        return {name: (store.labelnames, store.export(state)) for name, store, state in frozen}
+
+    def restore(self, metric_name: str, labelnames: List[str], rows: Iterable[tuple]) -> int:
+        """
+        从磁盘快照恢复序列，保留原始写入时间，已超过 TTL 的序列跳过
+        指标未注册或标签定义已变化时不恢复
+
+        Args:
+            metric_name: 指标名称
+            labelnames: 快照中的标签列表
+            rows: (label_values, value, timestamp) 迭代器
+
+        Returns:
+            int: 恢复的时间序列数量
+        """
+        store = self.stores.get(metric_name)
+        if store is None or tuple(labelnames) != store.labelnames:
+            return 0
+
+        # 同一次发布的序列时间戳相同，按时间戳分组后各自暂存、合并并登记过期时间
+        now = time.time()
+        ttl = self.get_ttl(metric_name)
+        groups: Dict[float, Dict[tuple, float]] = {}
+        for key, value, ts in rows:
+            if now - ts <= ttl:
+                groups.setdefault(ts, {})[key] = value
+
+        staged = [(ts, store.stage(series, ts), tuple(series)) for ts, series in groups.items()]
+        with self.lock:
+            for ts, snapshot, keys in staged:
+                store.merge(snapshot)
+                self._schedule_expiry(metric_name, ts, keys)
+        return sum(len(keys) for _, _, keys in staged)
+
+    def limit_cardinality(self, series_by_metric: Dict[str, Dict[tuple, float]], replace: bool = True,
+                          max_series: Optional[int] = None, overflow: str = 'drop') -> Dict[str, int]:
+        """
+        发布前按指标级和数据源级上限裁剪时间序列（原地修改 series_by_metric）
+
+        Args:
+            series_by_metric: {metric_name: {label_values: value}}
+            replace: 是否为整体替换模式
+            max_series: 数据源级上限（所有指标合计），按指标顺序分配配额
+            overflow: 数据源级上限生效且指标未单独配置时的处理方式
+
+        Returns:
+            dict: {metric_name: 被丢弃或折叠的序列数}
+        """
+        overflowed = {}
+        remaining = max_series
+        for metric_name, series in series_by_metric.items():
+            store = self.stores.get(metric_name)
+            if store is None:
+                continue
+
+            limiter = self.limiters.get(metric_name)
+            cap = limiter.max_series if limiter else None
+            if remaining is not None:
+                cap = remaining if cap is None else min(cap, remaining)
+            if cap is None:
+                continue
+            if limiter is None:
+                limiter = CardinalityLimiter(cap, overflow)
+
+            existing_count = 0 if replace else len(store)
+            kept, dropped = limiter.apply(
+                series, len(store.labelnames),
+                exists=lambda key: store.timestamp(key) is not None,
+                existing_count=existing_count, replace=replace, max_series=cap,
+                folded=self.folded.setdefault(metric_name, {})
+            )
+            series_by_metric[metric_name] = kept
+            if dropped:
+                overflowed[metric_name] = dropped
+
+            if remaining is not None:
+                used = len(kept) if replace else existing_count + len(kept)
+                remaining = max(remaining - used, 0)
+
+        return overflowed
+
+    def get_ttl(self, metric_name: str) -> float:
+        """获取指标的过期时间（秒）"""
+        return self.ttls.get(metric_name, self.ttl)
+
+    def _schedule_expiry(self, metric_name: str, ts: float, keys: tuple):
+        """
+        记录一批序列的过期截止时间（调用方需持有 self.lock）
+
+        Args:
+            metric_name: 指标名称
+            ts: 本次写入时间
+            keys: 本次写入的 label_values 列表
+        """
+        if not keys:
+            return
+        heapq.heappush(self._expiry_heap, (
+            ts + self.get_ttl(metric_name), next(self._expiry_seq),
+            metric_name, self.generations[metric_name], ts, keys
+        ))
+
+    def clear_metric(self, metric_name: str):
+        """
+        清空指定指标的所有标签组合（用于每次采集前清理）
+
+        Args:
+            metric_name: 指标名称
+        """
+        if metric_name not in self.stores:
+            return
+
+        with self.lock:
+            self.stores[metric_name].clear()
+            self.generations[metric_name] += 1
+
+    def cleanup_expired(self):
+        """
+        清理所有过期的指标数据
+        只弹出已到期的过期索引条目，耗时与过期数量成正比，而不是与序列总数成正比
+        """
+        now = time.time()
+        total_cleaned = 0
+
+        with self.lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] < now:
+                _, _, metric_name, generation, written_at, keys = heapq.heappop(heap)
+
+                # 指标已注销或快照已被整体替换，条目整体失效
+                store = self.stores.get(metric_name)
+                if store is None or generation != self.generations.get(metric_name):
+                    continue
+
+                ttl = self.get_ttl(metric_name)
+                pending = []
+                for key in keys:
+                    # 已删除或之后被刷新过的序列由更新的条目负责
+                    if store.timestamp(key) != written_at:
+                        continue
+                    if now - written_at <= ttl:
+                        # TTL 在写入后被调大，按新的截止时间重新入堆
+                        pending.append(key)
+                        continue
+                    try:
+                        store.remove(key)
+                        total_cleaned += 1
+                    except Exception as e:
+                        self.logger.error(f"Failed to remove expired metric: {e}")
+
+                if pending:
+                    self._schedule_expiry(metric_name, written_at, tuple(pending))
+
+        if total_cleaned > 0:
+            self.logger.info(f"Cleaned up {total_cleaned} expired metric(s)")
+
+        return total_cleaned
+
+
+class SeriesSnapshotFile:
+    """
+    已发布序列的磁盘快照，用于重启后立即恢复数据（热重启）
+    二进制格式，定长数组按 8 字节对齐，可以直接 mmap 读取:
+        magic(8) | header 长度(uint64 little-endian) | header(JSON) | 数据段
+    每个指标的数据段: 数值 array('d')、时间戳 array('d')，以及每个标签一组
+    字符串表（UTF-8 拼接）+ 结束偏移 array('Q') + 行 -> 字符串下标 array('I')
+    header 记录各段相对数据段起点的 [offset, length]、写入时的字节序，
+    以及与序列一致的增量采集水位（同一个文件原子替换，恢复后水位不会比序列更新）
+    """
+
+    MAGIC = b'AXSNAP01'
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 快照文件路径
+        """
+        self.path = path
+        self.logger = logging.getLogger('snapshot')
+
+    def write(self, snapshots: Dict[str, tuple], watermarks: Optional[Dict[str, Any]] = None) -> int:
+        """
+        写入快照（先写临时文件再原子替换）
+
+        Args:
+            snapshots: {metric_name: (labelnames, _ColumnarSnapshot)}
+            watermarks: 导出序列之前读取的增量采集水位 {source_name: watermark}
+
+        Returns:
+            int: 写入的时间序列数量
+        """
+        sections = []
+        offset = 0
+
+        def add(data: bytes) -> List[int]:
+            nonlocal offset
+            padding = -len(data) % 8
+            sections.append(data + b'\0' * padding)
+            entry = [offset, len(data)]
+            offset += len(data) + padding
+            return entry
+
+        metrics = []
+        for name, (labelnames, snapshot) in snapshots.items():
+            labels = []
+            for table, column in zip(snapshot.label_tables, snapshot.label_columns):
+                encoded = [value.encode('utf-8') for value in table]
+                ends = array('Q', itertools.accumulate(len(value) for value in encoded))
+                labels.append({
+                    'strings': add(b''.join(encoded)),
+                    'ends': add(ends.tobytes()),
+                    'ids': add(column.tobytes()),
+                })
+            metrics.append({
+                'name': name,
+                'labelnames': list(labelnames),
+                'rows': len(snapshot.values),
+                'values': add(snapshot.values.tobytes()),
+                'timestamps': add(snapshot.timestamps.tobytes()),
+                'labels': labels,
+            })
+
+        header = json.dumps({
+            'created': time.time(),
+            'byteorder': sys.byteorder,
+            'watermarks': watermarks or {},
+            'metrics': metrics,
+        }, default=str).encode('utf-8')
+        # 数据段从 8 字节对齐的位置开始
+        header += b' ' * (-len(header) % 8)
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            for section in sections:
+                f.write(section)
+        os.replace(tmp_path, self.path)
+
+        return sum(metric['rows'] for metric in metrics)
+
+    def read_header(self) -> dict:
+        """读取快照的 header（created、byteorder、watermarks 和各指标的段信息）"""
+        with open(self.path, 'rb') as f:
+            if f.read(8) != self.MAGIC:
+                raise ValueError(f"{self.path} is not a series snapshot")
+            header_length = int.from_bytes(f.read(8), 'little')
+            return json.loads(f.read(header_length))
+
+    def read(self) -> Iterator[tuple]:
+        """
+        读取快照
+
+        Yields:
+            tuple: (metric_name, labelnames, rows)，rows 为 (label_values, value, timestamp) 迭代器
+        """
+        import mmap
+
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:8] != self.MAGIC:
+                raise ValueError(f"{self.path} is not a series snapshot")
+            header_length = int.from_bytes(mm[8:16], 'little')
+            header = json.loads(mm[16:16 + header_length])
+            if header['byteorder'] != sys.byteorder:
+                raise ValueError(f"{self.path} was written on a {header['byteorder']}-endian host")
+            base = 16 + header_length
+
+            def section(entry: List[int], typecode: str) -> array:
+                start = base + entry[0]
+                data = array(typecode)
+                data.frombytes(mm[start:start + entry[1]])
+                return data
+
+            for metric in header['metrics']:
+                columns = []
+                for label in metric['labels']:
+                    start = base + label['strings'][0]
+                    strings = mm[start:start + label['strings'][1]]
+                    table = []
+                    begin = 0
+                    for end in section(label['ends'], 'Q'):
+                        table.append(strings[begin:end].decode('utf-8'))
+                        begin = end
+                    columns.append([table[label_id] for label_id in section(label['ids'], 'I')])
+
+                values = section(metric['values'], 'd')
+                timestamps = section(metric['timestamps'], 'd')
+                keys = zip(*columns) if columns else [()] * len(values)
+                yield metric['name'], metric['labelnames'], zip(keys, values, timestamps)
+
+
+class MetricsManagerStats:
+    """
+    MetricsManager 的自身监控指标（自定义 Collector）
+    拉取时读取当前值: 每个指标的序列数、锁等待次数和时长
+    """
+
+    def __init__(self, manager: MetricsManager):
+        self.manager = manager
+
+    def describe(self):
+        return [
+            GaugeMetricFamily('exporter_series', 'Current number of series per metric', labels=['metric']),
+            CounterMetricFamily('exporter_metrics_lock_wait_seconds', 'Total time spent waiting for the metrics lock'),
+            CounterMetricFamily('exporter_metrics_lock_contended', 'Total number of contended metrics lock acquisitions'),
+        ]
+
+    def collect(self):
+        series = GaugeMetricFamily('exporter_series', 'Current number of series per metric', labels=['metric'])
+        for name, store in list(self.manager.stores.items()):
+            series.add_metric([name], len(store))
+        yield series
+
+        lock = self.manager.lock
+        yield CounterMetricFamily(
+            'exporter_metrics_lock_wait_seconds', 'Total time spent waiting for the metrics lock',
+            value=lock.wait_seconds
+        )
+        yield CounterMetricFamily(
+            'exporter_metrics_lock_contended', 'Total number of contended metrics lock acquisitions',
+            value=lock.contended
+        )
+
+
+# ============================================================================
+# /metrics 输出缓存与 HTTP 服务
+# ============================================================================
+class ExpositionCache:
+    """
+    /metrics 输出缓存
+    每次发布后在后台重新渲染一次文本和 gzip 压缩版本，拉取时直接返回内存中的结果，
+    序列化开销随数据更新频率而不是拉取频率增长
+    进程指标和自身监控指标（锁等待、调度延迟等）不经过发布，缓存最多保留 max_age_seconds 后重新渲染
+    """
+
+    def __init__(self, registry=REGISTRY, min_interval_seconds: float = 1.0, max_age_seconds: float = 10.0):
+        """
+        Args:
+            registry: 需要渲染的 Prometheus Registry
+            min_interval_seconds: 两次渲染的最小间隔，合并短时间内的多次发布
+            max_age_seconds: 没有发布时缓存的最长保留时间
+        """
+        self.registry = registry
+        self.min_interval = min_interval_seconds
+        self.max_age = max_age_seconds
+        self._entry = None  # (body, gzip_body, etag)
+        self._rendered_at = 0.0
+        self._dirty = threading.Event()
+        self.logger = logging.getLogger('exposition')
+
+    def render(self):
+        """渲染当前 Registry 并替换缓存"""
+        body = generate_latest(self.registry)
+        gzip_body = gzip.compress(body, compresslevel=6)
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        self._entry = (body, gzip_body, etag)
+        self._rendered_at = time.monotonic()
+        return self._entry
+
+    def invalidate(self):
+        """标记数据已更新，由后台线程重新渲染"""
+        self._dirty.set()
+
+    def get(self):
+        """
+        获取缓存的输出
+
+        Returns:
+            tuple: (body, gzip_body, etag)
+        """
+        entry = self._entry
+        # 后台线程未运行或落后时在拉取线程中渲染，避免返回过期的进程和自身监控指标
+        if entry is None or time.monotonic() - self._rendered_at > self.max_age:
+            entry = self.render()
+        return entry
+
+    def run(self):
+        """后台渲染循环（在独立线程中），有发布时或缓存超过 max_age 时重新渲染"""
+        while True:
+            self._dirty.wait(self.max_age)
+            self._dirty.clear()
+            try:
+                self.render()
+            except Exception as e:
+                self.logger.error(f"Failed to render metrics: {e}")
+            time.sleep(self.min_interval)
+
+
+class ExporterRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP 请求处理器
+    按路径分发到 ExporterHTTPServer 中注册的路由
+    """
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        route = self.server.routes.get(path)
+        if route is None:
+            self._send(404, {'Content-Type': 'text/plain; charset=utf-8'}, b'Not Found\n')
+            return
+
+        try:
+            status, headers, body = route(self)
+        except Exception as e:
+            self.server.logger.error(f"Failed to handle {path}: {e}")
+            status, headers, body = 500, {'Content-Type': 'text/plain; charset=utf-8'}, b'Internal Server Error\n'
+        self._send(status, headers, body)
+
+    def _send(self, status: int, headers: Dict[str, str], body: bytes):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(format % args)
+
+
+class ExporterHTTPServer(ThreadingHTTPServer):
+    """
+    Exporter HTTP 服务
+    路由表: {path: handler(request) -> (status, headers, body)}
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port: int, addr: str = '0.0.0.0'):
+        super().__init__((addr, port), ExporterRequestHandler)
+        self.routes: Dict[str, Callable] = {}
+        self.logger = logging.getLogger('http')
+
+    def add_route(self, path: str, handler: Callable):
+        """注册路由"""
+        self.routes[path] = handler
+
+    def start(self) -> threading.Thread:
+        """在后台线程中启动服务"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True, name=f"http-{self.server_port}")
+        thread.start()
+        return thread
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    按 Accept-Encoding 的编码和 q 值判断客户端是否接受 gzip
+    gzip;q=0 表示拒绝；没有 gzip 时按 * 的 q 值；x-gzip 等其他编码不算
+
+    Args:
+        accept_encoding: Accept-Encoding 请求头
+
+    Returns:
+        bool: 是否返回 gzip 压缩的输出
+    """
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+def serve_exposition(cache: ExpositionCache):
+    """
+    创建 /metrics 路由处理函数
+    支持 If-None-Match（304）和 Accept-Encoding: gzip
+
+    Args:
+        cache: 输出缓存
+
+    Returns:
+        Callable: 路由处理函数
+    """
+    def handle(request: BaseHTTPRequestHandler):
+        body, gzip_body, etag = cache.get()
+        headers = {'ETag': etag, 'Vary': 'Accept-Encoding'}
+
+        if request.headers.get('If-None-Match') == etag:
+            return 304, headers, b''
+
+        headers['Content-Type'] = CONTENT_TYPE_LATEST
+        if accepts_gzip(request.headers.get('Accept-Encoding', '')):
+            headers['Content-Encoding'] = 'gzip'
+            return 200, headers, gzip_body
+        return 200, headers, body
+
+    return handle
+
+
+# ============================================================================
+# 调试端点（可选，独立端口）
+# ============================================================================
+def query_params(request: BaseHTTPRequestHandler) -> Dict[str, str]:
+    """解析请求的查询参数（同名参数取第一个）"""
+    return {name: values[0] for name, values in parse_qs(urlsplit(request.path).query).items()}
+
+
+class ReadinessGate:
+    """
+    就绪判定（/ready）
+    启用的数据源中完成首次采集（发布了数据或确认数据未变化）的数量达到 quorum 后就绪；
+    配置了 timeout 时，启动超过该时长后无论采集结果如何都视为就绪。
+    就绪后保持就绪，热加载新增数据源不会让副本重新退出负载均衡
+    """
+
+    def __init__(self, quorum: float = 1.0, quorum_count: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        """
+        Args:
+            quorum: 数据源比例，0 到 1 之间（默认 1.0 即全部）
+            quorum_count: 数据源个数，配置后代替 quorum
+            timeout: 最长等待时间（秒），None 表示一直等待
+        """
+        if not 0 <= quorum <= 1:
+            raise ValueError(f"readiness quorum must be a fraction between 0 and 1, got {quorum} "
+                             f"(use quorum_count for a number of sources)")
+        self.quorum = float(quorum)
+        self.quorum_count = quorum_count
+        self.timeout = timeout
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+        self.collected: set = set()
+        self.lock = threading.Lock()
+
+    def mark(self, source_name: str):
+        """记录数据源完成了一次采集"""
+        with self.lock:
+            self.collected.add(source_name)
+
+    def required(self, total: int) -> int:
+        """就绪所需的数据源个数"""
+        if self.quorum_count is not None:
+            return min(int(self.quorum_count), total)
+        return math.ceil(total * self.quorum)
+
+    def status(self, source_names: Iterable[str]) -> dict:
+        """
+        计算就绪状态
+
+        Args:
+            source_names: 本副本当前运行的数据源
+
+        Returns:
+            dict: ready、collected / required / total 和尚未完成首次采集的数据源
+        """
+        source_names = list(source_names)
+        with self.lock:
+            pending = sorted(name for name in source_names if name not in self.collected)
+            collected = len(source_names) - len(pending)
+            required = self.required(len(source_names))
+            if self.ready_at is None and (
+                collected >= required
+                or (self.timeout is not None and time.time() - self.started_at >= self.timeout)
+            ):
+                self.ready_at = time.time()
+            return {
+                'ready': self.ready_at is not None,
+                'collected': collected,
+                'required': required,
+                'total': len(source_names),
+                'pending': pending,
+                'startup_seconds': self.ready_at - self.started_at if self.ready_at else None,
+            }
+
+
+def json_response(data: Any, status: int = 200) -> tuple:
+    """生成 JSON 响应 (status, headers, body)"""
+    body = json.dumps(data, indent=2, default=str).encode('utf-8')
+    return status, {'Content-Type': 'application/json'}, body
+
+
+def serve_debug_memory(trace_frames: int = 1):
+    """
+    创建 /debug/memory 路由处理函数: tracemalloc 快照和与上一次快照的差异
+    未开启 tracemalloc 时，第一次请求开启跟踪
+
+    查询参数:
+        top: 返回的条目数（默认 25）
+        group: 聚合方式 lineno / filename / traceback（默认 lineno）
+        stop: 为 1 时停止跟踪并释放跟踪数据
+
+    Args:
+        trace_frames: 每次内存分配记录的调用栈深度
+    """
+    import tracemalloc
+    state = {'previous': None}
+    lock = threading.Lock()
+
+    def location(traceback) -> str:
+        return ' <- '.join(f'{frame.filename}:{frame.lineno}' for frame in reversed(traceback))
+
+    def handle(request: BaseHTTPRequestHandler):
+        params = query_params(request)
+        top = int(params.get('top', 25))
+        group = params.get('group', 'lineno')
+
+        with lock:
+            if params.get('stop') == '1':
+                tracemalloc.stop()
+                state['previous'] = None
+                return json_response({'tracing': False})
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(trace_frames)
+                state['previous'] = None
+                return json_response({'tracing': True, 'message': 'tracemalloc started, request again for a snapshot'})
+
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ])
+            previous, state['previous'] = state['previous'], snapshot
+
+        traced, peak = tracemalloc.get_traced_memory()
+        result = {
+            'traced_bytes': traced,
+            'peak_bytes': peak,
+            'top': [
+                {'location': location(stat.traceback), 'size_bytes': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics(group)[:top]
+            ],
+        }
+        if previous is not None:
+            result['diff'] = [
+                {
+                    'location': location(stat.traceback),
+                    'size_diff_bytes': stat.size_diff,
+                    'count_diff': stat.count_diff,
+                    'size_bytes': stat.size,
+                }
+                for stat in snapshot.compare_to(previous, group)[:top]
+            ]
+        return json_response(result)
+
+    return handle
+
+
+def sample_stacks(seconds: float, interval: float, thread_prefixes: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    定时采样线程调用栈（基于 sys._current_frames()，不需要额外依赖）
+
+    Args:
+        seconds: 采样时长
+        interval: 采样间隔
+        thread_prefixes: 只采样名称以这些前缀开头的线程，None 表示全部线程
+
+    Returns:
+        dict: 折叠格式的调用栈 {"thread;outer;...;inner": 采样次数}
+    """
+    counts: Dict[str, int] = {}
+    current = threading.get_ident()
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident)
+            if ident == current or name is None:
+                continue
+            if thread_prefixes is not None and not name.startswith(tuple(thread_prefixes)):
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            # 线程池中的线程按池名合并（collector_0、collector_1 -> collector）
+            stack.append(name.rsplit('_', 1)[0])
+            key = ';'.join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+        time.sleep(interval)
+
+    return counts
+
+
+def serve_debug_profile(default_prefixes: List[str], max_seconds: float = 60):
+    """
+    创建 /debug/profile 路由处理函数: 限时采样 CPU 调用栈
+    返回折叠格式（每行 "栈 次数"），可直接用于 flamegraph.pl / speedscope
+    同一时间只允许一个采样
+
+    查询参数:
+        seconds: 采样时长（默认 10，不超过 max_seconds）
+        interval: 采样间隔秒数（默认 0.01）
+        threads: 逗号分隔的线程名前缀，all 表示全部线程（默认只采样采集线程）
+
+    Args:
+        default_prefixes: 默认采样的线程名前缀
+        max_seconds: 单次采样的最长时间
+    """
+    lock = threading.Lock()
+
+    def handle(request: BaseHTTPRequestHandler):
+        params = query_params(request)
+        seconds = min(float(params.get('seconds', 10)), max_seconds)
+        interval = max(float(params.get('interval', 0.01)), 0.001)
+        threads = params.get('threads')
+        prefixes = None if threads == 'all' else (threads.split(',') if threads else default_prefixes)
+
+        if not lock.acquire(blocking=False):
+            return 409, {'Content-Type': 'text/plain; charset=utf-8'}, b'A profile is already running\n'
+        try:
+            counts = sample_stacks(seconds, interval, prefixes)
+        finally:
+            lock.release()
+
+        lines = [f'{stack} {count}' for stack, count in sorted(counts.items())]
+        return 200, {'Content-Type': 'text/plain; charset=utf-8'}, ('\n'.join(lines) + '\n').encode('utf-8')
+
+    return handle
+
+
+# ============================================================================
+# 时间序列基数控制
+# ============================================================================
+class LabelInterner:
+    """
+    全局标签值驻留表
+    merchant_name / region 等在多个指标和多个采集周期中重复出现的标签值只保留一份字符串
+    """
+
+    def __init__(self, max_size: int = 1000000):
+        """
+        Args:
+            max_size: 驻留表最大条目数，超过后清空重建（已被序列引用的字符串不受影响）
+        """
+        self.max_size = max_size
+        self._table: Dict[str, str] = {}
+
+    def intern(self, value: str) -> str:
+        """返回与 value 相等的共享字符串"""
+        table = self._table
+        shared = table.get(value)
+        if shared is not None:
+            return shared
+        if len(table) >= self.max_size:
+            # 标签值异常膨胀（如误把唯一 ID 作为标签）时避免驻留表无限增长
+            table.clear()
+        table[value] = value
+        return value
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+
+# 所有映射计划共享的驻留表
+LABEL_INTERNER = LabelInterner()
+
+
+class CardinalityLimiter:
+    """
+    单个指标的时间序列数量上限
+    超出上限时的处理方式:
+    - drop: 优先保留已存在的序列，丢弃新出现的序列
+    - other: 超出部分的标签值全部折叠为 'other'，数值求和
+    - topk: 按数值保留最大的 K 个序列
+    """
+
+    OVERFLOW_MODES = ('drop', 'other', 'topk')
+
+    def __init__(self, max_series: int, overflow: str = 'drop'):
+        """
+        Args:
+            max_series: 最大序列数
+            overflow: 超出上限时的处理方式 drop / other / topk
+        """
+        if overflow not in self.OVERFLOW_MODES:
+            raise ValueError(
+                f"Unknown overflow mode: {overflow}. Supported modes: {list(self.OVERFLOW_MODES)}"
+            )
+        self.max_series = max_series
+        self.overflow = overflow
+
+    def apply(self, series: Dict[tuple, float], label_count: int, exists: Callable[[tuple], bool],
+              existing_count: int = 0, replace: bool = True, max_series: Optional[int] = None,
+              folded: Optional[Dict[tuple, float]] = None) -> tuple:
+        """
+        按上限裁剪一个周期的结果
+
+        Args:
+            series: {label_values: value}
+            label_count: 标签数量
+            exists: 判断序列当前是否已发布
+            existing_count: 当前已发布的序列数（合并模式下占用配额）
+            replace: 是否为整体替换模式
+            max_series: 本次生效的上限（数据源级配额更小时使用），默认 self.max_series
+            folded: other 模式下各折叠序列的最新值 {label_values: value}，由调用方跨周期保存（原地修改）。
+                    other 为其总和: 合并模式下重复读取同一行只替换该行的贡献，不会重复累加
+
+        Returns:
+            tuple: (裁剪后的 series, 被丢弃或折叠的序列数)
+        """
+        cap = self.max_series if max_series is None else max_series
+        if folded is None:
+            folded = {}
+        if replace:
+            folded.clear()
+        if replace and len(series) <= cap:
+            return series, 0
+
+        other_key = ('other',) * label_count
+        if replace:
+            if self.overflow == 'topk':
+                kept = dict(heapq.nlargest(cap, series.items(), key=lambda item: item[1]))
+                return kept, len(series) - len(kept)
+            # other 模式下为 other 序列预留一个名额
+            limit = cap - 1 if self.overflow == 'other' else cap
+            kept, new_keys = {}, []
+            for key, value in series.items():
+                if exists(key) and len(kept) < limit and key != other_key:
+                    kept[key] = value
+                else:
+                    new_keys.append(key)
+            budget = limit - len(kept)
+        else:
+            # 合并模式: 已存在序列的更新总是保留，新序列只能使用剩余配额
+            kept = {key: value for key, value in series.items() if exists(key)}
+            new_keys = [key for key in series if key not in kept]
+            budget = max(cap - existing_count, 0)
+
+        if len(new_keys) <= budget:
+            kept.update((key, series[key]) for key in new_keys)
+            # 之前折叠的序列有了名额、单独发布后，不再计入 other
+            readmitted = [key for key in kept if key != other_key and folded.pop(key, None) is not None]
+            if readmitted and exists(other_key):
+                kept[other_key] = sum(folded.values())
+            return kept, 0
+
+        if self.overflow == 'other':
+            return self._fold_other(series, kept, new_keys, budget, other_key, exists, replace, folded)
+
+        if self.overflow == 'topk':
+            admitted = heapq.nlargest(budget, new_keys, key=series.__getitem__)
+        else:
+            admitted = new_keys[:budget]
+
+        kept.update((key, series[key]) for key in admitted)
+        return kept, len(new_keys) - len(admitted)
+
+    @staticmethod
+    def _fold_other(series: Dict[tuple, float], kept: Dict[tuple, float], new_keys: List[tuple], budget: int,
+                    other_key: tuple, exists: Callable[[tuple], bool], replace: bool,
+                    folded: Dict[tuple, float]) -> tuple:
+        """
+        other 模式: 超出配额的新序列折叠为 other 序列，数值为各折叠序列最新值之和
+        other 序列本身占用一个名额: 整体替换模式下已预留（上限为 0 时不发布）；
+        合并模式下已发布的 other 已计入配额，尚未发布时从剩余配额中扣除，没有名额时折叠部分直接丢弃
+        """
+        new_keys = [key for key in new_keys if key != other_key]
+        if not replace and not exists(other_key):
+            budget -= 1
+        if budget < 0:
+            kept.pop(other_key, None)
+            return kept, sum(1 for key in series if key not in kept)
+
+        admitted = new_keys[:budget]
+        kept.update((key, series[key]) for key in admitted)
+        # 合并模式下记录每个折叠序列的最新值，other 为其总和；本周期未读到的折叠序列保留上次的贡献，
+        # 重复读取的序列替换而不是累加（结果中本身带有的 other 行同样作为一项贡献）
+        for key in kept:
+            folded.pop(key, None)
+        for key in new_keys[budget:]:
+            folded[key] = series[key]
+        if other_key in series:
+            folded[other_key] = series[other_key]
+        kept[other_key] = sum(folded.values())
+        return kept, sum(1 for key in series if key not in kept)
+
+
+# ============================================================================
+# 指标映射计划
+# ============================================================================
+# 区分"字段不存在"和"字段值为 None"
+_MISSING = object()
+
+
+def published_metrics(source: dict) -> List[dict]:
+    """
+    数据源发布的指标配置: metrics（publish_raw 为 false 时不发布）+ aggregations
+    聚合指标的标签为其 group_by
+    """
+    metrics = list(source.get('metrics', [])) if source.get('publish_raw', True) else []
+    for aggregation in source.get('aggregations', []):
+        metrics.append({**aggregation, 'labels': list(aggregation.get('group_by', []))})
+    return metrics
+
+
+# 聚合函数: ratio 为 sum(numerator) / sum(denominator)
+AGGREGATE_FUNCTIONS = ('sum', 'avg', 'min', 'max', 'count', 'quantile', 'ratio')
+# 可加的聚合函数: 超出序列上限时折叠为 other（数值求和）仍有意义
+ADDITIVE_AGGREGATES = ('sum', 'count')
+
+
+class MappingPlan:
+    """
+    数据源的指标映射计划
+    metrics 配置只解析一次；每批数据先按字段拆成列，再按列批量生成标签元组和数值，
+    相同标签组合的多个指标共享同一份标签元组，无效值按字段计数而不是逐行打日志
+
+    配置了 aggregations 时，在同一遍映射中按 group_by 累加聚合状态，全部批次处理完后由
+    finalize() 计算聚合值，替代 Prometheus 侧逐次规则计算的 sum by / 比值；
+    publish_raw: false 时不生成逐行的原始序列，只发布聚合结果
+    """
+
+    def __init__(self, source: dict):
+        """
+        Args:
+            source: 数据源配置
+        """
+        self.source_name = source['name']
+        self.publish_raw = source.get('publish_raw', True)
+        # [(metric_name, source_field, label_names)]
+        self.metrics = [
+            (m['prometheus_name'], m['source_field'], tuple(m.get('labels', [])))
+            for m in source.get('metrics', [])
+        ] if self.publish_raw else []
+        # [(metric_name, function, value_fields, group_by, quantile)]
+        self.aggregations = self.validate(source)
+
+        self.label_fields = sorted(
+            {l for _, _, labels in self.metrics for l in labels}
+            | {l for _, _, _, group_by, _ in self.aggregations for l in group_by}
+        )
+        self.value_fields = sorted(
+            {field for _, field, _ in self.metrics}
+            | {field for _, _, fields, _, _ in self.aggregations for field in fields}
+        )
+        self.fields = sorted(set(self.label_fields) | set(self.value_fields))
+        # 本周期各字段的无效值数量: {source_field: count}
+        self.invalid_counts: Dict[str, int] = {}
+
+    @classmethod
+    def validate(cls, source: dict) -> List[tuple]:
+        """
+        校验数据源的 aggregations 配置（加载和热加载配置时调用，不合法的数据源不会启用）
+
+        Returns:
+            list: 解析后的聚合 [(metric_name, function, value_fields, group_by, quantile)]
+
+        Raises:
+            ValueError: 配置不合法
+        """
+        aggregations = []
+        for config in source.get('aggregations', []):
+            aggregation = cls._parse_aggregation(config)
+            name, function = aggregation[:2]
+            # 折叠后的 other 为各分组数值之和，对平均值、极值、分位数和比值没有意义
+            if config.get('overflow', source.get('overflow')) == 'other' and function not in ADDITIVE_AGGREGATES:
+                raise ValueError(
+                    f"overflow 'other' cannot be used with {function} aggregation {name}, use drop or topk"
+                )
+            aggregations.append(aggregation)
+        if aggregations and source.get('incremental'):
+            # 增量模式每周期只读取变化的行，无法得到完整分组的聚合值
+            raise ValueError("aggregations cannot be combined with incremental")
+        return aggregations
+
+    @staticmethod
+    def _parse_aggregation(config: dict) -> tuple:
+        """解析一个聚合配置为 (metric_name, function, value_fields, group_by, quantile)"""
+        name = config['prometheus_name']
+        function = config.get('function', 'sum')
+        if function not in AGGREGATE_FUNCTIONS:
+            raise ValueError(
+                f"Unknown aggregate function for {name}: {function}. Supported: {list(AGGREGATE_FUNCTIONS)}"
+            )
+
+        if function == 'ratio':
+            fields = (config['numerator'], config['denominator'])
+        elif function == 'count' and 'source_field' not in config:
+            fields = ()  # 按行计数
+        else:
+            fields = (config['source_field'],)
+
+        quantile = config.get('quantile', 0.5)
+        if function == 'quantile' and not 0 <= quantile <= 1:
+            raise ValueError(f"Quantile for {name} must be between 0 and 1, got {quantile}")
+        return name, function, fields, tuple(config.get('group_by', [])), quantile
+
+    def metric_labels(self) -> Dict[str, tuple]:
+        """发布的每个指标的标签名: {metric_name: label_names}"""
+        labels = {metric_name: label_names for metric_name, _, label_names in self.metrics}
+        labels.update((name, group_by) for name, _, _, group_by, _ in self.aggregations)
+        return labels
+
+    def new_series(self) -> Dict[str, Dict[tuple, float]]:
+        """
+        创建空的周期结果 {metric_name: {label_values: value}}
+        聚合指标在 finalize() 之前保存的是 {group: 累加状态}
+        """
+        return {metric_name: {} for metric_name in self.metric_labels()}
+
+    def apply_batch(self, batch, series_by_metric: Dict[str, Dict[tuple, float]]):
+        """
+        映射一批数据（行列表或 ColumnBatch）
+
+        Args:
+            batch: List[Dict] 或 ColumnBatch
+            series_by_metric: 输出 {metric_name: {label_values: value}}
+        """
+        if isinstance(batch, ColumnBatch):
+            self.apply_columns(batch.columns, batch.num_rows, series_by_metric)
+        else:
+            self.apply_rows(batch, series_by_metric)
+
+    def apply_rows(self, rows: List[Dict[str, Any]], series_by_metric: Dict[str, Dict[tuple, float]]):
+        """
+        映射一批行数据
+
+        Args:
+            rows: 一批采集数据
+            series_by_metric: 输出 {metric_name: {label_values: value}}
+        """
+        columns = {
+            field: [row.get(field, _MISSING) for row in rows]
+            for field in self.fields
+        }
+        self.apply_columns(columns, len(rows), series_by_metric)
+
+    def apply_columns(self, columns: Dict[str, Any], num_rows: int,
+                      series_by_metric: Dict[str, Dict[tuple, float]]):
+        """
+        映射一批列数据
+
+        Args:
+            columns: {field: 列数据}，缺失的字段视为全部不存在
+            num_rows: 行数
+            series_by_metric: 输出 {metric_name: {label_values: value}}
+        """
+        missing = [_MISSING] * num_rows
+
+        # 标签列: 字段不存在时为 'unknown'，其余转为字符串并驻留到共享表
+        intern = LABEL_INTERNER.intern
+        label_columns = {}
+        for field in self.label_fields:
+            column = columns.get(field, missing)
+            label_columns[field] = [
+                'unknown' if v is _MISSING else intern(v if type(v) is str else str(v))
+                for v in column
+            ]
+
+        # 数值列: (有效行号, 数值)，None 表示整列有效
+        value_columns = {
+            field: self._coerce_floats(field, columns.get(field, missing))
+            for field in self.value_fields
+        }
+
+        # 同一标签组合的指标共享标签元组
+        label_tuples: Dict[tuple, list] = {}
+        for metric_name, field, labels in self.metrics:
+            keys = label_tuples.get(labels)
+            if keys is None:
+                if labels:
+                    keys = list(zip(*(label_columns[l] for l in labels)))
+                else:
+                    keys = [()] * num_rows
+                label_tuples[labels] = keys
+
+            rows, values = value_columns[field]
+            if rows is not None:
+                keys = [keys[i] for i in rows]
+            series_by_metric[metric_name].update(zip(keys, values))
+
+        for metric_name, function, fields, group_by, _ in self.aggregations:
+            keys = label_tuples.get(group_by)
+            if keys is None:
+                keys = list(zip(*(label_columns[l] for l in group_by))) if group_by else [()] * num_rows
+                label_tuples[group_by] = keys
+            self._accumulate(
+                series_by_metric[metric_name], function, keys,
+                [self._dense(value_columns[field], num_rows) for field in fields]
+            )
+
+    @staticmethod
+    def _dense(value_column: tuple, num_rows: int) -> list:
+        """(有效行号, 数值) 展开为按行对齐的列表，无效行为 None"""
+        rows, values = value_column
+        if rows is None:
+            return values
+        dense = [None] * num_rows
+        for i, v in zip(rows, values):
+            dense[i] = v
+        return dense
+
+    @staticmethod
+    def _accumulate(state: Dict[tuple, Any], function: str, keys: list, columns: List[list]):
+        """
+        将一批数据累加到聚合状态 {group: 状态}
+        sum / count / min / max 的状态即当前值；avg 为 [sum, count]；ratio 为 [sum(分子), sum(分母)]；
+        quantile 需要保留分组内的全部数值
+        """
+        if function == 'count':
+            if columns:
+                keys = [k for k, v in zip(keys, columns[0]) if v is not None]
+            for key in keys:
+                state[key] = state.get(key, 0) + 1
+            return
+
+        if function == 'ratio':
+            for key, numerator, denominator in zip(keys, columns[0], columns[1]):
+                if numerator is None or denominator is None:
+                    continue
+                acc = state.get(key)
+                if acc is None:
+                    state[key] = [numerator, denominator]
+                else:
+                    acc[0] += numerator
+                    acc[1] += denominator
+            return
+
+        pairs = [(k, v) for k, v in zip(keys, columns[0]) if v is not None]
+        if function == 'sum':
+            for key, v in pairs:
+                state[key] = state.get(key, 0.0) + v
+        elif function == 'min':
+            for key, v in pairs:
+                current = state.get(key)
+                if current is None or v < current:
+                    state[key] = v
+        elif function == 'max':
+            for key, v in pairs:
+                current = state.get(key)
+                if current is None or v > current:
+                    state[key] = v
+        elif function == 'avg':
+            for key, v in pairs:
+                acc = state.get(key)
+                if acc is None:
+                    state[key] = [v, 1]
+                else:
+                    acc[0] += v
+                    acc[1] += 1
+        else:  # quantile
+            for key, v in pairs:
+                values = state.get(key)
+                if values is None:
+                    state[key] = [v]
+                else:
+                    values.append(v)
+
+    def finalize(self, series_by_metric: Dict[str, Dict[tuple, Any]]):
+        """
+        全部批次映射完成后，将聚合状态替换为聚合值（原地修改 series_by_metric）
+        ratio 分母为 0 的分组不发布
+        """
+        for metric_name, function, _, _, quantile in self.aggregations:
+            state = series_by_metric[metric_name]
+            if function in ('sum', 'min', 'max', 'count'):
+                series_by_metric[metric_name] = {key: float(v) for key, v in state.items()}
+            elif function == 'avg':
+                series_by_metric[metric_name] = {key: total / count for key, (total, count) in state.items()}
+            elif function == 'ratio':
+                series_by_metric[metric_name] = {
+                    key: numerator / denominator
+                    for key, (numerator, denominator) in state.items() if denominator
+                }
+            else:
+                series_by_metric[metric_name] = {
+                    key: self._quantile(values, quantile) for key, values in state.items()
+                }
+
+    @staticmethod
+    def _quantile(values: List[float], q: float) -> float:
+        """分位数（线性插值，与 numpy.quantile 默认方法一致）"""
+        values.sort()
+        position = q * (len(values) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    def _coerce_floats(self, field: str, column) -> tuple:
+        """
+        批量转换为 float
+
+        Returns:
+            tuple: (有效行号列表或 None（全部有效）, 数值列表)
+        """
+        # 列式数据源（NumPy / Arrow 转换后的数组）直接整列转换
+        if hasattr(column, 'astype'):
+            try:
+                return None, column.astype('float64').tolist()
+            except (ValueError, TypeError):
+                column = column.tolist()
+
+        # 快速路径: 整列都能转换时由 C 层完成
+        try:
+            return None, list(map(float, column))
+        except (ValueError, TypeError):
+            pass
+
+        rows, values = [], []
+        invalid = 0
+        for i, v in enumerate(column):
+            if v is None or v is _MISSING:
+                continue
+            try:
+                values.append(float(v))
+                rows.append(i)
+            except (ValueError, TypeError):
+                invalid += 1
+
+        if invalid:
+            self.invalid_counts[field] = self.invalid_counts.get(field, 0) + invalid
+        return rows, values
+
+    def pop_invalid_counts(self) -> Dict[str, int]:
+        """取出并重置本周期的无效值计数"""
+        counts, self.invalid_counts = self.invalid_counts, {}
+        return counts
+
+
+# ============================================================================
+# 子进程解析（parse_in_process）
+# ============================================================================
+# 子进程内缓存的映射计划: {(source_name, 映射配置): MappingPlan}
+_WORKER_PLANS: Dict[tuple, MappingPlan] = {}
+
+
+def decode_payload(payload: bytes, file_format: str) -> List[Dict[str, Any]]:
+    """
+    解析原始数据
+
+    Args:
+        payload: 原始字节串
+        file_format: json / ndjson / csv
+
+    Returns:
+        List[Dict]: 行数据
+    """
+    if file_format == 'json':
+        data = json.loads(payload)
+        if isinstance(data, dict) and 'data' in data:
+            data = data['data']
+        return data if isinstance(data, list) else [data]
+
+    elif file_format == 'ndjson':
+        return [json.loads(line) for line in payload.splitlines() if line.strip()]
+
+    elif file_format == 'csv':
+        import csv
+        import io
+        return list(csv.DictReader(io.StringIO(payload.decode('utf-8'))))
+
+    else:
+        raise ValueError(f"Unsupported file format: {file_format}")
+
+
+def encode_series(series: Dict[tuple, float], label_count: int) -> tuple:
+    """
+    将 {label_values: value} 编码为紧凑的列式缓冲区，用于跨进程传输
+    每列标签值去重为字符串表 + array('I') 下标，数值为 array('d') 字节串
+
+    Returns:
+        tuple: (label_tables, label_id_buffers, value_buffer)
+    """
+    tables = [[] for _ in range(label_count)]
+    ids = [{} for _ in range(label_count)]
+    columns = [array('I') for _ in range(label_count)]
+    for key in series:
+        for table, id_map, column, label_value in zip(tables, ids, columns, key):
+            label_id = id_map.get(label_value)
+            if label_id is None:
+                label_id = id_map[label_value] = len(table)
+                table.append(label_value)
+            column.append(label_id)
+
+    values = array('d', series.values())
+    return tables, [column.tobytes() for column in columns], values.tobytes()
+
+
+def decode_series(encoded: tuple) -> Dict[tuple, float]:
+    """encode_series() 的逆操作"""
+    tables, id_buffers, value_buffer = encoded
+    values = array('d')
+    values.frombytes(value_buffer)
+
+    columns = []
+    for table, buffer in zip(tables, id_buffers):
+        label_ids = array('I')
+        label_ids.frombytes(buffer)
+        columns.append([table[i] for i in label_ids])
+
+    keys = zip(*columns) if columns else [()] * len(values)
+    return dict(zip(keys, values))
+
+
+def parse_payload_in_process(plan_config: dict, payload: bytes, file_format: str) -> tuple:
+    """
+    子进程入口: 解析原始数据并映射为时间序列
+
+    Args:
+        plan_config: 数据源配置中 name、metrics、aggregations 和 publish_raw 部分
+        payload: 原始字节串
+        file_format: json / ndjson / csv
+
+    Returns:
+        tuple: (行数, {metric_name: encode_series() 结果}, {field: 无效值数量})
+    """
+    cache_key = (plan_config['name'], json.dumps(plan_config, sort_keys=True, default=str))
+    plan = _WORKER_PLANS.get(cache_key)
+    if plan is None:
+        plan = _WORKER_PLANS[cache_key] = MappingPlan(plan_config)
+
+    rows = decode_payload(payload, file_format)
+    series_by_metric = plan.new_series()
+    for batch in chunked(rows, DEFAULT_BATCH_SIZE):
+        plan.apply_rows(batch, series_by_metric)
+    plan.finalize(series_by_metric)
+
+    label_names = plan.metric_labels()
+    encoded = {
+        metric_name: encode_series(series, len(label_names[metric_name]))
+        for metric_name, series in series_by_metric.items()
+    }
+    return len(rows), encoded, plan.pop_invalid_counts()
+
+
+# ============================================================================
+# 采集调度器
+# ============================================================================
+# 单次采集的结果，由 UniversalExporter._update_metrics() 返回给调度器
+CYCLE_SUCCESS = 'success'      # 发布了新数据
+CYCLE_UNCHANGED = 'unchanged'  # 数据未变化
+CYCLE_EMPTY = 'empty'          # 没有返回数据（保留旧值，但不视为未变化，不放大间隔）
+CYCLE_FAILED = 'failed'        # 采集失败
+
+
+class SourceHealth:
+    """
+    单个数据源的调度状态: 失败退避、熔断器和自适应间隔
+    - 失败退避: 连续第 n 次失败后，下一次采集在 interval * multiplier^n（不超过 max_backoff）后进行，带随机抖动
+    - 熔断器: 连续失败 failure_threshold 次后打开，cooldown 内不再采集；冷却结束后半开，
+      只放行一次探测采集，成功则关闭，失败则重新打开
+    - 自适应间隔（可选）: 连续 unchanged_cycles 个周期数据未变化时间隔翻倍（不超过 max_interval，
+      也不超过指标最小 TTL - interval），数据再次变化或没有返回数据时立即恢复为配置的 interval
+    """
+
+    # 数值即导出的 exporter_source_breaker_state
+    CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+    def __init__(self, multiplier: float = 2.0, max_backoff: float = 600, jitter: float = 0.2,
+                 failure_threshold: int = 5, cooldown: float = 300,
+                 unchanged_cycles: Optional[int] = None, max_interval: Optional[float] = None,
+                 ttl: Optional[float] = None):
+        """
+        Args:
+            multiplier: 退避倍数
+            max_backoff: 退避上限（秒），小于 interval 时以 interval 为准
+            jitter: 随机抖动比例，避免同一后端上的数据源同时重试
+            failure_threshold: 打开熔断器的连续失败次数
+            cooldown: 熔断后到半开探测的时间（秒）
+            unchanged_cycles: 自适应间隔: 连续未变化多少个周期后放大间隔，None 表示关闭
+            max_interval: 自适应间隔的上限（秒）
+            ttl: 数据源指标中最小的 TTL（秒）。放大后的周期不超过 ttl - interval，
+                 留出一个 interval 完成采集，避免序列在两次采集之间过期
+        """
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.unchanged_cycles = unchanged_cycles
+        self.max_interval = max_interval
+        self.ttl = ttl
+
+        self.state = self.CLOSED
+        self.failures = 0   # 连续失败次数
+        self.unchanged = 0  # 连续未变化周期数
+        self.stretch = 1.0  # 自适应间隔的放大倍数
+
+    def begin_attempt(self):
+        """采集开始前调用: 冷却结束后的第一次采集为半开探测"""
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+
+    def next_period(self, result: Any, interval: float) -> float:
+        """
+        根据本次采集结果计算到下一次采集的周期
+
+        Args:
+            result: CYCLE_SUCCESS / CYCLE_UNCHANGED / CYCLE_EMPTY / CYCLE_FAILED
+            interval: 配置的采集间隔（秒）
+
+        Returns:
+            float: 周期（秒）
+        """
+        if result == CYCLE_FAILED:
+            self.failures += 1
+            self.unchanged = 0
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                return self._jittered(self.cooldown)
+            return self._jittered(min(interval * self.multiplier ** self.failures, max(self.max_backoff, interval)))
+
+        self.failures = 0
+        self.state = self.CLOSED
+        if self.unchanged_cycles:
+            if result == CYCLE_UNCHANGED:
+                self.unchanged += 1
+                if self.unchanged >= self.unchanged_cycles:
+                    self.unchanged = 0
+                    limit = self.max_interval or interval
+                    if self.ttl is not None:
+                        limit = min(limit, self.ttl - interval)
+                    self.stretch = min(self.stretch * 2, max(limit / interval, 1.0))
+            else:
+                self.unchanged = 0
+                self.stretch = 1.0
+        return interval * self.stretch
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class DeadlineWatchdog:
+    """
+    截止时间监视线程
+    所有数据源的截止时间放在一个最小堆中，由单个线程等待最早到期的一个并调用 collector.cancel()，
+    不需要为每次采集创建定时器线程
+    """
+
+    def __init__(self):
+        self._heap = []  # [[deadline_at, seq, collector, active]]
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.logger = logging.getLogger('deadline')
+
+    def watch(self, collector: BaseCollector, seconds: Optional[float]) -> Optional[list]:
         """
-        注册一个新的 Gauge 指标
+        设置采集器本周期的截止时间并开始监视
 
         Args:
-            name: 指标名称
-            description: 指标描述
-            labels: 标签列表
+            collector: 采集器
+            seconds: 距截止的秒数，None 表示不限制
 
         Returns:
-            Gauge: Prometheus Gauge 对象
+            监视句柄，周期结束后传给 done()
         """
-        if name not in self.gauges:
-            self.gauges[name] = Gauge(name, description, labels)
-            self.timestamps[name] = {}
-            self.logger.info(f"Registered gauge: {name} with labels {labels}")
-        return self.gauges[name]
+        collector.arm_deadline(seconds)
+        if seconds is None:
+            return None
+
+        entry = [collector.deadline_at, next(self._seq), collector, True]
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='deadline-watchdog', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return entry
+
+    def done(self, entry: Optional[list]):
+        """周期结束（无论成功与否）后停止监视，堆中的条目在到达堆顶时丢弃"""
+        if entry is not None:
+            with self._cond:
+                entry[3] = False
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._heap and not self._heap[0][3]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                entry = heapq.heappop(self._heap)
+                entry[3] = False
+
+            # 释放锁后对应周期可能已结束并开始下一周期，按截止时间确认取消的仍是同一周期
+            deadline_at, _, collector, _ = entry
+            if collector.cancel(deadline_at):
+                self.logger.warning(f"[{collector.name}] Deadline exceeded, cancelled in-flight work")
+
+
+class SourceScheduler:
+    """
+    基于 asyncio 的采集调度器
+    - 固定频率: 按 首次执行时间 + k * interval 计算触发时间，采集耗时不会累积为漂移
+    - 启动相位分散: 各数据源的首次执行按名称哈希分散到 startup_spread_seconds 内
+    - 并发限制: 全局并发上限 + 按数据源类型（bigquery/database/...）的并发上限
+    - 阻塞式驱动在有界线程池中执行；实现了 aiter_batches() 的采集器在事件循环上原生执行 IO
+    - 可选的 next_period 回调按采集结果调整周期（失败退避、熔断、自适应间隔）
+    """
 
-    def set_value(self, metric_name: str, labels: Dict[str, str], value: float):
+    def __init__(self, run_source: Callable[[dict], None], max_concurrency: int = 16,
+                 backend_concurrency: Optional[Dict[str, int]] = None,
+                 startup_spread_seconds: float = 10,
+                 on_lag: Optional[Callable[[str, float], None]] = None,
+                 next_period: Optional[Callable[[dict, Any, float], float]] = None):
         """
-        设置指标值并更新时间戳
+        Args:
+            run_source: 执行一次采集的函数（阻塞），在线程池中调用
+            max_concurrency: 全局同时执行的采集数上限，同时也是线程池大小
+            backend_concurrency: 按数据源类型的并发上限，如 {'bigquery': 4}
+            startup_spread_seconds: 首次执行的相位分散窗口（秒）
+            on_lag: 每次采集实际开始时调用 on_lag(source_name, lag_seconds)，
+                    lag 为实际开始时间（含并发限制排队和线程池排队）与计划触发时间之差
+            next_period: 每次采集结束后调用 next_period(source, run_source 的返回值, interval)，
+                         返回到下一次触发的周期（秒），默认固定为 interval
+        """
+        self.run_source = run_source
+        self.on_lag = on_lag
+        self.next_period = next_period
+        self.max_concurrency = max_concurrency
+        self.backend_concurrency = backend_concurrency or {}
+        self.startup_spread = startup_spread_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='collector')
+        self.loop = asyncio.new_event_loop()
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.logger = logging.getLogger('scheduler')
+        self._thread = None
+        self._global_limit = None
+        self._backend_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def start(self):
+        """在后台线程中启动事件循环"""
+        self._thread = threading.Thread(target=self._run_loop, daemon=True, name="scheduler")
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """停止所有采集任务和事件循环"""
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout)
+        except Exception as e:
+            self.logger.warning(f"Scheduler did not shut down cleanly: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
+
+    async def _shutdown(self):
+        tasks = list(self.tasks.values())
+        self.tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        # 信号量必须在事件循环内创建
+        self._global_limit = asyncio.Semaphore(self.max_concurrency)
+        self.loop.run_forever()
+
+    def add_source(self, source: dict, interval: float, first_delay: Optional[float] = None):
+        """
+        开始调度一个数据源（线程安全）
 
         Args:
-            metric_name: 指标名称
-            labels: 标签字典
-            value: 指标值
+            source: 数据源配置
+            interval: 采集间隔（秒）
+            first_delay: 首次执行的延迟（秒），默认按名称哈希分散到 startup_spread_seconds 内
         """
-        if metric_name not in self.gauges:
-            self.logger.warning(f"Gauge '{metric_name}' not registered")
-            return
+        def create():
+            name = source['name']
+            self.tasks[name] = self.loop.create_task(self._source_loop(source, interval, first_delay))
+
+        self.loop.call_soon_threadsafe(create)
+
+    def remove_source(self, name: str):
+        """停止调度一个数据源（线程安全），正在执行的采集会完成但不再触发"""
+        def cancel():
+            task = self.tasks.pop(name, None)
+            if task is not None:
+                task.cancel()
+
+        self.loop.call_soon_threadsafe(cancel)
+
+    def _initial_delay(self, name: str, interval: float) -> float:
+        """按名称哈希计算首次执行的相位，重启后保持稳定"""
+        window = min(interval, self.startup_spread)
+        return (zlib.crc32(name.encode()) / 2 ** 32) * window
+
+    def _backend_limit(self, backend: str) -> Optional[asyncio.Semaphore]:
+        limit = self.backend_concurrency.get(backend)
+        if limit is None:
+            return None
+        semaphore = self._backend_limits.get(backend)
+        if semaphore is None:
+            semaphore = self._backend_limits[backend] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def _source_loop(self, source: dict, interval: float, first_delay: Optional[float] = None):
+        """单个数据源的固定频率采集循环"""
+        name = source['name']
+        if first_delay is None:
+            first_delay = self._initial_delay(name, interval)
+        first_run = self.loop.time() + first_delay
+
+        self.logger.info(
+            f"[{name}] Scheduled (interval: {interval}s, "
+            f"first run in {first_run - self.loop.time():.1f}s)"
+        )
 
-        gauge = self.gauges[metric_name]
-        label_key = tuple(sorted(labels.items()))
+        intended = first_run
+        while True:
+            delay = intended - self.loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            # 先获取后端限额再获取全局限额: 在后端限额上排队的数据源不占用全局名额，
+            # 否则同一类型的大量数据源会占满全局并发，其他类型的数据源全部饿死
+            backend_limit = self._backend_limit(source.get('type'))
+            if backend_limit is not None:
+                async with backend_limit:
+                    async with self._global_limit:
+                        result = await self._run_once(source, intended)
+            else:
+                async with self._global_limit:
+                    result = await self._run_once(source, intended)
 
-        with self.lock:
-            # 更新值和时间戳
-            gauge.labels(**labels).set(value)
-            self.timestamps[metric_name][label_key] = time.time()
+            # 退避、熔断或自适应间隔可以改变下一次的周期
+            period = interval
+            if self.next_period is not None:
+                period = self.next_period(source, result, interval)
 
-    def clear_metric(self, metric_name: str):
+            # 采集耗时超过周期时跳过错过的触发点，而不是连续补跑
+            missed = int((self.loop.time() - intended) // period)
+            intended += max(missed + 1, 1) * period
+
+    async def _run_once(self, source: dict, intended: float) -> Any:
+        def run():
+            # loop.time() 基于 time.monotonic()，可以在线程池中直接比较
+            if self.on_lag is not None:
+                self.on_lag(source['name'], max(time.monotonic() - intended, 0.0))
+            return self.run_source(source)
+
+        try:
+            return await self.loop.run_in_executor(self.executor, run)
+        except Exception as e:
+            self.logger.error(f"[{source['name']}] Collection raised: {e}")
+            return CYCLE_FAILED
+
+    def iterate(self, async_iterable, collector: Optional[BaseCollector] = None) -> Iterator:
         """
-        清空指定指标的所有标签组合（用于每次采集前清理）
+        在线程池中同步消费异步迭代器（原生异步采集器的桥接）
+        IO 在事件循环上执行，调用线程只等待每一批结果
 
         Args:
-            metric_name: 指标名称
+            async_iterable: 异步迭代器，如 collector.aiter_batches()
+            collector: 所属采集器，截止时间到达时取消事件循环上正在等待的任务
+
+        Yields:
+            异步迭代器产生的每个元素
         """
-        if metric_name not in self.gauges:
-            return
+        iterator = async_iterable.__aiter__()
+        try:
+            while True:
+                future = asyncio.run_coroutine_threadsafe(iterator.__anext__(), self.loop)
+                try:
+                    with collector.cancellable(future.cancel) if collector is not None else nullcontext():
+                        item = future.result()
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            aclose = getattr(iterator, 'aclose', None)
+            if aclose is not None:
+                asyncio.run_coroutine_threadsafe(aclose(), self.loop)
 
-        gauge = self.gauges[metric_name]
 
-        with self.lock:
-            # 清空 Gauge 内部存储
-            gauge._metrics.clear()
-            self.timestamps[metric_name].clear()
+# ============================================================================
+# 数据源分片（多副本水平扩展）
+# ============================================================================
+class ShardMembership:
+    """
+    数据源分片
+    按 rendezvous（HRW）哈希分配: 每个数据源归属于 hash(副本 ID, 数据源名称) 最大的副本，
+    副本增减时只有归属于增减副本的数据源会移动，其余数据源保持在原副本上
+
+    副本列表来源（三选一）:
+    - shard_index / shard_count: 静态分片，副本 ID 为 0..shard_count-1
+    - membership_file: 每行一个副本 ID 的文件（由部署系统维护），本副本 ID 为 replica_id（默认主机名）
+    - lock_dir: 同一主机上的多个副本，每个副本持有目录中一个 slot 文件的排他锁，
+      被持有的 slot 即为当前存活的副本，进程退出时锁自动释放
+    """
 
-    def cleanup_expired(self):
+    def __init__(self, config: dict):
         """
-        清理所有过期的指标数据
-        遍历所有指标，删除超过 TTL 的标签组合
+        Args:
+            config: exporter.sharding 配置
         """
-        now = time.time()
-        total_cleaned = 0
+        self.logger = logging.getLogger('sharding')
+        self.membership_file = config.get('membership_file')
+        self.lock_dir = config.get('lock_dir')
+        self._lock_file = None
+
+        # 同时配置了多种副本列表来源时，按 membership_file > lock_dir > shard_count 的顺序取第一种
+        modes = [mode for mode in ('membership_file', 'lock_dir', 'shard_count') if config.get(mode) is not None]
+        self.mode = modes[0] if modes else 'shard_count'
+        if len(modes) > 1:
+            self.logger.warning(f"Multiple sharding modes configured ({', '.join(modes)}), using {self.mode}")
+
+        if self.membership_file:
+            import socket
+            self.replica_id = str(config.get('replica_id') or socket.gethostname())
+        elif self.lock_dir:
+            self.replica_id = self._acquire_slot(config.get('max_replicas', 64))
+        else:
+            self.shard_count = int(config['shard_count'])
+            index = int(config['shard_index'])
+            if not 0 <= index < self.shard_count:
+                raise ValueError(f"shard_index must be in [0, {self.shard_count}), got {index}")
+            self.replica_id = str(index)
+
+        self.logger.info(f"Running as shard replica '{self.replica_id}' ({self.mode})")
+
+    @property
+    def dynamic(self) -> bool:
+        """副本列表是否会在运行中变化（需要定期重新分配）"""
+        return bool(self.membership_file or self.lock_dir)
+
+    def members(self) -> List[str]:
+        """当前的副本 ID 列表"""
+        if self.membership_file:
+            with open(self.membership_file, 'r', encoding='utf-8') as f:
+                return sorted({line.strip() for line in f if line.strip() and not line.startswith('#')})
+        if self.lock_dir:
+            return self._locked_slots()
+        return [str(i) for i in range(self.shard_count)]
+
+    @staticmethod
+    def owner(source_name: str, members: List[str]) -> Optional[str]:
+        """数据源归属的副本（rendezvous 哈希）"""
+        return max(
+            members,
+            key=lambda member: hashlib.sha1(f'{member}/{source_name}'.encode('utf-8')).digest(),
+            default=None
+        )
 
-        with self.lock:
-            for metric_name, gauge in self.gauges.items():
-                timestamps = self.timestamps.get(metric_name, {})
-                expired_keys = [
-                    key for key, ts in timestamps.items()
-                    if now - ts > self.ttl
-                ]
-
-                for key in expired_keys:
-                    try:
-                        # 获取标签值列表（按 Gauge 定义的顺序）
-                        labels_dict = dict(key)
-                        label_values = [labels_dict.get(l, '') for l in gauge._labelnames]
-                        gauge.remove(*label_values)
-                        del timestamps[key]
-                        total_cleaned += 1
-                    except Exception as e:
-                        self.logger.error(f"Failed to remove expired metric: {e}")
+    def assign(self, source_names: Iterable[str]) -> tuple:
+        """
+        计算本副本负责的数据源
 
-        if total_cleaned > 0:
-            self.logger.info(f"Cleaned up {total_cleaned} expired metric(s)")
+        Returns:
+            tuple: (本副本负责的数据源名称集合, 副本列表)
+        """
+        members = self.members()
+        if self.replica_id not in members:
+            self.logger.warning(f"Replica '{self.replica_id}' is not in the member list {members}, running no sources")
+            return set(), members
+        return {name for name in source_names if self.owner(name, members) == self.replica_id}, members
+
+    def _acquire_slot(self, max_replicas: int) -> str:
+        """在 lock_dir 中获取编号最小的空闲 slot（重启后通常拿回原来的 slot，分配保持稳定）"""
+        import fcntl
+        os.makedirs(self.lock_dir, exist_ok=True)
+        for slot in range(max_replicas):
+            lock_file = open(os.path.join(self.lock_dir, f'slot-{slot}.lock'), 'a+')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            self._lock_file = lock_file
+            return f'slot-{slot}'
+        raise RuntimeError(f"No free shard slot in {self.lock_dir} (max_replicas: {max_replicas})")
+
+    def _locked_slots(self) -> List[str]:
+        """被某个副本持有锁的 slot"""
+        import fcntl
+        members = []
+        for filename in sorted(os.listdir(self.lock_dir)):
+            if not filename.endswith('.lock'):
+                continue
+            slot = filename[:-len('.lock')]
+            if slot == self.replica_id:
+                members.append(slot)
+                continue
+            with open(os.path.join(self.lock_dir, filename), 'a+') as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # 锁被其他副本持有
+                    members.append(slot)
+                else:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return members
+
+    def close(self):
+        """释放 slot 锁"""
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
 
 
 # ============================================================================
@@ -512,28 +4299,103 @@ class UniversalExporter:
     主类，负责协调数据采集、指标更新和 HTTP 服务
     """
 
-    def __init__(self, config_path: str):
+    def __init__(self, config_path: str, sharding: Optional[dict] = None):
         """
         初始化导出器
 
         Args:
             config_path: 配置文件路径
+            sharding: 覆盖 exporter.sharding 的配置（如命令行指定的 shard_index / shard_count）
         """
         self.logger = logging.getLogger('exporter')
 
         # 加载配置
+        self.config_path = config_path
+        self.config_mtime = os.path.getmtime(config_path)
         with open(config_path, 'r', encoding='utf-8') as f:
             self.config = yaml.safe_load(f)
 
         self.logger.info(f"Loaded configuration from {config_path}")
 
+        # 分片模式: 只运行分配给本副本的数据源，/metrics 只包含这些数据源的指标
+        sharding_config = dict(self.config.get('exporter', {}).get('sharding') or {})
+        if sharding:
+            # 命令行指定的静态分片优先于配置文件中的动态成员来源
+            for key in ('membership_file', 'lock_dir'):
+                if sharding_config.pop(key, None) is not None:
+                    self.logger.warning(f"Static sharding from the command line overrides exporter.sharding.{key}")
+            sharding_config.update(sharding)
+        self.sharding = ShardMembership(sharding_config) if sharding_config else None
+        self.shard_members = 1
+
+        # 当前生效的数据源: {source_name: source}，以及每个指标的注册参数: {metric_name: spec}
+        self.sources: Dict[str, dict] = self._enabled_sources(self.config)
+        self.metric_specs: Dict[str, dict] = {}
+
+        # 配置热加载（SIGHUP 或配置文件变化）
+        self.reload_requested = threading.Event()
+        self.reload_lock = threading.Lock()
+
         # 初始化指标管理器
         ttl = self.config.get('exporter', {}).get('metrics_ttl_seconds', 300)
-        self.metrics_manager = MetricsManager(ttl_seconds=ttl)
+        backend = self.config.get('exporter', {}).get('metrics_backend', 'gauge')
+        self.metrics_manager = MetricsManager(ttl_seconds=ttl, backend=backend)
 
         # 初始化指标
         self._init_metrics()
 
+        # /metrics 输出缓存，每次发布后重新渲染
+        self.exposition = ExpositionCache(
+            min_interval_seconds=self.config.get('exporter', {}).get('exposition_min_interval_seconds', 1),
+            max_age_seconds=self.config.get('exporter', {}).get('exposition_max_age_seconds', 10),
+        )
+
+        # 采集器按数据源缓存，进程生命周期内复用: {source_name: BaseCollector}
+        self.collectors: Dict[str, BaseCollector] = {}
+        self.collectors_lock = threading.Lock()
+        # 正在执行的周期数 {collector: count}；重新加载时仍在使用的采集器延迟到周期结束再关闭
+        self.collector_cycles: Dict[BaseCollector, int] = {}
+        self.retired_collectors: Set[BaseCollector] = set()
+
+        # 增量采集水位
+        state_dir = self.config.get('exporter', {}).get('state_dir', '.exporter_state')
+        self.watermarks = WatermarkStore(os.path.join(state_dir, 'watermarks.json'))
+
+        # 已发布序列的磁盘快照，重启后立即恢复
+        self.series_snapshot = SeriesSnapshotFile(os.path.join(state_dir, 'series.snapshot'))
+        self.snapshot_interval = self.config.get('exporter', {}).get('snapshot_interval_seconds', 60)
+
+        # 每个数据源编译一次的映射计划: {source_name: MappingPlan}
+        self.plans: Dict[str, MappingPlan] = {}
+
+        # 声明了 shared_fetch 的数据源共用相同的查询/请求
+        self.shared_fetches = SharedFetchCoordinator(self._iter_batches)
+
+        # 采集调度器，start() 时创建
+        self.scheduler: Optional[SourceScheduler] = None
+
+        # 每个数据源最近一次采集的读取字节数和分阶段耗时（调试端点使用）
+        self.source_stats: Dict[str, dict] = {}
+
+        # 每个数据源的失败退避、熔断器和自适应间隔状态，首次采集时创建
+        self.source_health: Dict[str, SourceHealth] = {}
+
+        # 数据源 deadline 的监视线程，到期时取消进行中的查询/请求
+        self.deadlines = DeadlineWatchdog()
+
+        # 就绪判定: 达到 quorum 个数据源完成首次采集后 /ready 返回 200
+        readiness_config = self.config.get('exporter', {}).get('readiness') or {}
+        readiness_timeout = readiness_config.get('timeout')
+        self.readiness = ReadinessGate(
+            quorum=readiness_config.get('quorum', 1.0),
+            quorum_count=readiness_config.get('quorum_count'),
+            timeout=self._parse_interval(readiness_timeout) if readiness_timeout else None,
+        )
+
+        # parse_in_process 数据源使用的进程池，首次使用时创建
+        self.process_pool = None
+        self.process_pool_lock = threading.Lock()
+
         # Exporter 自身的监控指标
         self.scrape_success = Counter(
             'exporter_scrape_success_total',
@@ -555,72 +4417,497 @@ class UniversalExporter:
             'Timestamp of last successful scrape',
             ['source']
         )
+        self.invalid_values = Counter(
+            'exporter_invalid_values_total',
+            'Total number of values that could not be converted to float',
+            ['source', 'field']
+        )
+        self.series_overflow = Counter(
+            'exporter_series_overflow_total',
+            'Total number of series dropped or folded by cardinality limits',
+            ['source', 'metric']
+        )
+        self.unchanged_cycles = Counter(
+            'exporter_source_unchanged_total',
+            'Total number of cycles skipped because the source data had not changed',
+            ['source']
+        )
+
+        # 采集周期分阶段耗时: connect / fetch / decode / map / publish
+        # fetch 为采集总耗时扣除 connect、decode、map 后的部分（查询执行、网络传输等）
+        self.phase_duration = Histogram(
+            'exporter_phase_duration_seconds',
+            'Duration of each collection phase in seconds',
+            ['source', 'phase'],
+            buckets=PHASE_BUCKETS
+        )
+        self.source_rows = Counter(
+            'exporter_rows_total',
+            'Total number of rows read from the source',
+            ['source']
+        )
+        self.source_bytes = Counter(
+            'exporter_bytes_total',
+            'Total number of bytes read from the source',
+            ['source']
+        )
+        self.shard_sources = Gauge(
+            'exporter_shard_sources',
+            'Number of sources run by this replica'
+        )
+        self.shard_member_count = Gauge(
+            'exporter_shard_members',
+            'Number of replicas sharing the sources'
+        )
+        self.shard_sources.set(len(self.sources))
+        self.shard_member_count.set(self.shard_members)
+        self.scheduler_lag = Histogram(
+            'exporter_scheduler_lag_seconds',
+            'Delay between the intended and the actual start of a collection',
+            ['source'],
+            buckets=LAG_BUCKETS
+        )
+        self.breaker_state = Gauge(
+            'exporter_source_breaker_state',
+            'Circuit breaker state of the source (0=closed, 1=half-open, 2=open)',
+            ['source']
+        )
+        self.consecutive_failures = Gauge(
+            'exporter_source_consecutive_failures',
+            'Number of consecutive failed collections of the source',
+            ['source']
+        )
+        self.source_interval = Gauge(
+            'exporter_source_interval_seconds',
+            'Current period between collections of the source, including backoff and adaptive stretching',
+            ['source']
+        )
+        self.ready = Gauge(
+            'exporter_ready',
+            'Whether the required quorum of sources has completed a first collection'
+        )
+        self.startup_seconds = Gauge(
+            'exporter_startup_seconds',
+            'Seconds from startup until the exporter became ready'
+        )
+        self.startup_import_seconds = Gauge(
+            'exporter_startup_import_seconds',
+            'Time spent importing each driver module',
+            ['module']
+        )
+        self.startup_client_seconds = Gauge(
+            'exporter_startup_client_seconds',
+            'Time spent creating the client of each source',
+            ['source']
+        )
+        self.deadline_exceeded = Counter(
+            'exporter_deadline_exceeded_total',
+            'Total number of collections cancelled because they exceeded the source deadline',
+            ['source']
+        )
+        self.breaker_opened = Counter(
+            'exporter_source_breaker_opened_total',
+            'Total number of times the circuit breaker of the source opened',
+            ['source']
+        )
+        # 每个指标的序列数和 MetricsManager 锁等待，拉取时读取
+        REGISTRY.register(MetricsManagerStats(self.metrics_manager))
 
     def _init_metrics(self):
         """
         根据配置初始化所有 Prometheus 指标
         """
-        for source in self.config.get('data_sources', []):
+        for name, spec in self._build_metric_specs(self.sources).items():
+            self._register_metric(name, spec)
+        self._share_metrics()
+
+    def _share_metrics(self):
+        """将由多个数据源共同发布的指标告知 MetricsManager，这些指标按数据源刷新 TTL"""
+        publishers: Dict[str, int] = {}
+        for source in self.sources.values():
+            for metric in published_metrics(source):
+                publishers[metric['prometheus_name']] = publishers.get(metric['prometheus_name'], 0) + 1
+        self.metrics_manager.share(name for name, count in publishers.items() if count > 1)
+
+    def _enabled_sources(self, config: dict) -> Dict[str, dict]:
+        """
+        配置中启用的（分片模式下还需分配给本副本的）数据源: {source_name: source}
+        aggregations 配置不合法的数据源记录错误后不启用
+        """
+        sources = {}
+        for source in config.get('data_sources', []):
             if not source.get('enabled', True):
                 continue
+            try:
+                MappingPlan.validate(source)
+            except (ValueError, KeyError) as e:
+                self.logger.error(f"[{source['name']}] Invalid configuration, source disabled: {e}")
+                continue
+            sources[source['name']] = source
+        if self.sharding is not None:
+            owned, members = self.sharding.assign(sources)
+            self.shard_members = len(members)
+            sources = {name: source for name, source in sources.items() if name in owned}
+        return sources
+
+    def _run_shard_loop(self):
+        """
+        动态成员模式下定期重新分配数据源（在独立线程中）
+        副本增减时只有归属变化的数据源会在本副本上启动或停止
+        """
+        interval = (self.config.get('exporter', {}).get('sharding') or {}).get('refresh_seconds', 10)
+
+        while True:
+            time.sleep(interval)
+            with self.reload_lock:
+                try:
+                    new_sources = self._enabled_sources(self.config)
+                except Exception as e:
+                    self.logger.warning(f"Failed to refresh shard membership, keeping current assignment: {e}")
+                    continue
+                self.shard_member_count.set(self.shard_members)
+                if set(new_sources) == set(self.sources):
+                    continue
+
+                added, removed, _ = self._apply_sources(new_sources, self._build_metric_specs(new_sources))
+                self.logger.info(
+                    f"Shard rebalanced ({self.shard_members} replicas): "
+                    f"took {len(added)} source(s), released {len(removed)} source(s)"
+                )
+
+    def _build_metric_specs(self, sources: Dict[str, dict]) -> Dict[str, dict]:
+        """
+        计算每个指标的注册参数，用于注册和热加载时对比定义是否变化
 
-            for metric_config in source.get('metrics', []):
+        Returns:
+            dict: {metric_name: register_gauge() 的参数}
+        """
+        specs = {}
+        for source in sources.values():
+            for metric_config in published_metrics(source):
                 name = metric_config['prometheus_name']
-                labels = metric_config.get('labels', [])
-                description = metric_config.get('description', f"Metric from {source['name']}")
+                # TTL 优先级: 指标级 ttl > 数据源级 ttl > exporter.metrics_ttl_seconds
+                ttl = metric_config.get('ttl', source.get('ttl'))
+                specs.setdefault(name, {
+                    'description': metric_config.get('description', f"Metric from {source['name']}"),
+                    'labels': list(metric_config.get('labels', [])),
+                    'backend': source.get('metrics_backend'),
+                    'ttl_seconds': self._parse_interval(ttl) if ttl is not None else None,
+                    'max_series': metric_config.get(
+                        'max_series', self.config.get('exporter', {}).get('max_series_per_metric')
+                    ),
+                    'overflow': metric_config.get('overflow', source.get('overflow', 'drop')),
+                })
+        return specs
+
+    def _register_metric(self, name: str, spec: dict):
+        """按注册参数注册指标"""
+        self.metrics_manager.register_gauge(
+            name, spec['description'], spec['labels'],
+            backend=spec['backend'],
+            ttl_seconds=spec['ttl_seconds'],
+            max_series=spec['max_series'],
+            overflow=spec['overflow']
+        )
+        self.metric_specs[name] = spec
+
+    def reload_config(self):
+        """
+        重新加载配置文件，按数据源对比差异:
+        - 新增的数据源: 注册指标并开始调度
+        - 删除的数据源: 停止调度，关闭采集器
+        - 配置变化的数据源: 重建采集器和映射计划并重新调度
+        - 未变化的数据源: 采集器、连接和已发布的序列保持不变
+        指标定义（标签、存储后端、TTL 等）变化时才重建该指标，其余指标的序列保留
+        """
+        with self.reload_lock:
+            try:
+                # 先记录修改时间，配置有误时不会被反复重试
+                self.config_mtime = os.path.getmtime(self.config_path)
+                with open(self.config_path, 'r', encoding='utf-8') as f:
+                    new_config = yaml.safe_load(f)
+                new_sources = self._enabled_sources(new_config)
+                new_specs = self._build_metric_specs(new_sources)
+            except Exception as e:
+                self.logger.error(f"Failed to reload configuration, keeping current one: {e}")
+                return
+
+            if new_config.get('exporter') != self.config.get('exporter'):
+                self.logger.warning("Changes to the 'exporter' section take effect after restart")
 
-                self.metrics_manager.register_gauge(name, description, labels)
+            self.config['data_sources'] = new_config.get('data_sources', [])
+            added, removed, changed = self._apply_sources(new_sources, new_specs)
+            self.logger.info(
+                f"Reloaded configuration: {len(added)} added, {len(removed)} removed, "
+                f"{len(changed)} changed, {len(new_sources) - len(added) - len(changed)} unchanged"
+            )
+
+    def _apply_sources(self, new_sources: Dict[str, dict], new_specs: Dict[str, dict]) -> tuple:
+        """
+        切换到新的数据源集合（调用方需持有 self.reload_lock）
+
+        Args:
+            new_sources: {source_name: source}
+            new_specs: 新数据源对应的指标注册参数
+
+        Returns:
+            tuple: (新增, 删除, 变化) 的数据源名称列表
+        """
+        old_sources = self.sources
+        removed = [name for name in old_sources if name not in new_sources]
+        added = [name for name in new_sources if name not in old_sources]
+        changed = [
+            name for name in new_sources
+            if name in old_sources and new_sources[name] != old_sources[name]
+        ]
+
+        # 停止删除和变化的数据源
+        for name in removed + changed:
+            if self.scheduler is not None:
+                self.scheduler.remove_source(name)
+            self._discard_collector(name)
+            self.plans.pop(name, None)
+            self.source_stats.pop(name, None)
+            self.source_health.pop(name, None)
+
+        # 指标: 删除不再使用的，重建定义变化的，注册新增的
+        for name, spec in list(self.metric_specs.items()):
+            if new_specs.get(name) != spec:
+                self.metrics_manager.unregister_gauge(name)
+                del self.metric_specs[name]
+        self.sources = new_sources
+        for name, spec in new_specs.items():
+            if name not in self.metric_specs:
+                self._register_metric(name, spec)
+        self._share_metrics()
+
+        self.shared_fetches.prune({
+            SharedFetchCoordinator.fetch_key(source)
+            for source in new_sources.values() if source.get('shared_fetch')
+        })
+
+        # 启动新增和变化的数据源
+        for name in added + changed:
+            if self.scheduler is not None:
+                self.scheduler.add_source(
+                    new_sources[name], self._parse_interval(new_sources[name].get('interval', '60s'))
+                )
+
+        self.shard_sources.set(len(new_sources))
+        self.exposition.invalidate()
+        return added, removed, changed
+
+    def _run_config_watch_loop(self):
+        """
+        配置热加载循环（在独立线程中）
+        收到 SIGHUP 或配置文件修改时间变化时重新加载
+        """
+        watch_interval = self.config.get('exporter', {}).get('config_watch_interval_seconds', 10)
+
+        while True:
+            if self.reload_requested.wait(timeout=watch_interval or None):
+                self.reload_requested.clear()
+                self.logger.info("Reload requested")
+                self.reload_config()
+                continue
+
+            try:
+                if os.path.getmtime(self.config_path) != self.config_mtime:
+                    self.logger.info(f"Detected change in {self.config_path}")
+                    self.reload_config()
+            except OSError as e:
+                self.logger.warning(f"Failed to stat {self.config_path}: {e}")
+
+    def _discard_collector(self, source_name: str):
+        """
+        移除并关闭数据源的采集器
+        仍有周期在使用该采集器时只标记为已退役，由周期结束时关闭，且该周期的结果不再发布
+        """
+        with self.collectors_lock:
+            collector = self.collectors.pop(source_name, None)
+            if collector is None:
+                return
+            if self.collector_cycles.get(collector):
+                self.retired_collectors.add(collector)
+                return
+        self._close_collector(collector)
+
+    def _release_collector(self, collector: BaseCollector):
+        """周期结束: 释放采集器，已退役且没有其他周期在使用时关闭"""
+        with self.collectors_lock:
+            remaining = self.collector_cycles.pop(collector, 1) - 1
+            if remaining:
+                self.collector_cycles[collector] = remaining
+                return
+            if collector not in self.retired_collectors:
+                return
+            self.retired_collectors.discard(collector)
+        self._close_collector(collector)
+
+    def _close_collector(self, collector: BaseCollector):
+        try:
+            collector.close()
+        except Exception as e:
+            self.logger.warning(f"[{collector.name}] Failed to close collector: {e}")
+
+    def _get_collector(self, source: dict, acquire: bool = False) -> BaseCollector:
+        """
+        获取数据源对应的采集器，首次使用时创建
+        创建失败不会缓存，下个周期重试
+
+        Args:
+            source: 数据源配置
+            acquire: 标记为本周期使用中（与查找在同一把锁内），周期结束时调用 _release_collector()
 
-    def _update_metrics(self, source: dict, clear_before_update: bool = True):
+        Returns:
+            BaseCollector: 该数据源的长期采集器
+        """
+        source_name = source['name']
+        with self.collectors_lock:
+            collector = self.collectors.get(source_name)
+            if collector is not None and acquire:
+                self.collector_cycles[collector] = self.collector_cycles.get(collector, 0) + 1
+        if collector is not None:
+            return collector
+
+        shared_fetch = source.get('shared_fetch')
+        if shared_fetch:
+            window = shared_fetch.get('window') if isinstance(shared_fetch, dict) else None
+            collector = SharedFetchCollector(
+                source, self.shared_fetches, self._parse_interval(window or source.get('interval', '60s'))
+            )
+        else:
+            collector = CollectorFactory.create(source)
+        if collector.incremental:
+            watermark = self.watermarks.get(source_name)
+            if watermark is not None:
+                collector.watermark = watermark
+        with self.collectors_lock:
+            # 并发创建时保留先注册的实例
+            existing = self.collectors.setdefault(source_name, collector)
+            if acquire:
+                self.collector_cycles[existing] = self.collector_cycles.get(existing, 0) + 1
+        if existing is not collector:
+            collector.close()
+        return existing
+
+    def close(self):
+        """关闭所有采集器、连接池和 HTTP Session"""
+        with self.collectors_lock:
+            collectors = list(self.collectors.values()) + list(self.retired_collectors)
+            self.collectors.clear()
+            self.retired_collectors.clear()
+        for collector in collectors:
+            try:
+                collector.close()
+            except Exception as e:
+                self.logger.warning(f"[{collector.name}] Failed to close collector: {e}")
+        self.shared_fetches.close()
+        if self.sharding is not None:
+            self.sharding.close()
+        ConnectionPool.close_all_pools()
+        RestApiCollector.close_all_sessions()
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _update_metrics(self, source: dict, clear_before_update: bool = True) -> str:
         """
         更新指定数据源的指标
 
         Args:
             source: 数据源配置
             clear_before_update: 是否在更新前清空旧数据
+
+        Returns:
+            str: CYCLE_SUCCESS / CYCLE_UNCHANGED / CYCLE_EMPTY / CYCLE_FAILED，调度器据此计算下一次的周期
         """
         source_name = source['name']
         start_time = time.time()
+        collector = None
+        deadline = None
 
-        try:
-            # 创建采集器并获取数据
-            collector = CollectorFactory.create(source)
-            data = collector.collect()
+        health = self._source_health(source)
+        health.begin_attempt()
+        self.breaker_state.labels(source=source_name).set(health.state)
 
-            if not data:
+        try:
+            # 获取（复用）采集器，分批流式处理数据
+            # deadline 约束连接、查询、读取和映射，到期时取消进行中的工作，部分结果不发布
+            collector = self._get_collector(source, acquire=True)
+            deadline = self.deadlines.watch(collector, self._source_deadline(source))
+
+            # 没有已发布的序列（首次采集或已全部过期）时做一次完整采集:
+            # 即使数据未变化也重新发布，增量模式从初始水位开始
+            metric_names = [m['prometheus_name'] for m in published_metrics(source)]
+            if not self.metrics_manager.series_count(metric_names):
+                collector.committed_version = None
+                if collector.incremental:
+                    collector.watermark = collector.incremental.get('initial', '1970-01-01 00:00:00')
+
+            # 在锁外构建本周期的完整结果: {metric_name: {label_values: value}}
+            # 内存占用取决于时间序列数量和批大小，与结果集行数无关
+            plan = self._get_plan(source)
+            series_by_metric = plan.new_series()
+
+            # collect 为采集总耗时，结束后扣除其中的 connect / decode / map 得到 fetch
+            with collector.phase('collect'):
+                if source.get('parse_in_process'):
+                    row_count = self._parse_in_process(source, collector, series_by_metric)
+                else:
+                    row_count = 0
+                    for batch in self._iter_batches(collector):
+                        row_count += len(batch)
+                        with collector.phase('map'):
+                            plan.apply_batch(batch, series_by_metric)
+                        collector.check_deadline()
+                    with collector.phase('map'):
+                        plan.finalize(series_by_metric)
+            collector.check_deadline()
+            self.source_rows.labels(source=source_name).inc(row_count)
+
+            for field, count in plan.pop_invalid_counts().items():
+                self.invalid_values.labels(source=source_name, field=field).inc(count)
+                self.logger.warning(f"[{source_name}] {count} invalid value(s) for {field}")
+
+            if collector.incremental:
+                if not row_count:
+                    raise SourceUnchanged(f"{source_name} has no rows at or past the watermark")
+                # >= 查询每个周期都会重新读到水位上的边界行: 只有这些行且合并后数值不变时同样视为未变化
+                if collector.pending_watermark == collector.watermark and self.metrics_manager.matches(series_by_metric):
+                    raise SourceUnchanged(f"{source_name} only returned unchanged rows at the watermark")
+                # 增量模式: 未变化的行不会被查询到，先刷新已有序列的 TTL，再合并变化的行
+                self.metrics_manager.touch(metric_names, owner=source_name)
+                clear_before_update = False
+
+            if not row_count:
                 self.logger.warning(f"[{source_name}] No data returned, keeping previous values")
-                return
+                return CYCLE_EMPTY
 
-            # 清空旧数据（可选）
-            if clear_before_update:
-                for metric_config in source.get('metrics', []):
-                    self.metrics_manager.clear_metric(metric_config['prometheus_name'])
-
-            # 更新指标值
-            updated_count = 0
-            for item in data:
-                for metric_config in source.get('metrics', []):
-                    metric_name = metric_config['prometheus_name']
-                    source_field = metric_config['source_field']
-                    label_names = metric_config.get('labels', [])
-
-                    # 提取标签值
-                    labels = {
-                        label: str(item.get(label, 'unknown'))
-                        for label in label_names
-                    }
-
-                    # 提取指标值
-                    value = item.get(source_field)
-                    if value is not None:
-                        try:
-                            value = float(value)
-                            self.metrics_manager.set_value(metric_name, labels, value)
-                            updated_count += 1
-                        except (ValueError, TypeError) as e:
-                            self.logger.warning(
-                                f"[{source_name}] Invalid value for {source_field}: {value}"
-                            )
+            # 基数限制: 指标级 max_series + 数据源级 max_series
+            publish_start = time.perf_counter()
+            overflowed = self.metrics_manager.limit_cardinality(
+                series_by_metric, replace=clear_before_update,
+                max_series=source.get('max_series'), overflow=source.get('overflow', 'drop')
+            )
+            for metric_name, count in overflowed.items():
+                self.series_overflow.labels(source=source_name, metric=metric_name).inc(count)
+                self.logger.warning(
+                    f"[{source_name}] {metric_name} exceeded its series limit, {count} series overflowed"
+                )
+
+            # 一次性发布（clear_before_update 时整体替换旧数据，否则合并）
+            # 与 _discard_collector() 在同一把锁内检查: 重新加载已删除或替换该数据源时丢弃本周期的结果
+            with self.collectors_lock:
+                if collector in self.retired_collectors:
+                    self.logger.info(f"[{source_name}] Source was reloaded during the cycle, discarded results")
+                    return CYCLE_EMPTY
+                updated_count = self.metrics_manager.publish(
+                    series_by_metric, replace=clear_before_update, owner=source_name
+                )
+            collector.record_phase('publish', time.perf_counter() - publish_start)
+            collector.commit()
+            if collector.incremental:
+                self.watermarks.save(source_name, collector.watermark)
 
             # 更新监控指标
             duration = time.time() - start_time
@@ -629,32 +4916,281 @@ class UniversalExporter:
             self.last_scrape_time.labels(source=source_name).set(time.time())
 
             self.logger.info(
-                f"[{source_name}] Updated {updated_count} metrics in {duration:.2f}s"
+                f"[{source_name}] Updated {updated_count} metrics from {row_count} rows in {duration:.2f}s"
+            )
+            return CYCLE_SUCCESS
+
+        except SourceUnchanged:
+            # 数据未变化: 只刷新已发布序列的 TTL，跳过解析、映射和发布
+            touched = self.metrics_manager.touch(metric_names, owner=source_name)
+            duration = time.time() - start_time
+            self.unchanged_cycles.labels(source=source_name).inc()
+            self.scrape_success.labels(source=source_name).inc()
+            self.scrape_duration.labels(source=source_name).set(duration)
+            self.last_scrape_time.labels(source=source_name).set(time.time())
+            self.logger.info(
+                f"[{source_name}] Source unchanged, refreshed {touched} metrics in {duration:.2f}s"
             )
+            return CYCLE_UNCHANGED
 
         except Exception as e:
             self.scrape_errors.labels(source=source_name).inc()
-            self.logger.error(f"[{source_name}] Scrape failed: {e}")
+            # 截止时间到达后的失败（如等待连接、读取响应的超时被剩余时间截断）同样计为超过截止时间
+            if isinstance(e, DeadlineExceeded) or (collector is not None and collector.deadline_reached()):
+                self.deadline_exceeded.labels(source=source_name).inc()
+                self.logger.error(f"[{source_name}] Deadline exceeded, discarded partial results: {e}")
+            else:
+                self.logger.error(f"[{source_name}] Scrape failed: {e}")
+            return CYCLE_FAILED
+
+        finally:
+            self.deadlines.done(deadline)
+            if collector is not None:
+                self._observe_phases(source_name, collector)
+                self._release_collector(collector)
+            # 数据或自身监控指标已变化，重新渲染 /metrics
+            self.exposition.invalidate()
+
+    def _start_debug_server(self):
+        """
+        启动调试端点（配置了 exporter.debug.port 时），默认只监听本机:
+        - /debug/memory:  tracemalloc 快照和差异
+        - /debug/series:  每个指标的序列数和估算内存
+        - /debug/sources: 每个数据源最近一次采集的读取字节数和分阶段耗时
+        - /debug/profile: 限时采样采集线程的调用栈（折叠格式，用于生成火焰图）
+        """
+        debug_config = self.config.get('exporter', {}).get('debug') or {}
+        port = debug_config.get('port')
+        if not port:
+            return
+
+        def series(request):
+            usage = self.metrics_manager.memory_usage()
+            return json_response({
+                'total_series': sum(m['series'] for m in usage.values()),
+                'total_estimated_bytes': sum(m['estimated_bytes'] for m in usage.values()),
+                'interned_label_values': len(LABEL_INTERNER),
+                'metrics': usage,
+            })
+
+        addr = debug_config.get('addr', '127.0.0.1')
+        self.debug_server = ExporterHTTPServer(port, addr)
+        self.debug_server.add_route('/debug/memory', serve_debug_memory(debug_config.get('tracemalloc_frames', 1)))
+        self.debug_server.add_route('/debug/series', series)
+        self.debug_server.add_route('/debug/sources', lambda request: json_response(self.source_stats))
+        self.debug_server.add_route('/debug/profile', serve_debug_profile(
+            ['collector', 'pages-'], max_seconds=debug_config.get('max_profile_seconds', 60)
+        ))
+        self.debug_server.start()
+        self.logger.info(f"Debug endpoints started on http://{addr}:{port}/debug/")
+
+    def _source_health(self, source: dict) -> SourceHealth:
+        """
+        获取（创建）数据源的调度状态
+        退避和熔断参数取 exporter.scheduler.retry，可被数据源的 retry 覆盖；
+        自适应间隔由数据源的 adaptive_interval 开启
+        """
+        source_name = source['name']
+        health = self.source_health.get(source_name)
+        if health is None:
+            retry = dict(self.config.get('exporter', {}).get('scheduler', {}).get('retry') or {})
+            retry.update(source.get('retry') or {})
+            adaptive = source.get('adaptive_interval') or {}
+            ttls = [self.metrics_manager.get_ttl(m['prometheus_name']) for m in published_metrics(source)]
+            health = SourceHealth(
+                multiplier=retry.get('multiplier', 2.0),
+                max_backoff=self._parse_interval(retry.get('max_backoff', '10m')),
+                jitter=retry.get('jitter', 0.2),
+                failure_threshold=retry.get('failure_threshold', 5),
+                cooldown=self._parse_interval(retry.get('cooldown', '5m')),
+                unchanged_cycles=adaptive.get('unchanged_cycles'),
+                max_interval=self._parse_interval(adaptive['max_interval']) if adaptive.get('max_interval') else None,
+                ttl=min(ttls, default=None),
+            )
+            self.source_health[source_name] = health
+        return health
+
+    def _check_ready(self) -> dict:
+        """计算就绪状态，首次就绪时记录启动耗时"""
+        was_ready = self.readiness.ready_at is not None
+        status = self.readiness.status(self.sources)
+        if status['ready'] and not was_ready:
+            self.ready.set(1)
+            self.startup_seconds.set(status['startup_seconds'])
+            self.logger.info(
+                f"Ready after {status['startup_seconds']:.2f}s "
+                f"({status['collected']}/{status['total']} sources collected, {status['required']} required)"
+            )
+        return status
+
+    def _serve_ready(self, request) -> tuple:
+        """/ready: 就绪时返回 200，否则返回 503 和尚未完成首次采集的数据源"""
+        status = self._check_ready()
+        return json_response(status, 200 if status['ready'] else 503)
 
-    def _run_source_loop(self, source: dict):
+    def initialize_sources(self, sources: Iterable[dict]):
         """
-        运行单个数据源的采集循环（在独立线程中）
+        并行初始化数据源: 导入驱动模块、创建客户端、编译映射计划
+        首次采集不再承担导入和建客户端的耗时；初始化失败的数据源在首次采集时重试
+
+        线程数由 exporter.startup.workers 限制，最多等待 exporter.startup.timeout，
+        未完成的初始化在后台继续，不阻塞调度器启动
 
         Args:
-            source: 数据源配置
+            sources: 数据源配置
         """
+        startup_config = self.config.get('exporter', {}).get('startup') or {}
+        workers = startup_config.get('workers', 8)
+        timeout = self._parse_interval(startup_config.get('timeout', '60s'))
+        sources = list(sources)
+        if not sources:
+            return
+
+        def initialize(source: dict):
+            collector_class = CollectorFactory.COLLECTORS.get(source.get('type'))
+            if collector_class is not None:
+                for module_name in collector_class.driver_modules(source):
+                    import_driver(module_name)
+            start = time.perf_counter()
+            self._get_collector(source)
+            if source.get('shared_fetch'):
+                # SharedFetchCollector 只是取回共享结果，实际的客户端在协调器的共享采集器中
+                self.shared_fetches.prepare(source)
+            self.startup_client_seconds.labels(source=source['name']).set(time.perf_counter() - start)
+            self._get_plan(source)
+
+        start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='startup')
+        futures = {executor.submit(initialize, source): source['name'] for source in sources}
+        done, not_done = wait(futures, timeout=timeout)
+        executor.shutdown(wait=False)
+
+        for future in done:
+            if future.exception() is not None:
+                self.logger.warning(f"[{futures[future]}] Initialization failed: {future.exception()}")
+        for module_name, seconds in list(DRIVER_IMPORT_SECONDS.items()):
+            self.startup_import_seconds.labels(module=module_name).set(seconds)
+
+        self.logger.info(
+            f"Initialized {len(done)} source(s) in {time.perf_counter() - start:.2f}s "
+            f"({workers} workers, {len(not_done)} still initializing)"
+        )
+
+    def _source_deadline(self, source: dict) -> Optional[float]:
+        """数据源的 deadline（秒），未配置时取 exporter.scheduler.deadline，均未配置时不限制"""
+        deadline = source.get('deadline', self.config.get('exporter', {}).get('scheduler', {}).get('deadline'))
+        return self._parse_interval(deadline) if deadline else None
+
+    def _next_period(self, source: dict, result: Any, interval: float) -> float:
+        """调度器回调: 根据采集结果更新退避/熔断状态，返回到下一次采集的周期"""
         source_name = source['name']
-        interval = self._parse_interval(source.get('interval', '60s'))
+        # 只有发布了数据或确认数据未变化才算完成首次采集；没有返回数据（如查询条件有误）不计入
+        if result in (CYCLE_SUCCESS, CYCLE_UNCHANGED) and source_name not in self.readiness.collected:
+            self.readiness.mark(source_name)
+            self._check_ready()
+
+        health = self._source_health(source)
+        was_open = health.state == SourceHealth.OPEN
+        period = health.next_period(result, interval)
+
+        if health.state == SourceHealth.OPEN and not was_open:
+            self.breaker_opened.labels(source=source_name).inc()
+            self.logger.warning(
+                f"[{source_name}] Circuit breaker opened after {health.failures} consecutive failure(s), "
+                f"retrying in {period:.0f}s"
+            )
+        elif result == CYCLE_FAILED:
+            self.logger.info(f"[{source_name}] Backing off for {period:.0f}s")
+
+        self.breaker_state.labels(source=source_name).set(health.state)
+        self.consecutive_failures.labels(source=source_name).set(health.failures)
+        self.source_interval.labels(source=source_name).set(period)
+        return period
+
+    def _observe_phases(self, source_name: str, collector: BaseCollector):
+        """记录本周期的分阶段耗时和读取字节数（失败和未变化的周期同样记录已执行的阶段）"""
+        phases, bytes_read = collector.pop_instrumentation()
+        if bytes_read:
+            self.source_bytes.labels(source=source_name).inc(bytes_read)
+
+        collect = phases.pop('collect', None)
+        if collect is not None:
+            # 分页并发解析时 decode 为多个线程的累计耗时，可能超过总耗时
+            nested = sum(phases.get(p, 0.0) for p in ('connect', 'decode', 'map'))
+            phases['fetch'] = max(collect - nested, 0.0)
+        for phase, seconds in phases.items():
+            self.phase_duration.labels(source=source_name, phase=phase).observe(seconds)
+
+        self.source_stats[source_name] = {
+            'timestamp': time.time(),
+            'bytes_read': bytes_read,
+            'phase_seconds': phases,
+        }
 
-        self.logger.info(f"[{source_name}] Starting collector loop (interval: {interval}s)")
+    def _get_plan(self, source: dict) -> MappingPlan:
+        """获取数据源的映射计划，首次使用时编译"""
+        plan = self.plans.get(source['name'])
+        if plan is None:
+            plan = self.plans[source['name']] = MappingPlan(source)
+        return plan
 
-        # 立即执行一次
-        self._update_metrics(source)
+    def _parse_in_process(self, source: dict, collector: BaseCollector,
+                          series_by_metric: Dict[str, Dict[tuple, float]]) -> int:
+        """
+        在子进程中解析和映射数据，避免大文件的 JSON/CSV 解析占用 GIL 阻塞其他数据源
 
-        # 循环采集
-        while True:
-            time.sleep(interval)
-            self._update_metrics(source)
+        Args:
+            source: 数据源配置
+            collector: 采集器（需支持 fetch_payload()）
+            series_by_metric: 输出 {metric_name: {label_values: value}}
+
+        Returns:
+            int: 行数
+        """
+        payload, file_format = collector.fetch_payload()
+        plan_config = {
+            key: source[key] for key in ('name', 'metrics', 'aggregations', 'publish_raw') if key in source
+        }
+
+        future = self._get_process_pool().submit(
+            parse_payload_in_process, plan_config, payload, file_format
+        )
+        del payload
+        # 子进程中的解析和映射计为 decode，合并结果计为 map
+        # 截止时间到达时不再等待（已开始执行的子进程任务无法中断，结果直接丢弃）
+        with collector.phase('decode'):
+            try:
+                row_count, encoded, invalid_counts = future.result(timeout=collector.remaining())
+            except FutureTimeoutError:
+                future.cancel()
+                raise DeadlineExceeded(f"{source['name']} exceeded its deadline while parsing")
+
+        with collector.phase('map'):
+            for metric_name, buffers in encoded.items():
+                series_by_metric[metric_name].update(decode_series(buffers))
+
+        plan = self._get_plan(source)
+        for field, count in invalid_counts.items():
+            plan.invalid_counts[field] = plan.invalid_counts.get(field, 0) + count
+        return row_count
+
+    def _get_process_pool(self):
+        """获取解析进程池，首次使用时创建（spawn 模式，避免在多线程进程中 fork）"""
+        with self.process_pool_lock:
+            if self.process_pool is None:
+                import multiprocessing
+                workers = self.config.get('exporter', {}).get('parse_processes') or os.cpu_count()
+                self.process_pool = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+                )
+                self.logger.info(f"Started parse process pool ({workers} workers)")
+            return self.process_pool
+
+    def _iter_batches(self, collector: BaseCollector) -> Iterator[List[Dict[str, Any]]]:
+        """分批读取采集器数据，原生异步采集器通过调度器的事件循环执行"""
+        if hasattr(collector, 'aiter_batches') and self.scheduler is not None:
+            return self.scheduler.iterate(collector.aiter_batches(), collector)
+        return collector.iter_batches()
 
     def _run_cleanup_loop(self):
         """
@@ -666,7 +5202,62 @@ class UniversalExporter:
 
         while True:
             time.sleep(cleanup_interval)
-            self.metrics_manager.cleanup_expired()
+            if self.metrics_manager.cleanup_expired():
+                self.exposition.invalidate()
+
+    def restore_series(self) -> int:
+        """
+        从磁盘快照恢复已发布的序列（按原始写入时间计算 TTL，已过期的不恢复）
+        快照损坏或格式不兼容时忽略，等待采集器重新采集
+
+        Returns:
+            int: 恢复的时间序列数量
+        """
+        if not self.snapshot_interval or not os.path.exists(self.series_snapshot.path):
+            return 0
+
+        restored = 0
+        try:
+            # 水位以快照中的为准: 水位文件每个周期都会更新，可能比快照中的序列更新
+            # 快照中没有水位的数据源从初始水位重新读取（结果按标签合并，重复读取无害）
+            self.watermarks.replace(self.series_snapshot.read_header().get('watermarks') or {})
+            for metric_name, labelnames, rows in self.series_snapshot.read():
+                restored += self.metrics_manager.restore(metric_name, labelnames, rows)
+        except Exception as e:
+            self.logger.warning(f"Failed to restore series snapshot {self.series_snapshot.path}: {e}")
+
+        self.logger.info(f"Restored {restored} series from {self.series_snapshot.path}")
+        return restored
+
+    def save_series(self):
+        """将当前已发布的序列写入磁盘快照"""
+        try:
+            start = time.time()
+            # 先读取水位再导出序列: 发布先于水位保存，导出的序列不会比水位旧
+            watermarks = self.watermarks.snapshot()
+            count = self.series_snapshot.write(self.metrics_manager.export_series(), watermarks)
+            self.logger.debug(f"Saved {count} series to {self.series_snapshot.path} in {time.time() - start:.2f}s")
+        except Exception as e:
+            self.logger.error(f"Failed to save series snapshot: {e}")
+
+    def _run_snapshot_loop(self):
+        """定期写入序列快照（在独立线程中）"""
+        while True:
+            time.sleep(self.snapshot_interval)
+            self.save_series()
+
+    def _first_delay(self, source: dict, interval: float) -> Optional[float]:
+        """
+        计算数据源的首次采集延迟
+        从快照恢复的数据仍在采集周期内时，沿用原来的节奏在 上次更新 + interval 时采集，
+        避免重启后所有数据源立即重新查询
+        """
+        metric_names = [m['prometheus_name'] for m in published_metrics(source)]
+        last_update = self.metrics_manager.last_update(metric_names)
+        if last_update is None:
+            return None
+        delay = last_update + interval - time.time()
+        return delay if delay > 0 else None
 
     def _parse_interval(self, interval_str: str) -> int:
         """
@@ -697,31 +5288,51 @@ class UniversalExporter:
         启动 Exporter 服务
 
         流程:
-        1. 启动 HTTP Server 暴露 /metrics 端点
-        2. 为每个数据源启动独立的采集线程
-        3. 启动过期数据清理线程
+        1. 从磁盘快照恢复序列，启动 HTTP Server 暴露 /metrics 和 /ready 端点
+        2. 并行初始化数据源后启动调度器，按固定频率调度每个数据源
+        3. 启动过期数据清理、序列快照和配置热加载线程
         4. 主线程保持运行
         """
         port = self.config.get('exporter', {}).get('port', 8000)
 
-        # 启动 Prometheus HTTP Server
-        start_http_server(port)
+        # 先恢复上次退出前的序列，采集器在后台预热期间即可提供数据
+        self.restore_series()
+
+        # 启动 HTTP Server，/metrics 从预渲染缓存返回
+        self.exposition.render()
+        threading.Thread(target=self.exposition.run, daemon=True, name="exposition").start()
+
+        self.http_server = ExporterHTTPServer(port)
+        self.http_server.add_route('/metrics', serve_exposition(self.exposition))
+        self.http_server.add_route('/ready', self._serve_ready)
+        self.http_server.start()
         self.logger.info(f"Exporter started on http://0.0.0.0:{port}/metrics")
+        self._start_debug_server()
+
+        # 导入驱动、创建客户端，/ready 在数据源完成首次采集前返回 503
+        self.initialize_sources(self.sources.values())
+
+        # 启动调度器并注册每个启用的数据源
+        scheduler_config = self.config.get('exporter', {}).get('scheduler', {})
+        self.scheduler = SourceScheduler(
+            self._update_metrics,
+            max_concurrency=scheduler_config.get('max_concurrency', 16),
+            backend_concurrency=scheduler_config.get('backend_concurrency'),
+            startup_spread_seconds=self._parse_interval(scheduler_config.get('startup_spread', '10s')),
+            on_lag=lambda name, lag: self.scheduler_lag.labels(source=name).observe(lag),
+            next_period=self._next_period,
+        )
+        self.scheduler.start()
 
-        # 为每个启用的数据源启动采集线程
         for source in self.config.get('data_sources', []):
             if not source.get('enabled', True):
                 self.logger.info(f"[{source['name']}] Skipped (disabled)")
-                continue
+            elif source['name'] not in self.sources:
+                self.logger.info(f"[{source['name']}] Skipped (assigned to another shard)")
 
-            thread = threading.Thread(
-                target=self._run_source_loop,
-                args=(source,),
-                daemon=True,
-                name=f"collector-{source['name']}"
-            )
-            thread.start()
-            self.logger.info(f"[{source['name']}] Collector thread started")
+        for source in self.sources.values():
+            interval = self._parse_interval(source.get('interval', '60s'))
+            self.scheduler.add_source(source, interval, first_delay=self._first_delay(source, interval))
 
         # 启动清理线程
         cleanup_thread = threading.Thread(
@@ -731,14 +5342,36 @@ class UniversalExporter:
         )
         cleanup_thread.start()
 
+        # 定期写入序列快照
+        if self.snapshot_interval:
+            threading.Thread(target=self._run_snapshot_loop, daemon=True, name="snapshot").start()
+
+        # 配置热加载: SIGHUP 或配置文件变化
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.reload_requested.set())
+        # SIGTERM（Kubernetes 停止 Pod）与 Ctrl+C 走同一个退出流程，退出前写入序列快照
+        stop_requested = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.set())
+        threading.Thread(target=self._run_config_watch_loop, daemon=True, name="config-watch").start()
+
+        # 动态分片: 副本增减时重新分配数据源
+        if self.sharding is not None and self.sharding.dynamic:
+            threading.Thread(target=self._run_shard_loop, daemon=True, name="sharding").start()
+
         # 主线程保持运行
         self.logger.info("Exporter is running. Press Ctrl+C to stop.")
         try:
-            while True:
-                time.sleep(60)
+            while not stop_requested.wait(60):
+                pass
         except KeyboardInterrupt:
-            self.logger.info("Shutting down...")
-            sys.exit(0)
+            pass
+
+        self.logger.info("Shutting down...")
+        self.scheduler.stop()
+        if self.snapshot_interval:
+            self.save_series()
+        self.close()
+        sys.exit(0)
 
 
 # ============================================================================
@@ -762,8 +5395,33 @@ def main():
         default=None,
         help='Override port from config file'
     )
+    parser.add_argument(
+        '--shard-index',
+        type=int,
+        default=None,
+        help='Index of this replica in sharded mode (use with --shard-count)'
+    )
+    parser.add_argument(
+        '--shard-count',
+        type=int,
+        default=None,
+        help='Number of replicas in sharded mode (use with --shard-index)'
+    )
+    parser.add_argument(
+        '--compare-memory',
+        type=int,
+        metavar='SERIES',
+        default=None,
+        help='Print per-series memory usage of each metrics backend and exit'
+    )
 
     args = parser.parse_args()
+    if (args.shard_index is None) != (args.shard_count is None):
+        parser.error('--shard-index and --shard-count must be used together')
+
+    if args.compare_memory:
+        print(json.dumps(compare_series_memory(args.compare_memory), indent=2))
+        return
 
     # 检查配置文件是否存在
     if not os.path.exists(args.config):
@@ -774,7 +5432,10 @@ def main():
         sys.exit(1)
 
     # 启动 Exporter
-    exporter = UniversalExporter(args.config)
+    sharding = None
+    if args.shard_count is not None:
+        sharding = {'shard_index': args.shard_index, 'shard_count': args.shard_count}
+    exporter = UniversalExporter(args.config, sharding=sharding)
 
     # 如果命令行指定了端口，覆盖配置
     if args.port:
@@ -797,7 +5458,47 @@ exporter:
   port: 8000                      # HTTP 服务端口
   log_level: INFO                 # 日志级别
   metrics_ttl_seconds: 300        # 指标数据过期时间（秒）
+  metrics_backend: gauge          # 存储后端: gauge 或 columnar（高基数指标推荐）
+  max_series_per_metric: 200000   # 每个指标的默认序列数上限（可在指标上用 max_series 覆盖）
   cleanup_interval_seconds: 60    # 过期数据清理间隔（秒）
+  exposition_min_interval_seconds: 1  # /metrics 两次重新渲染的最小间隔（秒）
+  exposition_max_age_seconds: 10      # 没有发布时 /metrics 缓存的最长保留时间（秒），进程和自身监控指标按此刷新
+  parse_processes: 4              # parse_in_process 数据源的解析进程数（默认 CPU 核数）
+  state_dir: .exporter_state      # 增量采集水位、序列快照等状态文件目录
+  snapshot_interval_seconds: 60   # 序列快照写入间隔，重启后从快照恢复未过期的序列（0 表示关闭）
+  config_watch_interval_seconds: 10  # 配置文件变化检查间隔（0 表示只响应 SIGHUP）
+  startup:
+    workers: 8                    # 启动时并行初始化数据源（导入驱动、创建客户端）的线程数
+    timeout: 60s                  # 最多等待初始化完成的时间，之后启动调度器
+  readiness:                      # /ready 就绪判定
+    quorum: 1.0                   # 完成首次采集的数据源比例（0 到 1，1 即全部）
+    # quorum_count: 3             # 或按个数判定，配置后代替 quorum
+    # timeout: 10m                # 超过该时间后无论采集结果如何都视为就绪
+  scheduler:
+    max_concurrency: 16           # 全局同时执行的采集数上限
+    backend_concurrency:          # 按数据源类型的并发上限
+      bigquery: 4
+      database: 8
+    startup_spread: 10s           # 首次采集分散到该窗口内，避免启动时同时触发
+    # deadline: 10m               # 单次采集的默认截止时间（数据源可用 deadline 覆盖），到期取消查询并丢弃部分结果
+    retry:                        # 失败退避和熔断（数据源可用 retry 覆盖）
+      multiplier: 2               # 连续第 n 次失败后等待 interval * multiplier^n
+      max_backoff: 10m            # 退避上限
+      jitter: 0.2                 # 随机抖动比例
+      failure_threshold: 5        # 连续失败该次数后熔断
+      cooldown: 5m                # 熔断后等待该时间再半开探测一次
+  # sharding:                     # 分片模式（默认关闭）: 多个副本按 rendezvous 哈希分担数据源
+  #   shard_index: 0              # 静态分片: 本副本编号（也可用 --shard-index / --shard-count 指定）
+  #   shard_count: 3
+  #   # membership_file: /etc/exporter/replicas.txt  # 或: 副本列表文件，每行一个副本 ID
+  #   # replica_id: exporter-0    #   本副本 ID（默认主机名）
+  #   # lock_dir: /var/run/exporter-shards  # 或: 同一主机上的副本通过锁文件确定成员
+  #   refresh_seconds: 10         # 动态成员模式下重新分配的间隔
+  # debug:                        # 调试端点（默认关闭），提供内存快照、序列内存估算和 CPU 采样
+  #   port: 8001
+  #   addr: 127.0.0.1             # 默认只监听本机
+  #   tracemalloc_frames: 1       # 内存分配记录的调用栈深度
+  #   max_profile_seconds: 60     # /debug/profile 单次采样的最长时间
 
 data_sources:
   # ============ REST API 示例 ============
@@ -809,6 +5510,13 @@ data_sources:
       type: bearer_token
       token_env: METRIC_PLATFORM_TOKEN    # 从环境变量读取 Token
     timeout: 30
+    pool_size: 10                          # 同一 host 共享的 keep-alive 连接数
+    max_series: 500000                     # 数据源所有指标合计的序列数上限
+    overflow: other                        # 超出上限: drop（丢弃新序列）/ other（折叠为 other）/ topk
+    pagination:                            # 分页（可选）: cursor / page / offset / link
+      type: offset
+      page_size: 500
+      parallelism: 4                       # offset 分页时并发请求的页数
     interval: 30s                          # 采集间隔
     metrics:
       - source_field: block_rate           # API 响应中的字段名
@@ -827,12 +5535,18 @@ data_sources:
     type: bigquery
     enabled: false                         # 设为 true 启用
     project: your-gcp-project-id
-    query: |
+    metrics_backend: columnar              # 覆盖全局存储后端
+    read_format: arrow                     # 以 Arrow RecordBatch 读取结果，不构建逐行字典
+    max_bytes_billed: 10737418240          # dry run 预估扫描量超过 10GB 时跳过查询
+    deadline: 3m                           # 超过 3 分钟取消 BigQuery 作业，本周期结果丢弃
+    shared_fetch: true                     # 获取配置相同的数据源共用一次查询
+    query: &daily_merchant_stats |
       SELECT
         account_id,
         merchant_name,
         block_rate,
         failed_auth_rate,
+        blocked_transactions,
         total_transactions
       FROM `your-project.dataset.daily_merchant_stats`
       WHERE date = CURRENT_DATE()
@@ -844,10 +5558,43 @@ data_sources:
         type: gauge
         labels: [account_id, merchant_name]
 
+  # 与上面相同的查询，只是映射和采集间隔不同: 复用 5 分钟内的共享结果，不重复扫描
+  - name: bigquery_daily_volume
+    type: bigquery
+    enabled: false
+    project: your-gcp-project-id
+    read_format: arrow
+    max_bytes_billed: 10737418240
+    shared_fetch:
+      window: 5m                           # 共享结果的新鲜度窗口（默认等于 interval）
+    query: *daily_merchant_stats
+    interval: 15m
+    # publish_raw: false                   # 同时配置了 metrics 时，只发布聚合结果，不发布逐账户的原始序列
+    aggregations:                          # 在 exporter 内按 group_by 聚合，替代 PromQL 的 sum by / 比值
+      - prometheus_name: sentinel_daily_transactions
+        description: "Daily transaction count per merchant"
+        function: sum                      # sum / avg / min / max / count / quantile / ratio
+                                           # overflow: other 只能用于 sum / count，其余函数用 drop 或 topk
+        source_field: total_transactions
+        group_by: [merchant_name]
+      - prometheus_name: sentinel_daily_block_rate_p95
+        description: "95th percentile of account block rate per merchant"
+        function: quantile
+        quantile: 0.95
+        source_field: block_rate
+        group_by: [merchant_name]
+      - prometheus_name: sentinel_daily_merchant_block_ratio
+        description: "Blocked / total transactions per merchant"
+        function: ratio                    # sum(numerator) / sum(denominator)，分母为 0 的分组不发布
+        numerator: blocked_transactions
+        denominator: total_transactions
+        group_by: [merchant_name]
+
   # ============ MySQL 示例 ============
   - name: mysql_merchant_config
     type: database
     enabled: false                         # 设为 true 启用
+    deadline: 60s                          # 超时后在服务端取消查询（MySQL KILL QUERY / PostgreSQL cancel）
     connection:
       driver: mysql                        # 或 postgresql
       host_env: MYSQL_HOST
@@ -855,13 +5602,20 @@ data_sources:
       database: risk_db
       username_env: MYSQL_USER
       password_env: MYSQL_PASSWORD
+      pool_size: 5                         # 连接池大小（相同 DSN 的数据源共享同一个池）
     query: |
       SELECT
         account_id,
         alert_threshold,
-        is_high_risk
+        is_high_risk,
+        updated_at
       FROM merchant_risk_config
-      WHERE updated_at > DATE_SUB(NOW(), INTERVAL 1 HOUR)
+      WHERE updated_at >= %(watermark)s
+    incremental:                           # 增量模式: 只查询变化的行并合并到已有序列
+                                           # 条件用 >=: 与上次水位同一时间戳、之后才写入的行不会遗漏（边界行重复合并，结果不变）
+      column: updated_at                   # 水位列（持久化到 state_dir，重启后继续）
+      initial: '1970-01-01 00:00:00'
+    batch_size: 10000                      # 每批读取的行数（服务端游标 + fetchmany）
     interval: 5m
     metrics:
       - source_field: alert_threshold
@@ -876,8 +5630,14 @@ data_sources:
     enabled: false                         # 设为 true 启用
     bucket: your-bucket-name
     path_pattern: "metrics/hourly/{date}/report.json"
-    format: json
+    format: json                           # json / ndjson / csv（ndjson 和 csv 流式读取）
+    parse_in_process: true                 # 在子进程中解析和映射（大文件不阻塞其他数据源）
+    change_detection: true                 # generation/md5 未变化时跳过下载和解析，只刷新 TTL
     interval: 1h
+    adaptive_interval:                     # 自适应间隔（可选）: 连续 3 个周期未变化时间隔翻倍，变化后恢复
+      unchanged_cycles: 3
+      max_interval: 4h                     # 实际上限不超过最小 TTL - interval，避免序列在两次采集之间过期
+    ttl: 6h                                # 数据源级 TTL，覆盖 metrics_ttl_seconds（指标也可单独配置 ttl）
     metrics:
       - source_field: hourly_block_rate
         prometheus_name: sentinel_hourly_block_rate
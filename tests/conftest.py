@@ -0,0 +1,37 @@
+"""测试共用的 fixture"""
+import os
+import sys
+
+import pytest
+import yaml
+from prometheus_client import REGISTRY
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from data_exporter import UniversalExporter  # noqa: E402
+
+
+@pytest.fixture
+def make_exporter(tmp_path):
+    """
+    按配置字典创建 UniversalExporter（不启动 HTTP 服务和调度器）
+    测试结束后关闭导出器，并从全局 REGISTRY 注销测试期间注册的指标，避免测试之间重名
+    """
+    registered = set(REGISTRY._collector_to_names)
+    exporters = []
+
+    def make(config: dict) -> UniversalExporter:
+        config.setdefault('exporter', {}).setdefault('state_dir', str(tmp_path / 'state'))
+        config_path = tmp_path / 'config.yaml'
+        config_path.write_text(yaml.safe_dump(config), encoding='utf-8')
+        exporter = UniversalExporter(str(config_path))
+        exporter._init_metrics()
+        exporters.append(exporter)
+        return exporter
+
+    yield make
+
+    for exporter in exporters:
+        exporter.close()
+    for collector in set(REGISTRY._collector_to_names) - registered:
+        REGISTRY.unregister(collector)
@@ -0,0 +1,75 @@
+"""BigQueryCollector 的 max_bytes_billed 预算检查（本地假客户端，不需要 google-cloud-bigquery）"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from data_exporter import BigQueryCollector, QueryBudgetExceeded  # noqa: E402
+
+
+class FakeJob:
+    def __init__(self, rows, total_bytes_processed=None):
+        self.rows = rows
+        self.total_bytes_processed = total_bytes_processed
+
+    def result(self, page_size=None, timeout=None):
+        return SimpleNamespace(pages=[self.rows])
+
+    def cancel(self):
+        pass
+
+
+class FakeClient:
+    def __init__(self, estimated_bytes, rows):
+        self.estimated_bytes = estimated_bytes
+        self.rows = rows
+        self.dry_runs = []
+        self.queries = []
+
+    def query(self, query, job_config=None):
+        if getattr(job_config, 'dry_run', False):
+            self.dry_runs.append(job_config)
+            return FakeJob([], total_bytes_processed=self.estimated_bytes)
+        self.queries.append(job_config)
+        return FakeJob(self.rows)
+
+    def close(self):
+        pass
+
+
+def make_collector(estimated_bytes, max_bytes_billed=1000):
+    config = {
+        'name': 'bq_budget',
+        'type': 'bigquery',
+        'max_bytes_billed': max_bytes_billed,
+        'query': 'SELECT account_id, block_rate FROM t',
+    }
+    client = FakeClient(estimated_bytes, [{'account_id': 'acc_1', 'block_rate': 0.5}])
+    return BigQueryCollector(config, client=client, job_config_factory=SimpleNamespace)
+
+
+def test_over_budget_raises_and_skips_the_query():
+    collector = make_collector(estimated_bytes=5000)
+
+    with pytest.raises(QueryBudgetExceeded):
+        list(collector.iter_batches())
+
+    assert collector.estimated_bytes == 5000
+    assert len(collector.client.dry_runs) == 1
+    assert collector.client.dry_runs[0].use_query_cache is False
+    assert collector.client.queries == []
+
+
+def test_under_budget_runs_the_query_with_the_billing_cap():
+    collector = make_collector(estimated_bytes=500)
+
+    batches = list(collector.iter_batches())
+
+    assert batches == [[{'account_id': 'acc_1', 'block_rate': 0.5}]]
+    assert len(collector.client.queries) == 1
+    job_config = collector.client.queries[0]
+    assert job_config.maximum_bytes_billed == 1000
+    assert not getattr(job_config, 'dry_run', False)
@@ -0,0 +1,44 @@
+"""CardinalityLimiter 和 MetricsManager.limit_cardinality 的序列上限"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from data_exporter import CardinalityLimiter, MetricsManager  # noqa: E402
+
+
+def test_other_stays_within_cap_in_replace_mode():
+    limiter = CardinalityLimiter(3, 'other')
+    series = {('a',): 1.0, ('b',): 2.0, ('c',): 3.0, ('d',): 4.0, ('e',): 5.0}
+
+    kept, dropped = limiter.apply(series, 1, exists=lambda key: False)
+
+    assert len(kept) == 3
+    assert kept[('other',)] == 12.0
+    assert dropped == 3
+
+
+def test_other_is_not_published_without_a_slot():
+    limiter = CardinalityLimiter(0, 'other')
+    kept, dropped = limiter.apply({('a',): 1.0}, 1, exists=lambda key: False)
+
+    assert kept == {}
+    assert dropped == 1
+
+
+def test_merge_mode_other_does_not_grow_when_rows_are_reread():
+    manager = MetricsManager(ttl_seconds=300)
+    manager.register_gauge('test_merge_other', 'merge other', ['account'], max_series=3, overflow='other')
+    manager.publish({'test_merge_other': {('a',): 1.0, ('b',): 1.0}}, replace=False)
+
+    # 每个周期重新读取同样的行（如 >= 水位的边界行），other 应保持不变
+    for _ in range(4):
+        series_by_metric = {'test_merge_other': {('c',): 50.0, ('d',): 60.0}}
+        manager.limit_cardinality(series_by_metric, replace=False)
+        manager.publish(series_by_metric, replace=False)
+        assert series_by_metric['test_merge_other'] == {('other',): 110.0}
+
+    # 折叠序列的值变化时替换其贡献，未读到的折叠序列保留上次的贡献
+    series_by_metric = {'test_merge_other': {('c',): 10.0}}
+    manager.limit_cardinality(series_by_metric, replace=False)
+    assert series_by_metric['test_merge_other'] == {('other',): 70.0}
@@ -0,0 +1,97 @@
+"""DatabaseCollector 的服务端游标读取（本地假连接，不需要数据库驱动）"""
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from data_exporter import DatabaseCollector  # noqa: E402
+
+
+class FakeNamedCursor:
+    """模拟 psycopg2 命名游标: execute() 之后、第一次 fetch 之前 description 为 None"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.description = None
+        self.executed = None
+        self.closed = False
+
+    def execute(self, query, params=None):
+        self.executed = (query, params)
+
+    def fetchmany(self, size):
+        self.description = [('account_id',), ('alert_threshold',), ('updated_at',)]
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.autocommit = True
+        self.cursors = []
+        self.rolled_back = False
+
+    def cursor(self, name=None):
+        assert name is not None, "PostgreSQL sources must use a named (server-side) cursor"
+        cursor = FakeNamedCursor(self.rows)
+        self.cursors.append(cursor)
+        return cursor
+
+    def cancel(self):
+        pass
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @contextmanager
+    def connection(self, timeout=None):
+        yield self.conn
+
+
+def make_collector(rows, **config):
+    collector = DatabaseCollector({
+        'name': 'pg_cursor',
+        'type': 'database',
+        'connection': {'driver': 'postgresql', 'database': 'risk_db'},
+        'query': 'SELECT account_id, alert_threshold, updated_at FROM merchant_config',
+        'batch_size': 2,
+        **config,
+    })
+    collector.pool = FakePool(FakeConnection(rows))
+    return collector
+
+
+ROWS = [('acc_1', 0.5, '2024-01-01'), ('acc_2', 0.25, '2024-01-02'), ('acc_3', 0.75, '2024-01-03')]
+
+
+def test_postgresql_named_cursor_builds_columns_after_first_fetch():
+    collector = make_collector(ROWS)
+    batches = list(collector.iter_batches())
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert batches[0][0] == {'account_id': 'acc_1', 'alert_threshold': 0.5, 'updated_at': '2024-01-01'}
+    conn = collector.pool.conn
+    assert conn.cursors[0].closed
+    assert conn.rolled_back and conn.autocommit
+
+
+def test_postgresql_empty_result():
+    assert list(make_collector([]).iter_batches()) == []
+
+
+def test_incremental_binds_watermark_and_tracks_it():
+    collector = make_collector(ROWS, incremental={'column': 'updated_at', 'initial': '2023-12-31'})
+    list(collector.iter_batches())
+
+    assert collector.pool.conn.cursors[0].executed[1] == {'watermark': '2023-12-31'}
+    assert collector.pending_watermark == '2024-01-03'
@@ -0,0 +1,85 @@
+"""数据源 deadline: 超时归类和进行中读取的取消"""
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from data_exporter import (
+    CYCLE_FAILED, BaseCollector, DeadlineExceeded, DeadlineWatchdog, GcsCollector,
+)
+
+
+def test_pool_timeout_capped_by_deadline_counts_as_deadline_exceeded(make_exporter):
+    source = {
+        'name': 'pg_deadline',
+        'type': 'database',
+        'deadline': 1,
+        # 连接池大小为 0: 获取连接一直等待，直到被剩余时间截断
+        'connection': {'driver': 'postgresql', 'database': 'deadline_db', 'pool_size': 0},
+        'query': 'SELECT 1',
+        'metrics': [{'prometheus_name': 'test_deadline_value', 'source_field': 'value'}],
+    }
+    exporter = make_exporter({'data_sources': [source]})
+
+    assert exporter._update_metrics(exporter.sources['pg_deadline']) == CYCLE_FAILED
+    assert REGISTRY.get_sample_value(
+        'exporter_deadline_exceeded_total', {'source': 'pg_deadline'}
+    ) == 1.0
+
+
+class StalledStream:
+    """第一行之后阻塞的下载流，close() 后读取抛出异常"""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.closed.set()
+
+    def __iter__(self):
+        yield '{"value": 1}\n'
+        self.closed.wait(5)
+        raise ValueError('I/O operation on closed file')
+
+
+class FakeBlob:
+    size = None
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def open(self, mode, **kwargs):
+        return self.stream
+
+
+def make_gcs_collector(stream):
+    # 跳过 GcsCollector.__init__（不创建 GCS 客户端），只使用读取逻辑
+    collector = GcsCollector.__new__(GcsCollector)
+    BaseCollector.__init__(collector, {
+        'name': 'gcs_stalled', 'type': 'gcs', 'format': 'ndjson',
+        'path_pattern': 'metrics/report.ndjson', 'change_detection': False,
+    })
+    collector.bucket = type('FakeBucket', (), {'blob': lambda self, path: FakeBlob(stream)})()
+    return collector
+
+
+def test_stalled_gcs_stream_is_closed_at_the_deadline():
+    stream = StalledStream()
+    collector = make_gcs_collector(stream)
+    watchdog = DeadlineWatchdog()
+    entry = watchdog.watch(collector, 0.2)
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        list(collector.iter_batches())
+    watchdog.done(entry)
+
+    assert stream.closed.is_set()
+    assert time.monotonic() - start < 2
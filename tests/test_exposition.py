@@ -0,0 +1,40 @@
+"""/metrics 输出缓存和内容协商"""
+import time
+
+import pytest
+from prometheus_client import CollectorRegistry, Counter
+
+from data_exporter import ExpositionCache, accepts_gzip
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip', True),
+    ('gzip, deflate, br', True),
+    ('deflate, GZIP;q=0.5', True),
+    ('gzip;q=0', False),
+    ('gzip; q=0.0, deflate', False),
+    ('x-gzip', False),
+    ('identity', False),
+    ('', False),
+    ('*', True),
+    ('*;q=0', False),
+    ('gzip;q=0, *', False),
+    ('gzip;q=bogus', False),
+])
+def test_accepts_gzip_parses_codings_and_q_values(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+def test_cache_is_rerendered_after_max_age_without_publish():
+    registry = CollectorRegistry()
+    counter = Counter('test_exposition_events', 'self-instrumentation counter', registry=registry)
+    cache = ExpositionCache(registry=registry, max_age_seconds=0.05)
+    _, _, first_etag = cache.get()
+
+    # 自身监控指标变化但没有发布: max_age 内仍返回缓存，之后重新渲染
+    counter.inc()
+    assert cache.get()[2] == first_etag
+    time.sleep(0.1)
+    body, _, etag = cache.get()
+    assert etag != first_etag
+    assert b'test_exposition_events_total 1.0' in body
@@ -0,0 +1,55 @@
+"""增量采集: >= 水位查询的未变化判定"""
+from data_exporter import CYCLE_SUCCESS, CYCLE_UNCHANGED, BaseCollector
+
+
+class WatermarkCollector(BaseCollector):
+    """模拟 >= 水位的增量查询: 返回时间戳不早于当前水位的行"""
+
+    def __init__(self, config, rows):
+        super().__init__(config)
+        self.rows = rows
+
+    def iter_batches(self):
+        batch = [row for row in self.rows if row['updated_at'] >= self.watermark]
+        self.track_watermark(batch)
+        yield batch
+
+
+def make_source(make_exporter, rows):
+    source = {
+        'name': 'inc', 'type': 'rest_api', 'endpoint': 'http://localhost/inc', 'interval': '60s',
+        'incremental': {'column': 'updated_at', 'initial': '2024-01-01 00:00:00'},
+        'metrics': [{'prometheus_name': 'test_incremental_value', 'source_field': 'value', 'labels': ['host']}],
+    }
+    exporter = make_exporter({'data_sources': [source]})
+    collector = WatermarkCollector(exporter.sources['inc'], rows)
+    exporter.collectors['inc'] = collector
+    return exporter, collector
+
+
+def test_boundary_rows_with_unchanged_values_are_unchanged(make_exporter):
+    rows = [
+        {'host': 'h1', 'value': 1.0, 'updated_at': '2024-01-02 00:00:00'},
+        {'host': 'h2', 'value': 2.0, 'updated_at': '2024-01-03 00:00:00'},
+    ]
+    exporter, collector = make_source(make_exporter, rows)
+    source = exporter.sources['inc']
+
+    assert exporter._update_metrics(source) == CYCLE_SUCCESS
+    assert collector.watermark == '2024-01-03 00:00:00'
+
+    # 只重新读到水位上的 h2，数值未变化
+    assert exporter._update_metrics(source) == CYCLE_UNCHANGED
+    assert collector.watermark == '2024-01-03 00:00:00'
+
+
+def test_boundary_row_with_new_value_is_published(make_exporter):
+    rows = [{'host': 'h1', 'value': 1.0, 'updated_at': '2024-01-02 00:00:00'}]
+    exporter, collector = make_source(make_exporter, rows)
+    source = exporter.sources['inc']
+    assert exporter._update_metrics(source) == CYCLE_SUCCESS
+
+    # 与水位相同时间戳的行在上次查询之后才写入，数值发生变化
+    rows[0] = {'host': 'h1', 'value': 5.0, 'updated_at': '2024-01-02 00:00:00'}
+    assert exporter._update_metrics(source) == CYCLE_SUCCESS
+    assert exporter.metrics_manager.stores['test_incremental_value'].value(('h1',)) == 5.0
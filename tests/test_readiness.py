@@ -0,0 +1,62 @@
+"""/ready 的就绪判定"""
+import time
+
+import pytest
+
+from data_exporter import CYCLE_EMPTY, CYCLE_FAILED, CYCLE_SUCCESS, CYCLE_UNCHANGED, ReadinessGate
+
+
+def test_quorum_is_a_fraction_of_sources():
+    assert ReadinessGate().required(5) == 5
+    assert ReadinessGate(quorum=1).required(5) == 5
+    assert ReadinessGate(quorum=0.5).required(5) == 3
+    assert ReadinessGate(quorum=0).required(5) == 0
+
+
+def test_quorum_count_overrides_quorum():
+    assert ReadinessGate(quorum=1.0, quorum_count=2).required(5) == 2
+    assert ReadinessGate(quorum_count=10).required(5) == 5
+
+
+def test_quorum_above_one_is_rejected():
+    with pytest.raises(ValueError, match='quorum_count'):
+        ReadinessGate(quorum=3)
+
+
+def test_ready_once_quorum_collected_and_stays_ready():
+    gate = ReadinessGate(quorum=0.5)
+    assert not gate.status(['a', 'b', 'c'])['ready']
+
+    gate.mark('a')
+    gate.mark('b')
+    status = gate.status(['a', 'b', 'c'])
+    assert status['ready']
+    assert status['pending'] == ['c']
+
+    # 就绪后新增的数据源不会让副本重新变为未就绪
+    assert gate.status(['a', 'b', 'c', 'd', 'e', 'f'])['ready']
+
+
+def test_timeout_makes_ready_without_quorum():
+    gate = ReadinessGate(timeout=0.01)
+    time.sleep(0.02)
+    assert gate.status(['a'])['ready']
+
+
+def source(name):
+    return {'name': name, 'type': 'rest_api', 'endpoint': 'http://localhost/metrics', 'interval': '60s'}
+
+
+@pytest.mark.parametrize('result, counted', [
+    (CYCLE_SUCCESS, True),
+    (CYCLE_UNCHANGED, True),
+    (CYCLE_EMPTY, False),
+    (CYCLE_FAILED, False),
+])
+def test_only_published_or_unchanged_cycles_count(make_exporter, result, counted):
+    exporter = make_exporter({'data_sources': [source('a')]})
+
+    exporter._next_period(exporter.sources['a'], result, 60)
+
+    assert ('a' in exporter.readiness.collected) is counted
+    assert exporter._check_ready()['ready'] is counted
@@ -0,0 +1,87 @@
+"""配置热加载: 按数据源对比差异，进行中的周期不受重新加载影响"""
+import yaml
+from prometheus_client import REGISTRY
+
+from data_exporter import CYCLE_EMPTY, BaseCollector
+
+
+def source(name, interval='60s'):
+    return {
+        'name': name, 'type': 'rest_api', 'endpoint': f'http://localhost/{name}', 'interval': interval,
+        'metrics': [{'prometheus_name': f'test_reload_{name}', 'source_field': 'value', 'labels': ['host']}],
+    }
+
+
+def write_config(exporter, sources):
+    with open(exporter.config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'exporter': exporter.config['exporter'], 'data_sources': sources}, f)
+
+
+def test_reload_only_restarts_changed_sources(make_exporter):
+    exporter = make_exporter({'data_sources': [source('a'), source('b'), source('c')]})
+    collectors = {name: exporter._get_collector(exporter.sources[name]) for name in 'abc'}
+    for name in 'abc':
+        exporter.metrics_manager.publish({f'test_reload_{name}': {('h1',): 1.0}}, replace=True, owner=name)
+
+    # a 不变，b 修改间隔，c 删除，d 新增
+    write_config(exporter, [source('a'), source('b', interval='30s'), source('d')])
+    exporter.reload_config()
+
+    assert sorted(exporter.sources) == ['a', 'b', 'd']
+    assert exporter.collectors == {'a': collectors['a']}
+    # 未变化的数据源和定义未变化的指标保留已发布的序列
+    assert REGISTRY.get_sample_value('test_reload_a', {'host': 'h1'}) == 1.0
+    assert REGISTRY.get_sample_value('test_reload_b', {'host': 'h1'}) == 1.0
+    assert REGISTRY.get_sample_value('test_reload_c', {'host': 'h1'}) is None
+    assert 'test_reload_d' in exporter.metric_specs
+
+
+class ReloadingCollector(BaseCollector):
+    """读取第一批数据后触发一次重新加载，模拟周期进行中配置发生变化"""
+
+    def __init__(self, config, reload):
+        super().__init__(config)
+        self.reload = reload
+        self.close_calls = 0
+
+    def iter_batches(self):
+        self.reload()
+        yield [{'host': 'h1', 'value': 2.0}]
+
+    def close(self):
+        self.close_calls += 1
+
+
+def test_collector_removed_mid_cycle_is_closed_after_the_cycle(make_exporter):
+    exporter = make_exporter({'data_sources': [source('a'), source('b')]})
+
+    def reload():
+        write_config(exporter, [source('b')])
+        exporter.reload_config()
+        # 周期仍在使用采集器，重新加载时不能关闭
+        assert collector.close_calls == 0
+
+    collector = ReloadingCollector(exporter.sources['a'], reload)
+    exporter.collectors['a'] = collector
+
+    assert exporter._update_metrics(exporter.sources['a']) == CYCLE_EMPTY
+    assert collector.close_calls == 1
+    assert not exporter.collector_cycles and not exporter.retired_collectors
+    assert REGISTRY.get_sample_value('test_reload_a', {'host': 'h1'}) is None
+
+
+def test_changed_source_mid_cycle_does_not_publish_stale_results(make_exporter):
+    exporter = make_exporter({'data_sources': [source('a')]})
+    exporter.metrics_manager.publish({'test_reload_a': {('h1',): 1.0}}, replace=True, owner='a')
+
+    def reload():
+        write_config(exporter, [source('a', interval='30s')])
+        exporter.reload_config()
+
+    collector = ReloadingCollector(exporter.sources['a'], reload)
+    exporter.collectors['a'] = collector
+
+    assert exporter._update_metrics(exporter.sources['a']) == CYCLE_EMPTY
+    assert collector.close_calls == 1
+    # 旧配置的周期结果被丢弃，已发布的序列保持不变
+    assert REGISTRY.get_sample_value('test_reload_a', {'host': 'h1'}) == 1.0
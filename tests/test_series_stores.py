@@ -0,0 +1,49 @@
+"""序列存储: gauge 和 columnar 两种后端的行为一致"""
+import time
+
+import pytest
+from prometheus_client import CollectorRegistry
+
+from data_exporter import SERIES_STORES, MetricsManager
+
+
+@pytest.fixture(params=sorted(SERIES_STORES))
+def backend(request):
+    return request.param
+
+
+def test_no_label_series_is_hidden_after_remove_and_clear(backend):
+    registry = CollectorRegistry()
+    store = SERIES_STORES[backend]('test_store_total_value', 'no-label metric', [], registry=registry)
+    assert registry.get_sample_value('test_store_total_value') is None
+
+    store.set((), 3.0, time.time())
+    assert registry.get_sample_value('test_store_total_value') == 3.0
+
+    store.remove(())
+    assert registry.get_sample_value('test_store_total_value') is None
+    assert len(store) == 0
+
+    store.merge(store.stage({(): 4.0}, time.time()))
+    assert registry.get_sample_value('test_store_total_value') == 4.0
+
+    store.clear()
+    assert registry.get_sample_value('test_store_total_value') is None
+
+    store.unregister()
+    assert list(registry.collect()) == []
+
+
+def test_expired_no_label_series_is_removed(backend):
+    manager = MetricsManager(ttl_seconds=300, backend=backend)
+    store = manager.register_gauge('test_store_expiring', 'no-label metric', [], ttl_seconds=0.01)
+    try:
+        manager.publish({'test_store_expiring': {(): 1.0}})
+        time.sleep(0.05)
+
+        assert manager.cleanup_expired() == 1
+        assert len(store) == 0
+        assert all(not family.samples for family in store.registry.collect()
+                   if family.name == 'test_store_expiring')
+    finally:
+        manager.unregister_gauge('test_store_expiring')
@@ -0,0 +1,42 @@
+"""多个数据源共同发布的指标"""
+import pytest
+from prometheus_client import REGISTRY
+
+from data_exporter import MetricsManager
+
+
+@pytest.fixture(params=['gauge', 'columnar'])
+def manager(request):
+    manager = MetricsManager(ttl_seconds=300, backend=request.param)
+    manager.register_gauge('test_shared_value', 'shared by two sources', ['host'])
+    manager.share(['test_shared_value'])
+    yield manager
+    manager.unregister_gauge('test_shared_value')
+
+
+def sample(host):
+    return REGISTRY.get_sample_value('test_shared_value', {'host': host})
+
+
+def test_replace_only_swaps_the_publishing_sources_series(manager):
+    manager.publish({'test_shared_value': {('a1',): 1.0, ('a2',): 2.0}}, replace=True, owner='a')
+    manager.publish({'test_shared_value': {('b1',): 10.0}}, replace=True, owner='b')
+
+    # a 的新结果不再包含 a2: 删除 a2，b 的序列保留
+    manager.publish({'test_shared_value': {('a1',): 1.5}}, replace=True, owner='a')
+
+    assert sample('a1') == 1.5
+    assert sample('a2') is None
+    assert sample('b1') == 10.0
+    assert manager.series_count(['test_shared_value']) == 2
+
+
+def test_series_published_by_both_sources_is_kept_until_both_drop_it(manager):
+    manager.publish({'test_shared_value': {('common',): 1.0}}, replace=True, owner='a')
+    manager.publish({'test_shared_value': {('common',): 2.0}}, replace=True, owner='b')
+
+    manager.publish({'test_shared_value': {('a1',): 1.0}}, replace=True, owner='a')
+    assert sample('common') == 2.0
+
+    manager.publish({'test_shared_value': {('b1',): 1.0}}, replace=True, owner='b')
+    assert sample('common') is None
@@ -0,0 +1,19 @@
+"""启动时的并行初始化"""
+from prometheus_client import REGISTRY
+
+from data_exporter import DRIVER_IMPORT_SECONDS
+
+
+def test_rest_sources_prewarm_requests(make_exporter):
+    exporter = make_exporter({'data_sources': [{
+        'name': 'rest', 'type': 'rest_api', 'endpoint': 'http://localhost/metrics', 'interval': '60s',
+        'metrics': [{'prometheus_name': 'test_startup_value', 'source_field': 'value'}],
+    }]})
+
+    exporter.initialize_sources(exporter.sources.values())
+
+    assert 'rest' in exporter.collectors
+    assert 'requests' in DRIVER_IMPORT_SECONDS
+    assert REGISTRY.get_sample_value(
+        'exporter_startup_import_seconds', {'module': 'requests'}
+    ) == DRIVER_IMPORT_SECONDS['requests']